@@ -6,6 +6,10 @@ from django.core.asgi import get_asgi_application
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MyEcomStoreNew.settings')
+# Under ASGI each request's sync code runs in a thread of its own, so a
+# connection kept open for the next request would never be reused by it; close
+# them at the end of each request instead (see DATABASES in settings).
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
 
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,17 +45,23 @@ EXTERNAL_APPS = [
     'shop',  
     'blog', 
     'accounts',
+    'jobs',
 ]
 INSTALLED_APPS += EXTERNAL_APPS
 MIDDLEWARE = [
+    'shop.middleware.MediaFilesMiddleware',  # answers MEDIA_URL before anything below runs
+    'shop.instrumentation.InstrumentationMiddleware',  # Server-Timing and the slow log
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.AutoLogoutMiddleware',
+    'shop.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'shop.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable
+    'shop.profiling.ProfilingMiddleware',  # last, so a profile covers just the view
 ]
 
 ROOT_URLCONF = 'MyEcomStoreNew.urls'
@@ -62,8 +70,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept for the life of the process; the
+            # dev server's autoreloader resets them when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -80,13 +95,83 @@ WSGI_APPLICATION = 'MyEcomStoreNew.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# SQLITE_PROFILE=production (the default) tunes SQLite for several gunicorn
+# workers: WAL so readers never wait for the writer, a busy timeout instead of
+# "database is locked", write transactions that take the lock up front,
+# persistent connections, and a second, read-only connection ('replica') that
+# catalog and blog reads are routed to (see shop.db_router). The file is
+# shared, so reads see every committed write. Connections persist under WSGI
+# only: asgi.py sets DB_CONN_MAX_AGE=0, as a thread there serves one request.
+# SQLITE_PROFILE=plain is Django's defaults, kept for comparison by the
+# bench_sqlite command.
+
+DATABASE_PATH = Path(os.environ.get("DATABASE_PATH", BASE_DIR / 'db.sqlite3')).resolve()
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", 'production')
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL;'  # with WAL: no fsync per commit, still never corrupt
+    'PRAGMA mmap_size=268435456;'  # 256 MB of the file mapped: reads skip the syscall
+    'PRAGMA cache_size=-65536;'  # 64 MB page cache per connection
+    'PRAGMA temp_store=MEMORY;'
+)
+
+if SQLITE_PROFILE == 'plain':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_PATH,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DATABASE_PATH,
+            'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL;' + SQLITE_PRAGMAS,
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 5,  # busy_timeout, in seconds
+            },
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f"{DATABASE_PATH.as_uri()}?mode=ro",
+            'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+                'timeout': 5,
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['shop.db_router.ReadConnectionRouter']
+
+
+# Cache
+# Shared by every worker on the host so per-worker caches (such as the shop's
+# catalog snapshot) notice each other's invalidations without Redis.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'shop.filecache.FileBasedCache',  # Django's, with cheaper culling
+        'LOCATION': os.environ.get("CACHE_DIR", str(BASE_DIR / '.cache')),
+        # Carts, tracking records and image manifests live here too: the
+        # default of 300 entries would cull them constantly.
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get("CACHE_MAX_ENTRIES", 200_000))},
     }
 }
 
+# Tests get a cache of their own, in memory: clearing it between tests must
+# not drop the carts and manifests of whatever runs from this checkout.
+if sys.argv[1:2] == ['test']:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -130,6 +215,24 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# What is deployed, e.g. the commit it was built from. Page ETags and cached
+# fragments include it, so a deploy retires them; unset, it is a digest of the
+# project's code and templates (see shop.versions.release).
+RELEASE = os.environ.get("RELEASE", '')
+
+# Cart storage: shop.cart.SessionCartStorage, CookieCartStorage or CacheCartStorage
+CART_STORAGE = os.environ.get("CART_STORAGE", 'shop.cart.CookieCartStorage')
+
+# Requests slower than this are written to the slow log (see shop.instrumentation)
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 500))
+SLOW_LOG_PATH = os.environ.get("SLOW_LOG_PATH", str(BASE_DIR / 'logs' / 'slow_requests.jsonl'))
+
+# Request profiling (see shop.profiling): requests with a token from the
+# profile_token command, plus this fraction of all requests, are profiled.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILER = os.environ.get("PROFILER", 'sampler')  # or 'cprofile'
+PROFILES_DIR = os.environ.get("PROFILES_DIR", str(BASE_DIR / 'profiles'))
+
 # Media files settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
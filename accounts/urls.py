@@ -1,7 +1,5 @@
 from django.urls import path
 from . import views
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth.views import LogoutView
 from MyEcomStoreNew.views import home_view
 
@@ -14,4 +12,4 @@ urlpatterns = [
     path('change-password/', views.change_password_view, name='change_password'),
     path('change-email/', views.change_email_view, name='change_email'),
     path('delete-account/', views.delete_account_view, name='delete_account'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
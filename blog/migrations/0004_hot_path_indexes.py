@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_alter_aboutcomment_options_alter_aboutrating_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aboutcomment',
+            index=models.Index(fields=['blog_post', 'date_posted'], name='blog_comment_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['created_at'], name='blog_post_created_idx'),
+        ),
+    ]
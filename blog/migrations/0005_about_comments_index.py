@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 09:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aboutcomment',
+            index=models.Index(fields=['date_posted'], name='blog_comment_date_idx'),
+        ),
+    ]
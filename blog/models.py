@@ -30,6 +30,9 @@ class BlogPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='blog_post_created_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -83,6 +86,12 @@ class AboutComment(models.Model):
 
     class Meta:
         ordering = ['-date_posted']
+        # A post's comments, or the newest of all (the about page), newest
+        # first, straight off an index.
+        indexes = [
+            models.Index(fields=['blog_post', 'date_posted'], name='blog_comment_post_date_idx'),
+            models.Index(fields=['date_posted'], name='blog_comment_date_idx'),
+        ]
 
     def __str__(self):
         if self.user:
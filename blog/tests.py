@@ -1,3 +1,61 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import AboutComment, BlogPost, Tag
+from .views_blog import ABOUT_COMMENTS, POSTS_PER_PAGE
+
+
+class BlogPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(name="Lamps")
+        posts = BlogPost.objects.bulk_create(
+            BlogPost(title=f"Post {i}", slug=f"post-{i}", author="a", excerpt="", content="") for i in range(25)
+        )
+        start = timezone.now() - timedelta(days=1)
+        for i, post in enumerate(posts):
+            # Pairs share a timestamp: the id breaks the tie across pages.
+            BlogPost.objects.filter(pk=post.pk).update(created_at=start + timedelta(minutes=i // 2))
+        self.tag.blog_posts.add(*posts)
+        self.newest_first = [f"Post {i}" for i in sorted(range(25), key=lambda i: (i // 2, i), reverse=True)]
+
+    def titles(self, response):
+        return [post.title for post in response.context['page']().posts]
+
+    def walk(self, url):
+        titles, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            page = response.context['page']()
+            titles += [post.title for post in page.posts]
+            url, pages = page.next_page_url, pages + 1
+        return titles, pages
+
+    def test_home_and_tag_pages_are_paged_newest_first(self):
+        self.assertEqual(self.walk(reverse('blog_home')), (self.newest_first, 2))
+        self.assertEqual(self.walk(reverse('blog_posts_by_tag', args=[self.tag.slug])), (self.newest_first, 2))
+        response = self.client.get(reverse('blog_home'))
+        self.assertContains(response, "Older Posts")
+        self.assertEqual(len(self.titles(response)), POSTS_PER_PAGE)
+
+    def test_bad_cursor_shows_the_first_page(self):
+        for token in ("junk", "1-2-3", "99999999999999999999999-1"):
+            response = self.client.get(reverse('blog_home'), {'before': token})
+            self.assertEqual(self.titles(response)[0], self.newest_first[0], token)
+
+    def test_list_fragment_is_keyed_by_the_cursor_alone(self):
+        self.client.get(reverse('blog_home'), {'utm_source': 'a'})
+        BlogPost.objects.filter(title=self.newest_first[0]).update(title="Renamed")  # no version bump
+        response = self.client.get(reverse('blog_home'), {'utm_source': 'b'})
+        self.assertNotContains(response, "Renamed")
+        older = self.client.get(reverse('blog_home'), {'utm_source': 'b'}).context['page']().next_page_url
+        self.assertNotIn('utm_source', older)
 
-# Create your tests here.
+    def test_about_page_shows_only_the_newest_comments(self):
+        AboutComment.objects.bulk_create(AboutComment(name=f"R{i}", comment="c") for i in range(ABOUT_COMMENTS + 5))
+        response = self.client.get(reverse('blog_about'))
+        self.assertEqual(len(response.context['comments']), ABOUT_COMMENTS)
@@ -1,19 +1,76 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Avg
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.db import transaction
+from django.db.models import Avg, Q
 from django.views.decorators.http import require_POST
 from .models import BlogPost, Tag, AboutRating, AboutComment
 from .forms import BlogPostForm, AboutRatingForm, AboutCommentForm
+from shop.page_cache import blog_page, conditional_page
+
+# ----- post pages -----
+# Post lists are shown POSTS_PER_PAGE at a time, newest first, with keyset
+# pagination: ?before= holds the (created_at, id) of the last post shown, so
+# any page is an index seek rather than an OFFSET over every newer post.
+POSTS_PER_PAGE = 20
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class PostPage(NamedTuple):
+    posts: list
+    next_page_url: Optional[str]
+
+
+def _decode_cursor(token):
+    try:
+        micros, pk = map(int, token.split('-'))
+        return EPOCH + timedelta(microseconds=micros), pk
+    except (ValueError, OverflowError):
+        return None
+
+
+def _encode_cursor(created_at, pk):
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}-{pk}"
+
+
+def page_cursor(request):
+    """The ?before= cursor in canonical form, '' on the first page. The
+    cached list is keyed by it, so other query parameters can't split it."""
+    cursor = _decode_cursor(request.GET.get('before', ''))
+    return _encode_cursor(*cursor) if cursor else ''
+
+
+def post_page(request, posts):
+    cursor = _decode_cursor(request.GET.get('before', ''))
+    if cursor:
+        created_at, pk = cursor
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    rows = list(posts.order_by('-created_at', '-pk').prefetch_related('tags')[:POSTS_PER_PAGE + 1])
+    if len(rows) <= POSTS_PER_PAGE:
+        return PostPage(rows, None)
+    last = rows[POSTS_PER_PAGE - 1]
+    return PostPage(rows[:POSTS_PER_PAGE], f"{request.path}?before={_encode_cursor(last.created_at, last.pk)}")
+# ----- post pages -----
 
 # ----- blog_home -----
-def blog_home(request):
-    posts = BlogPost.objects.all()
-    return render(request, "blog/index.html", {"posts": posts})
+@blog_page
+async def blog_home(request):
+    # The 304 check above stays on the event loop; the render runs in a
+    # thread, where the template may query for the posts.
+    return await sync_to_async(render)(request, "blog/index.html", {
+        # Called by the template only when the cached list is re-rendered.
+        "page": lambda: post_page(request, BlogPost.objects.all()),
+        "cursor": page_cursor(request),
+    })
 # ----- blog_home -----
 
 # ----- blog_post_detail -----
-def blog_post_detail(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug)
-    avg_rating = post.ratings.aggregate(Avg('rating'))['rating__avg'] or 0
+@blog_page
+async def blog_post_detail(request, slug):
+    post = await aget_object_or_404(BlogPost, slug=slug)
+    avg_rating = (await post.ratings.aaggregate(Avg('rating')))['rating__avg'] or 0
     comments = post.comments.all()
     rating_form = AboutRatingForm()
     comment_form = AboutCommentForm()
@@ -28,17 +85,23 @@ def blog_post_detail(request, slug):
 # ----- blog_post_detail -----
 
 # ----- blog_posts_by_tag -----
+@blog_page
 def blog_posts_by_tag(request, tag_slug):
     tag = get_object_or_404(Tag, slug=tag_slug)
-    posts = tag.blog_posts.all()
-    return render(request, "blog/index.html", {"posts": posts, "tag": tag})
+    return render(request, "blog/index.html", {
+        "page": lambda: post_page(request, tag.blog_posts.all()),
+        "cursor": page_cursor(request),
+        "tag": tag,
+    })
 # ----- blog_posts_by_tag -----
 
 # ----- blog_about -----
+ABOUT_COMMENTS = 50  # the newest; every comment ever made is too many to show
+
 def blog_about(request):
     ratings = AboutRating.objects.all()
     avg_rating = ratings.aggregate(Avg('rating'))['rating__avg'] or 0
-    comments = AboutComment.objects.all()
+    comments = AboutComment.objects.order_by('-date_posted')[:ABOUT_COMMENTS]
 
     rating_form = AboutRatingForm()
     comment_form = AboutCommentForm()
@@ -70,7 +133,8 @@ def blog_post_create(request):
     if request.method == "POST":
         form = BlogPostForm(request.POST, request.FILES)
         if form.is_valid():
-            post = form.save()
+            with transaction.atomic():  # the post and its tags, and one version bump
+                post = form.save()
             return redirect("blog_post_detail", slug=post.slug)
     else:
         form = BlogPostForm()
@@ -86,7 +150,8 @@ def blog_post_edit(request, pk):
             if 'image_delete' in request.POST and post.image:
                 post.image.delete(save=False)
                 post.image = None
-            post = form.save()
+            with transaction.atomic():
+                post = form.save()
             return redirect("blog_post_detail", slug=post.slug)
     else:
         form = BlogPostForm(instance=post)
@@ -101,6 +166,7 @@ def blog_post_delete(request, slug):
 # ----- blog_post_delete -----
 
 # ----- blog_contact -----
+@conditional_page()
 def blog_contact(request):
     return render(request, "blog/contact.html")
 # ----- blog_contact -----
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Job
+from .queue import retry
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'priority', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'key']
+    ordering = ['-id']
+    readonly_fields = ['locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error']
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected failed jobs now")
+    def retry_now(self, request, queryset):
+        retried = retry(queryset)
+        self.message_user(request, f"Queued {retried} jobs again.")
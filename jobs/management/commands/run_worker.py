@@ -0,0 +1,35 @@
+import os
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (see jobs.queue): claims ready jobs in "
+        "priority order and runs them in a pool of processes, retrying "
+        "failures with backoff. Run one or more alongside the web server; "
+        "SIGTERM finishes the running jobs and exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Pool processes; 0 runs jobs in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle.")
+        parser.add_argument('--once', action='store_true', help="Exit when no job is ready.")
+
+    def handle(self, *args, **options):
+        worker = Worker(processes=options['processes'], poll_interval=options['poll_interval'],
+                        on_finish=self.report if options['verbosity'] > 1 else None)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        counts = worker.run(once=options['once'])
+        self.stdout.write(f"Ran {counts['done'] + counts['failed']} jobs: {counts['done']} done, {counts['failed']} failed.")
+
+    def report(self, job, error, seconds):
+        if error is None:
+            self.stdout.write(f"done    {job.task} #{job.pk} in {seconds:.2f}s")
+        else:
+            self.stderr.write(f"failed  {job.task} #{job.pk} attempt {job.attempts}/{job.max_attempts}: {error!r}")
@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Dotted path of the function to call, with JSON arguments.
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # Higher runs first; within a priority, the earliest run_at.
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # At most one queued job per key: enqueueing it again is a no-op.
+    key = models.CharField(max_length=200, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The claim query: ready jobs in priority order.
+            models.Index(fields=['-priority', 'run_at'], condition=models.Q(status='queued'),
+                         name='jobs_job_ready_idx'),
+            # Housekeeping: expired leases, and finished jobs to purge.
+            models.Index(fields=['status', 'locked_at'], name='jobs_job_status_lock_idx'),
+            models.Index(fields=['status', 'finished_at'], name='jobs_job_status_done_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='queued') & ~models.Q(key=''),
+                                    name='jobs_job_queued_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,135 @@
+import random
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+# ----------------- Job Queue -----------------
+# A durable queue in the database, for work a request shouldn't wait for.
+# enqueue() is one INSERT, so inside a transaction the job exists exactly when
+# the transaction commits; run_worker processes claim and run the jobs.
+#
+# Claiming takes the ready jobs in priority order and marks them running
+# under the worker's name. Where the database can lock rows (PostgreSQL,
+# MySQL) that's SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers
+# pass over each other's rows instead of waiting. SQLite can't, so there the
+# claim is optimistic: the UPDATE only takes rows still queued, and a worker
+# keeps what it actually updated.
+#
+# A failed job is retried after an exponential backoff until max_attempts,
+# then left FAILED with its traceback. A job whose worker died stays RUNNING
+# until its lease expires, when housekeeping() queues it again.
+
+HIGH, NORMAL, LOW = 10, 0, -10
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAX = timedelta(hours=1)
+LEASE = timedelta(minutes=15)
+KEEP_DONE = timedelta(days=7)
+
+
+def task_path(task):
+    if callable(task):
+        return f"{task.__module__}.{task.__qualname__}"
+    return task
+
+
+def enqueue(task, *args, priority=NORMAL, delay=None, key='', max_attempts=5, **kwargs):
+    """Queue task(*args, **kwargs) for a worker; task is a module-level
+    function or its dotted path, and the arguments must be JSON-serializable.
+
+    With a key, the job is dropped when one with the same key is already
+    queued (the returned job then has no pk).
+    """
+    job = Job(
+        task=task_path(task), args=list(args), kwargs=kwargs, priority=priority,
+        run_at=timezone.now() + (delay or timedelta()), max_attempts=max_attempts, key=key,
+    )
+    if not key:
+        job.save()
+        return job
+    # One INSERT, which the unique constraint turns down when a job with the
+    # key is queued. Inside a transaction it needs a savepoint to fail
+    # safely; in autocommit (as after checkout) it doesn't.
+    try:
+        with transaction.atomic() if connection.in_atomic_block else nullcontext():
+            job.save()
+    except IntegrityError:
+        job.pk = None
+    return job
+
+
+def claim(worker, limit=1):
+    """Mark up to limit ready jobs as running under worker and return them."""
+    now = timezone.now()
+    ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'pk')
+    take = {'status': Job.RUNNING, 'locked_by': worker, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**take)
+    else:
+        ids = list(ready.values_list('pk', flat=True)[:limit])
+        Job.objects.filter(pk__in=ids, status=Job.QUEUED, run_at__lte=now).update(**take)
+    # A worker claims one batch at a time, so (worker, locked_at) names this one.
+    return list(Job.objects.filter(pk__in=ids, locked_by=worker, locked_at=now).order_by('-priority', 'run_at', 'pk'))
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)  # jitter, so failed batches don't retry in step
+
+
+def _held(job):
+    # Only the claim that ran the job may record its outcome: after a lease
+    # expired, another worker may hold it.
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, locked_at=job.locked_at)
+
+
+def complete(job):
+    return _held(job).update(status=Job.DONE, finished_at=timezone.now(), locked_by='', last_error='')
+
+
+def fail(job, error):
+    """Record a failed attempt: queue the job again after a backoff, or mark it
+    FAILED when it's out of attempts. error is an exception or a message."""
+    if isinstance(error, BaseException):
+        error = ''.join(traceback.format_exception(error))
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        return _held(job).update(status=Job.FAILED, finished_at=now, locked_by='', last_error=error)
+    return _requeue(_held(job), run_at=now + backoff(job.attempts), last_error=error)
+
+
+def _requeue(jobs, **fields):
+    try:
+        with transaction.atomic():
+            return jobs.update(status=Job.QUEUED, locked_by='', **fields)
+    except IntegrityError:
+        # A job with the same key was queued meanwhile; it will do the work.
+        return jobs.delete()[0]
+
+
+def retry(jobs):
+    """Queue the FAILED jobs among jobs again, with fresh attempts."""
+    return sum(
+        _requeue(Job.objects.filter(pk=job.pk, status=Job.FAILED), run_at=timezone.now(), attempts=0, finished_at=None)
+        for job in jobs.filter(status=Job.FAILED)
+    )
+
+
+def housekeeping(now=None):
+    """Requeue jobs whose worker stopped answering, and purge old finished ones."""
+    now = now or timezone.now()
+    lost = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - LEASE)
+    lost.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', last_error="Worker lost; no attempts left.",
+    )
+    for job in lost:
+        _requeue(Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_at=job.locked_at),
+                 run_at=now, last_error="Worker lost; requeued.")
+    Job.objects.filter(status=Job.DONE, finished_at__lt=now - KEEP_DONE).delete()
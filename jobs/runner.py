@@ -0,0 +1,22 @@
+import django
+
+# Runs in the worker's pool processes. Spawned processes start with nothing
+# set up and import this module first, so it must not import models at the
+# top.
+
+
+def setup_process():
+    """Pool initializer."""
+    django.setup()
+
+
+def run_task(task, args, kwargs):
+    from django.db import close_old_connections
+    from django.utils.module_loading import import_string
+
+    # Like a request: connections past CONN_MAX_AGE, or broken, are dropped.
+    close_old_connections()
+    try:
+        import_string(task)(*args, **kwargs)
+    finally:
+        close_old_connections()
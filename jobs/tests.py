@@ -0,0 +1,95 @@
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import HIGH, LEASE, LOW, KEEP_DONE, claim, complete, enqueue, housekeeping, retry
+from .worker import Worker
+
+
+# Tasks, called by dotted path.
+def touch(path, text=''):
+    Path(path).write_text(text)
+
+
+def explode():
+    raise ValueError("boom")
+
+
+class QueueTests(TestCase):
+    def test_enqueue_and_run(self):
+        with tempfile.TemporaryDirectory() as folder:
+            target = Path(folder) / 'out.txt'
+            job = enqueue(touch, str(target), text="hello")
+            self.assertEqual(job.task, 'jobs.tests.touch')
+            self.assertEqual(Worker().run(once=True), {'done': 1, 'failed': 0})
+            self.assertEqual(target.read_text(), "hello")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+
+    def test_claims_by_priority_and_skips_delayed_jobs(self):
+        low = enqueue('jobs.tests.touch', '/dev/null', priority=LOW)
+        normal = enqueue('jobs.tests.touch', '/dev/null')
+        high = enqueue('jobs.tests.touch', '/dev/null', priority=HIGH)
+        enqueue('jobs.tests.touch', '/dev/null', priority=HIGH, delay=timedelta(minutes=5))
+        self.assertEqual([job.pk for job in claim('a', limit=10)], [high.pk, normal.pk, low.pk])
+        self.assertEqual(claim('b', limit=10), [])  # taken, or not due yet
+
+    def test_key_keeps_one_queued_job(self):
+        enqueue('jobs.tests.touch', '/dev/null', key='once')
+        self.assertIsNone(enqueue('jobs.tests.touch', '/dev/null', key='once').pk)
+        job, = claim('a')
+        enqueue('jobs.tests.touch', '/dev/null', key='once')  # queued again while the first runs
+        self.assertEqual(Job.objects.filter(key='once').count(), 2)
+        complete(job)
+
+    def test_failures_back_off_then_fail(self):
+        job = enqueue(explode, max_attempts=2)
+        Worker().run(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("ValueError: boom", job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        Worker().run(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+        self.assertEqual(retry(Job.objects.all()), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 0))
+
+    def test_housekeeping_requeues_lost_jobs_and_purges_old_ones(self):
+        lost = enqueue('jobs.tests.touch', '/dev/null')
+        stale, = claim('dead-worker')
+        old = enqueue('jobs.tests.touch', '/dev/null')
+        Job.objects.filter(pk=old.pk).update(status=Job.DONE, finished_at=timezone.now() - KEEP_DONE * 2)
+
+        housekeeping(now=timezone.now() + LEASE * 2)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.locked_by), (Job.QUEUED, ''))
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+        # The dead worker's claim no longer holds the job.
+        claim('live-worker')
+        self.assertEqual(complete(stale), 0)
+
+    def test_process_pool(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for n in range(3):
+                enqueue(touch, str(Path(folder) / f"{n}.txt"))
+            enqueue(explode)
+            self.assertEqual(Worker(processes=2).run(once=True), {'done': 3, 'failed': 1})
+            self.assertEqual(len(list(Path(folder).glob('*.txt'))), 3)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+    def test_run_worker_command(self):
+        enqueue('jobs.tests.touch', '/dev/null')
+        out = StringIO()
+        call_command('run_worker', once=True, processes=0, stdout=out)
+        self.assertIn("Ran 1 jobs: 1 done, 0 failed.", out.getvalue())
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .queue import claim, complete, fail, housekeeping
+from .runner import run_task, setup_process
+
+HOUSEKEEPING_EVERY = 60  # seconds
+
+
+class Worker:
+    """Claims jobs and runs them, in this process or in a pool of processes.
+
+    The worker does the queue bookkeeping; the pool processes only call the
+    tasks. A pool process that dies fails the jobs it had and the pool is
+    started again.
+    """
+
+    def __init__(self, processes=0, poll_interval=1.0, name=None, on_finish=None):
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.on_finish = on_finish
+        self.stopping = False
+        self.counts = {'done': 0, 'failed': 0}
+
+    def stop(self, *args):
+        """Stop claiming; jobs already running are finished first."""
+        self.stopping = True
+
+    def run(self, once=False):
+        """Work until stop(); with once, until no job is ready."""
+        pool = self._pool() if self.processes else None
+        running = {}  # future -> (job, started)
+        housekept = 0.0
+        try:
+            while not self.stopping:
+                if time.monotonic() - housekept >= HOUSEKEEPING_EVERY:
+                    housekeeping()
+                    housekept = time.monotonic()
+                free = max(self.processes, 1) - len(running)
+                jobs = claim(self.name, free) if free > 0 else []
+                for job in jobs:
+                    if pool is None:
+                        self._run_here(job)
+                    else:
+                        running[pool.submit(run_task, job.task, job.args, job.kwargs)] = job, time.monotonic()
+                if running:
+                    finished, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    if self._record(running, finished):
+                        pool.shutdown(cancel_futures=True)
+                        self._record(running, list(running))
+                        pool = self._pool()
+                elif not jobs:
+                    if once:
+                        break
+                    time.sleep(self.poll_interval)
+        finally:
+            if running:
+                self._record(running, wait(running).done)
+            if pool is not None:
+                pool.shutdown()
+        return self.counts
+
+    def _pool(self):
+        # spawn, not fork: the children get fresh database connections.
+        return ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=setup_process)
+
+    def _run_here(self, job):
+        started = time.monotonic()
+        try:
+            run_task(job.task, job.args, job.kwargs)
+        except Exception as exc:
+            self._finish(job, exc, started)
+        else:
+            self._finish(job, None, started)
+
+    def _record(self, running, finished):
+        """Record the finished futures; True when the pool broke."""
+        broken = False
+        for future in finished:
+            job, started = running.pop(future)
+            error = future.exception() if not future.cancelled() else BrokenProcessPool("Pool restarted.")
+            broken = broken or isinstance(error, BrokenProcessPool)
+            self._finish(job, error, started)
+        return broken
+
+    def _finish(self, job, error, started):
+        if error is None:
+            complete(job)
+            self.counts['done'] += 1
+        else:
+            fail(job, error)
+            self.counts['failed'] += 1
+        if self.on_finish:
+            self.on_finish(job, error, time.monotonic() - started)
@@ -1,23 +1,174 @@
 from django.contrib import admin
-from .models import Category, Product, Customer, Order
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+from .models import Category, Product, Customer, Order, OrderItem, DailySalesRollup
+from .search import filter_matching
+from .tracking import TRACKING_ID_RE
 
+# ----------------- Changelist Helpers -----------------
+class EstimatedCountPaginator(Paginator):
+    # An exact COUNT(*) over millions of rows costs more than the page itself.
+    # Unfiltered changelists on big tables show an estimate instead; a count
+    # that stops at exact_count_limit rows tells the big tables apart.
+    exact_count_limit = 10_000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            capped = queryset.order_by()[:self.exact_count_limit + 1].count()
+            if capped <= self.exact_count_limit:
+                return capped
+            estimate = estimate_row_count(queryset.model)
+            if estimate is not None and estimate > self.exact_count_limit:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and len(page.object_list) < self.per_page:
+            # A short page is the real end of the list, which an estimate
+            # (an upper bound, on SQLite) can overshoot: the page links stop
+            # here, and a page past the end is clamped to the last one.
+            if page.object_list:
+                self._settle((page.number - 1) * self.per_page + len(page.object_list))
+            elif page.number > 1:
+                self._settle(Paginator.count.func(self))
+                page = super().page(self.num_pages)
+        return page
+
+    def _settle(self, count):
+        self.estimated = False
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+
+def estimate_row_count(model):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    # Elsewhere the highest id is a one-seek upper bound (deleted rows leave
+    # gaps, which EstimatedCountPaginator.page() corrects for at the end).
+    return model._default_manager.aggregate(highest=Max('pk'))['highest']
+
+def filter_name_prefix(queryset, field, term):
+    """Case-insensitive prefix match. An ASCII term is written as a range on
+    Lower(field), so it can use an index on that expression (LIKE on an
+    expression can't). SQLite's LOWER() only folds ASCII letters, which
+    Python's lower() would disagree with, so other terms use istartswith and
+    scan."""
+    if not term.isascii():
+        return queryset.filter(**{f'{field}__istartswith': term})
+    prefix = term.lower()
+    return queryset.annotate(**{f'{field}_lower': Lower(field)}).filter(**{
+        f'{field}_lower__gte': prefix,
+        f'{field}_lower__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1),
+    })
+
+def filter_email(queryset, field, email):
+    """Case-insensitive email match. An ASCII address is an equality on
+    Lower(field), which an index on that expression serves (SQLite runs
+    iexact as LIKE, which no index does); others fall back to iexact."""
+    if not email.isascii():
+        return queryset.filter(**{f'{field}__iexact': email})
+    return queryset.annotate(**{f'{field}_lower': Lower(field)}).filter(**{f'{field}_lower': email.lower()})
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # skip the second, unfiltered COUNT(*)
+
+# ----------------- Model Admins -----------------
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name']
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ScalableAdmin):
     list_display = ['name', 'price', 'stock', 'category']
     list_filter = ['category']
+    list_select_related = ['category']
     search_fields = ['name', 'description']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of LIKE '%term%' on two columns.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(ScalableAdmin):
     list_display = ['full_name', 'email', 'created_at']
     search_fields = ['full_name', 'email']
+    # Names match from their start, not anywhere in them: a substring search
+    # (LIKE '%term%') can't use an index and scans every customer.
+    search_help_text = "An email address, or the start of a customer's name."
+
+    def get_search_results(self, request, queryset, search_term):
+        # Email or name prefix, on the Lower(email) and Lower(full_name)
+        # indexes (for ASCII terms; see filter_name_prefix).
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return filter_email(queryset, 'email', search_term), False
+        return filter_name_prefix(queryset, 'full_name', search_term), False
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    fields = ['product', 'name', 'quantity', 'unit_price', 'subtotal']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ScalableAdmin):
+    inlines = [OrderItemInline]
     list_display = ['tracking_id', 'customer', 'status', 'payment_status', 'total_price', 'created_at']
-    list_filter = ['status', 'payment_status']
-    search_fields = ['tracking_id', 'customer__full_name']
+    list_filter = ['status', 'payment_status', 'created_at']
+    list_select_related = ['customer']
+    # Newest first by date (the admin adds -pk as the tie-break), so a
+    # status or payment filter reads its (field, created_at) index in order.
+    ordering = ['-created_at']
+    search_fields = ['tracking_id', 'customer__full_name', 'customer__email']
+    raw_id_fields = ['customer']
+
+    search_help_text = "A tracking id, a customer's email address, or the start of their name."
+
+    def get_search_results(self, request, queryset, search_term):
+        # Tracking id is an exact lookup on its unique index, email one on the
+        # Lower(email) index; anything else is a customer name prefix on the
+        # Lower(full_name) index.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if TRACKING_ID_RE.match(search_term.upper()):
+            return queryset.filter(tracking_id=search_term.upper()), False
+        if '@' in search_term:
+            customers = filter_email(Customer.objects.all(), 'email', search_term)
+        else:
+            customers = filter_name_prefix(Customer.objects.all(), 'full_name', search_term)
+        return queryset.filter(customer__in=customers.values('pk')), False
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    # Filled by the rollup_sales command; read-only here.
+    list_display = ['day', 'category', 'payment_method', 'order_count', 'units', 'revenue']
+    list_filter = ['payment_method', 'category']
+    date_hierarchy = 'day'
+    ordering = ['-day', 'category', 'payment_method']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
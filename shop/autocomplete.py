@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connections
+
+from .catalog import catalog_version
+from .models import Category, Product
+from .search import TOKEN_RE
+
+# ----------------- Autocomplete -----------------
+# Typeahead is answered from a sorted in-memory prefix index held per worker,
+# so a keystroke costs a bisect instead of a query. Every word of a product or
+# category name starts a key ("red running shoes" is found by "run" and
+# "shoes" as well as "red"), keys are truncated to KEY_LENGTH to bound memory,
+# and the index is rebuilt, off the request thread, when the catalog version
+# moves on.
+
+KEY_LENGTH = 32
+MAX_RESULTS = 8
+MAX_QUERY_LENGTH = 64
+PRODUCT, CATEGORY = 'product', 'category'
+RETRY_AFTER = 30  # seconds before a failed background rebuild is tried again
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall(text.lower()))
+
+
+class PrefixIndex:
+    __slots__ = ('version', 'keys', 'refs', 'entries')
+
+    def __init__(self, version, entries):
+        # entries: (kind, id, name); keys[i] points at entries[refs[i]]
+        self.version = version
+        self.entries = tuple(entries)
+        pairs = []
+        for ref, (_, _, name) in enumerate(self.entries):
+            normalized = normalize(name)
+            for match in TOKEN_RE.finditer(normalized):
+                pairs.append((normalized[match.start():match.start() + KEY_LENGTH], ref))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.refs = [ref for _, ref in pairs]
+
+    def lookup(self, prefix, limit=MAX_RESULTS):
+        prefix = normalize(prefix[:MAX_QUERY_LENGTH])
+        if not prefix:
+            return []
+        probe = prefix[:KEY_LENGTH]
+        found, seen = [], set()
+        for i in range(bisect_left(self.keys, probe), len(self.keys)):
+            if not self.keys[i].startswith(probe):
+                break
+            ref = self.refs[i]
+            if ref in seen:
+                continue
+            seen.add(ref)
+            entry = self.entries[ref]
+            # Keys are truncated; longer queries are confirmed on the full name.
+            if len(prefix) > KEY_LENGTH and not _has_word_prefix(entry[2], prefix):
+                continue
+            found.append(entry)
+            if len(found) >= limit:
+                break
+        return found
+
+
+def _has_word_prefix(name, prefix):
+    normalized = normalize(name)
+    return any(normalized.startswith(prefix, m.start()) for m in TOKEN_RE.finditer(normalized))
+
+
+def build_index(version):
+    entries = [(CATEGORY, pk, name) for pk, name in Category.objects.values_list('id', 'name')]
+    entries += [(PRODUCT, pk, name) for pk, name in Product.objects.values_list('id', 'name').iterator(chunk_size=5000)]
+    return PrefixIndex(version, entries)
+
+
+_index = None
+_building = threading.Lock()
+_retry_at = 0.0  # monotonic time before which no background rebuild starts
+
+
+def get_index():
+    """Return the current index, rebuilding it if the catalog has changed.
+
+    Only the first build is waited for. After that a rebuild runs in a
+    background thread, and every request keeps answering from the old index
+    until the new one replaces it; if the rebuild fails, the old index is
+    kept for RETRY_AFTER seconds before another is tried.
+    """
+    version = catalog_version()
+    index = _index
+    if index is not None and (index.version == version or time.monotonic() < _retry_at):
+        return index
+    if _building.acquire(blocking=index is None):
+        if index is None:
+            _rebuild(version)
+        else:
+            _in_background(_rebuild, version)
+    return index or _index
+
+
+def _rebuild(version):
+    # Called holding _building, which it releases.
+    global _index, _retry_at
+    try:
+        if _index is None or _index.version != version:
+            _index = build_index(version)
+    except Exception:
+        if _index is None:
+            raise  # the first build is the request's own
+        _retry_at = time.monotonic() + RETRY_AFTER
+        logger.exception("Autocomplete index rebuild failed; retrying in %ss", RETRY_AFTER)
+    finally:
+        _building.release()
+
+
+def _in_background(func, *args):
+    def run():
+        try:
+            func(*args)
+        finally:
+            connections.close_all()  # this thread's own connections
+    threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
@@ -0,0 +1,263 @@
+import itertools
+import json
+import re
+import time
+from contextlib import ExitStack
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from .benchmarks import percentile, seed_blog, seed_orders, seed_products
+from .catalog import bump_catalog_version
+from .models import Category, Product
+from .page_cache import BLOG_VERSION_KEY
+from .reports import roll_up_sales
+from .search import fts_enabled, rebuild_search_index
+from .versions import bump_content_version
+
+# ----------------- Endpoint Benchmarks -----------------
+# Every URL in shop.urls, blog.urls and accounts.urls, driven in-process
+# through the test client against a seeded dataset. Each endpoint declares
+# a query budget: the most SQL statements any single request may run,
+# whatever the dataset size. The suite records latency percentiles and the
+# worst query count per endpoint; the bench_endpoints command compares them
+# with a stored baseline and fails on budget overruns, and the tests check
+# the budgets on a small dataset.
+#
+# Setup that isn't part of the request (logging in, making a post to
+# delete) runs in an endpoint's `before` hook, outside the timing and the
+# query count.
+
+PASSWORD = 'Bench-pass-2024!'
+SAVEPOINT_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+class Dataset:
+    """The seeded rows the endpoints point at."""
+
+    def __init__(self, size):
+        self.size = size
+        self._counter = itertools.count()
+        self.category_id = Category.objects.order_by('id').values_list('id', flat=True).first()
+        self.product = Product.objects.create(
+            name="Bench wireless speaker", price=25, stock=10 ** 9, description="Kept in stock for checkouts",
+        )
+        from blog.models import BlogPost, Tag
+        self.post = BlogPost.objects.order_by('id').first()
+        self.tag_slug = Tag.objects.order_by('id').values_list('slug', flat=True).first()
+        self.tracking_id = f"{size // 2:012X}"
+        self.shopper = User.objects.create_user('shopper', 'shopper@example.com', PASSWORD)
+        self.staff = User.objects.create_user('staff', 'staff@example.com', PASSWORD, is_staff=True)
+        self.scratch = None
+
+    def unique(self, prefix):
+        return f"{prefix}{next(self._counter)}"
+
+
+def seed_dataset(size, seed=0):
+    """size products, orders and blog posts, plus the bench users."""
+    categories = Category.objects.bulk_create([Category(name=f"Category {i}") for i in range(10)])
+    seed_products(size, seed=seed, categories=categories)
+    seed_orders(size, seed=seed)
+    seed_blog(size, seed=seed)
+    roll_up_sales()
+    if fts_enabled():
+        rebuild_search_index()
+    dataset = Dataset(size)
+    bump_catalog_version()
+    bump_content_version(BLOG_VERSION_KEY)
+    return dataset
+
+
+# ----------------- Endpoints -----------------
+class Endpoint(NamedTuple):
+    name: str
+    url: Callable  # dataset -> path
+    budget: int  # most queries any one request may run
+    method: str = 'get'
+    data: Optional[Callable] = None  # dataset -> query string or form dict
+    before: Optional[Callable] = None  # (client, dataset), untimed
+    status: int = 200
+
+
+def login(attr):
+    def before(client, dataset):
+        # Fetched afresh: change_password rehashes the password, and a stale
+        # hash in the session would sign the client straight out again.
+        client.force_login(User.objects.get(pk=getattr(dataset, attr).pk))
+    return before
+
+
+def fresh_user(client, dataset):
+    dataset.scratch = User.objects.create_user(dataset.unique('leaver'), password=PASSWORD)
+    client.force_login(dataset.scratch)
+
+
+def scratch_post(client, dataset):
+    from blog.models import BlogPost
+    dataset.scratch = BlogPost.objects.create(title=dataset.unique("Draft "), author="bench", excerpt="", content="")
+
+
+def cart_with_product(client, dataset):
+    # Through the view, so it works with whichever CART_STORAGE is configured.
+    client.post(reverse('shop_add_multiple_to_cart'), {f'quantity_{dataset.product.id}': 1})
+
+
+def url(name, *args):
+    return lambda dataset: reverse(name, args=[arg(dataset) if callable(arg) else arg for arg in args])
+
+
+def const(value):
+    return lambda dataset: value
+
+
+ENDPOINTS = [
+    # shop.urls
+    Endpoint('shop_home', url('shop_home'), 3),
+    Endpoint('shop_home?category', url('shop_home'), 3,
+             data=lambda d: {'category': d.category_id, 'sort': 'price'}),
+    Endpoint('shop_about', url('shop_about'), 5),
+    Endpoint('shop_contact', url('shop_contact'), 0),
+    Endpoint('shop_products', url('shop_products'), 3),
+    Endpoint('shop_search', url('shop_search'), 2, data=const({'query': 'wireless speaker'})),
+    Endpoint('shop_autocomplete', url('shop_autocomplete'), 2, data=const({'q': 'wir'})),
+    Endpoint('shop_track_order', url('shop_track_order'), 0),
+    Endpoint('shop_track_order POST', url('shop_track_order'), 3, method='post',
+             data=lambda d: {'tracking_id': d.tracking_id}),
+    Endpoint('shop_cart', url('shop_cart'), 1, before=cart_with_product),
+    Endpoint('shop_cart?add', url('shop_cart'), 1, data=lambda d: {'add': d.product.id}, status=302),
+    Endpoint('shop_checkout', url('shop_checkout'), 1, before=cart_with_product),
+    # 8: the first order in each minute also queues its sales rollup run.
+    Endpoint('shop_checkout POST', url('shop_checkout'), 8, method='post', before=cart_with_product,
+             data=const({'full_name': "Bench Buyer", 'email': 'buyer@example.com',
+                         'address': "1 Bench Road", 'payment_method': 'card'})),
+    Endpoint('shop_add_multiple_to_cart', url('shop_add_multiple_to_cart'), 1, method='post',
+             data=lambda d: {f'quantity_{d.product.id}': 2}, status=302),
+    Endpoint('shop_sales_report', url('shop_sales_report'), 9, before=login('staff')),
+    # blog.urls. Each write includes the 3 statements of its content version
+    # bump (BEGIN, UPDATE, SELECT; see shop.versions).
+    Endpoint('blog_home', url('blog_home'), 2),
+    Endpoint('blog_post_detail', url('blog_post_detail', lambda d: d.post.slug), 2),
+    Endpoint('blog_post_edit', url('blog_post_edit', lambda d: d.post.pk), 2),
+    Endpoint('blog_post_edit POST', url('blog_post_edit', lambda d: d.post.pk), 9, method='post',
+             data=lambda d: {'title': d.post.title, 'author': d.post.author, 'excerpt': 'Edited',
+                             'content': 'Edited'}, status=302),
+    Endpoint('blog_post_delete', url('blog_post_delete', lambda d: d.scratch.slug), 9,
+             before=scratch_post, status=302),
+    Endpoint('blog_post_create', url('blog_post_create'), 1),
+    Endpoint('blog_post_create POST', url('blog_post_create'), 7, method='post',
+             data=lambda d: {'title': d.unique("Bench post "), 'author': "bench", 'excerpt': "e",
+                             'content': "c"}, status=302),
+    Endpoint('blog_about', url('blog_about'), 2),
+    Endpoint('blog_about POST', url('blog_about'), 5, method='post',
+             data=const({'comment_submit': '1', 'name': "Reader", 'comment': "Great shop"}), status=302),
+    Endpoint('blog_contact', url('blog_contact'), 0),
+    Endpoint('blog_posts_by_tag', url('blog_posts_by_tag', lambda d: d.tag_slug), 3),
+    Endpoint('add_rating', url('add_rating', lambda d: d.post.slug), 5, method='post',
+             data=const({'rating': 4}), status=302),
+    Endpoint('add_comment', url('add_comment', lambda d: d.post.slug), 5, method='post',
+             data=const({'name': "Reader", 'comment': "Thanks"}), status=302),
+    # accounts.urls
+    Endpoint('home', url('home'), 0),
+    Endpoint('signup', url('signup'), 0),
+    Endpoint('signup POST', url('signup'), 4, method='post',
+             data=lambda d: {'username': d.unique('newcomer'), 'password1': PASSWORD, 'password2': PASSWORD},
+             status=302),
+    Endpoint('login', url('login'), 0),
+    Endpoint('login POST', url('login'), 7, method='post',
+             data=const({'username': 'shopper', 'password': PASSWORD}), status=302),
+    Endpoint('profile', url('profile'), 6, before=login('shopper')),
+    Endpoint('logout POST', url('logout'), 4, method='post', before=login('shopper'), status=302),
+    Endpoint('change_password', url('change_password'), 4, before=login('shopper')),
+    Endpoint('change_password POST', url('change_password'), 10, method='post', before=login('shopper'),
+             data=const({'old_password': PASSWORD, 'new_password1': PASSWORD, 'new_password2': PASSWORD}),
+             status=302),
+    Endpoint('change_email', url('change_email'), 4, before=login('shopper')),
+    Endpoint('change_email POST', url('change_email'), 6, method='post', before=login('shopper'),
+             data=lambda d: dict.fromkeys(['new_email', 'confirm_email'], f"{d.unique('shopper')}@example.com"),
+             status=302),
+    Endpoint('delete_account', url('delete_account'), 4, before=fresh_user),
+    Endpoint('delete_account POST', url('delete_account'), 12, method='post', before=fresh_user,
+             data=const({'confirm': 'on'}), status=302),
+]
+
+
+# ----------------- Running -----------------
+class EndpointResult(NamedTuple):
+    name: str
+    timings: list  # sorted, ms
+    queries: int  # the most any one request ran
+    budget: int
+    statuses: tuple
+    expected_status: int
+
+    @property
+    def over_budget(self):
+        return self.queries > self.budget
+
+    @property
+    def failed(self):
+        """Some response wasn't the expected one, so the timings are suspect."""
+        return self.statuses != (self.expected_status,)
+
+    def summary(self):
+        return {
+            'p50': round(percentile(self.timings, 50), 3),
+            'p95': round(percentile(self.timings, 95), 3),
+            'p99': round(percentile(self.timings, 99), 3),
+            'queries': self.queries,
+        }
+
+
+def run_endpoint(endpoint, dataset, requests):
+    client = Client()
+    timings, most, statuses = [], 0, set()
+    count = 0
+
+    def counter(execute, sql, params, many, context):
+        nonlocal count
+        # Savepoints only show up when the suite itself runs inside a
+        # transaction (as under TestCase); they aren't the view's queries.
+        if not SAVEPOINT_RE.match(sql):
+            count += 1
+        return execute(sql, params, many, context)
+
+    for _ in range(requests):
+        if endpoint.before:
+            endpoint.before(client, dataset)
+        path = endpoint.url(dataset)
+        data = endpoint.data(dataset) if endpoint.data else None
+        count = 0
+        with ExitStack() as stack:
+            for alias in connections:  # reads may go to the replica
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            started = time.perf_counter()
+            response = getattr(client, endpoint.method)(path, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        most = max(most, count)
+        statuses.add(response.status_code)
+    return EndpointResult(
+        endpoint.name, sorted(timings), most, endpoint.budget, tuple(sorted(statuses)), endpoint.status,
+    )
+
+
+def run_suite(dataset, requests, endpoints=ENDPOINTS):
+    return [run_endpoint(endpoint, dataset, requests) for endpoint in endpoints]
+
+
+# ----------------- Baselines -----------------
+def load_baseline(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, baseline):
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
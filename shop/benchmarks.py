@@ -0,0 +1,139 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, connections
+from django.utils import timezone
+
+from .models import Customer, Order, OrderItem, Product
+
+# ----------------- Benchmark Helpers -----------------
+# Shared by the bench_* management commands: a throwaway database to seed, a
+# deterministic synthetic catalog, and latency percentiles.
+
+ADJECTIVES = ['red', 'blue', 'wireless', 'leather', 'smart', 'vintage', 'silk', 'gaming', 'portable', 'organic']
+NOUNS = ['shoes', 'headphones', 'wallet', 'watch', 'scarf', 'camera', 'speaker', 'backpack', 'lamp', 'keyboard']
+BRANDS = [f"brand{i}" for i in range(500)]
+
+
+@contextmanager
+def scratch_database():
+    """Point the default connection, and the aliases that mirror it in tests
+    (the read replica), at a fresh test database for the duration."""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    mirrors = {}
+    for alias in connections:
+        if connections[alias].settings_dict['TEST'].get('MIRROR') == 'default':
+            mirrors[alias] = connections[alias].settings_dict
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict = settings_dict
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_products(count, seed=0, categories=None, batch_size=5000):
+    rng = random.Random(seed)
+    categories = categories or [None]
+    for start in range(0, count, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                description=" ".join(rng.choices(ADJECTIVES + NOUNS + BRANDS, k=12)),
+                price=Decimal(rng.randint(100, 99_999)) / 100,
+                stock=rng.randint(0, 50),
+                category=rng.choice(categories),
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+
+
+def seed_orders(count, seed=0, batch_size=5000):
+    """count orders of one line each over the last 60 days, one customer per
+    ten orders, with their OrderItem rows."""
+    rng = random.Random(seed)
+    products = list(Product.objects.values_list('id', 'name', 'price')[:1000])
+    now = timezone.now()
+    customers = Customer.objects.bulk_create([
+        Customer(full_name=f"Customer {i}", email=f"customer{i}@example.com", address=f"{i} High Street")
+        for i in range(max(1, count // 10))
+    ], batch_size=batch_size)
+    statuses = [value for value, _ in Order.STATUS_CHOICES]
+    for start in range(0, count, batch_size):
+        orders, lines = [], []
+        for i in range(start, min(start + batch_size, count)):
+            product_id, name, price = rng.choice(products)
+            quantity = rng.randint(1, 3)
+            created = now - timedelta(days=1 + rng.random() * 59)
+            orders.append(Order(
+                customer=rng.choice(customers),
+                items=[{'product_id': product_id, 'name': name, 'quantity': quantity,
+                        'unit_price': float(price), 'subtotal': float(price * quantity)}],
+                total_price=price * quantity,
+                tracking_id=f"{i:012X}",
+                status=rng.choice(statuses),
+                payment_method=rng.choice(['card', 'cod', 'paypal']),
+                created_at=created,
+            ))
+            lines.append((product_id, name, quantity, price, created))
+        orders = Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, name=name, quantity=quantity,
+                      unit_price=price, subtotal=price * quantity, created_at=created)
+            for order, (product_id, name, quantity, price, created) in zip(orders, lines)
+        ])
+
+
+def seed_blog(count, seed=0, tags=20, batch_size=5000):
+    """count posts with two tags each, plus about one comment and one
+    rating per post."""
+    from blog.models import AboutComment, AboutRating, BlogPost, Tag
+
+    rng = random.Random(seed)
+    tags = Tag.objects.bulk_create([Tag(name=f"topic {i}", slug=f"topic-{i}") for i in range(tags)])
+    for start in range(0, count, batch_size):
+        posts = BlogPost.objects.bulk_create([
+            BlogPost(
+                title=f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} notes {i}",
+                slug=f"post-{i}", author=rng.choice(BRANDS),
+                excerpt=" ".join(rng.choices(ADJECTIVES + NOUNS, k=20)),
+                content=" ".join(rng.choices(ADJECTIVES + NOUNS + BRANDS, k=200)),
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+        BlogPost.tags.through.objects.bulk_create([
+            BlogPost.tags.through(blogpost_id=post.id, tag_id=tag.id)
+            for post in posts for tag in rng.sample(tags, 2)
+        ])
+        AboutComment.objects.bulk_create([
+            AboutComment(blog_post=rng.choice(posts), name=f"Reader {i}", comment="Nice write-up.")
+            for i in range(len(posts))
+        ])
+        AboutRating.objects.bulk_create([AboutRating(blog_post=rng.choice(posts), rating=rng.randint(1, 5))
+                                         for _ in posts])
+
+
+def timed(run, args):
+    """Call run(arg) for each arg and return the sorted latencies in ms."""
+    timings = []
+    for arg in args:
+        started = time.perf_counter()
+        run(arg)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def percentile(sorted_timings, pct):
+    return sorted_timings[min(len(sorted_timings) - 1, int(len(sorted_timings) * pct / 100))]
+
+
+def summarize(sorted_timings):
+    mean = sum(sorted_timings) / len(sorted_timings)
+    return (f"mean={mean:.2f}ms p50={percentile(sorted_timings, 50):.2f}ms "
+            f"p95={percentile(sorted_timings, 95):.2f}ms p99={percentile(sorted_timings, 99):.2f}ms")
@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+from django.templatetags.static import static
+from django.utils.formats import localize
+from django.utils.html import format_html
+
+from .catalog import catalog_version
+from .templatetags.shop_extras import responsive_image
+
+# ----------------- Product Cards -----------------
+# Product grids print the same few values for every card. Views hand the
+# templates ProductCard records with all of them worked out up front: the
+# price as text, the image markup and the cart quantity. shop/product_cards.html
+# then only reads attributes; no filters, no dict lookups into the cart, no
+# storage URLs or derivative manifests per card.
+#
+# Image markup is memoized per worker by image name, alt text and catalog
+# version. Replacing a product image is a product save, which bumps the
+# version, so a stale <picture> is never served; the derivatives job bumps it
+# again once the new copies exist, so the plain <img> doesn't stick either.
+
+CARD_SIZES = "(min-width: 992px) 25vw, (min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw"
+MAX_CACHED_IMAGES = 4096
+
+
+class ProductCard:
+    # Numbers are stored as text: the template engine would otherwise run
+    # each one through localize() on every render.
+    __slots__ = ('id', 'name', 'price', 'image', 'quantity', 'in_cart')
+
+    def __init__(self, id, name, price, image, quantity=0):
+        self.id = str(id)
+        self.name = name
+        self.price = price  # formatted, without the currency
+        self.image = image  # safe HTML
+        self.quantity = str(quantity)
+        self.in_cart = quantity > 0
+
+    def __repr__(self):
+        return f"<ProductCard {self.id} {self.name!r} x{self.quantity}>"
+
+
+@lru_cache(maxsize=MAX_CACHED_IMAGES)
+def _image_html(name, alt, version):
+    return responsive_image(name, alt=alt, sizes=CARD_SIZES)
+
+
+@lru_cache(maxsize=1)
+def _placeholder_html(url):
+    return format_html('<img src="{}" alt="No Image Available">', url)
+
+
+def product_cards(products, quantities=None, version=None):
+    """Cards for Product instances or catalog ProductRecords, in order."""
+    quantities = quantities or {}
+    version = catalog_version() if version is None else version
+    placeholder = _placeholder_html(static('default-product.png'))
+    cards = []
+    for product in products:
+        name = getattr(product.image, 'name', product.image)
+        cards.append(ProductCard(
+            product.id,
+            product.name,
+            localize(product.price),
+            _image_html(name, product.name, version) if name else placeholder,
+            quantities.get(product.id, 0),
+        ))
+    return cards
+
+
+def category_cards(by_category, quantities=None, version=None):
+    """{category: [ProductCard]} for a catalog page's by_category."""
+    version = catalog_version() if version is None else version
+    return {category: product_cards(products, quantities, version) for category, products in by_category.items()}
@@ -0,0 +1,241 @@
+import base64
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+# ----------------- Cart Pricing -----------------
+# The cart is a {product_id: qty} mapping kept by one of the storages below.
+# Everything that needs to show or charge for it goes through price_cart(),
+# which loads every line in a single in_bulk() query, drops unknown / sold-out
+# products and caps each quantity at the stock on hand.
+
+PRICED_FIELDS = ('id', 'name', 'price', 'stock', 'image')
+
+
+def parse_cart(raw_cart):
+    """Return the cart as an ordered {product_id: qty} dict of positive ints."""
+    cart = {}
+    for pid, qty in (raw_cart or {}).items():
+        try:
+            pid, qty = int(pid), int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty > 0:
+            cart[pid] = cart.get(pid, 0) + qty
+    return cart
+
+
+class PricedCart:
+    def __init__(self, lines, adjusted=False):
+        self.lines = lines
+        self.adjusted = adjusted  # True when a line was dropped or capped
+        self.total = sum((line['subtotal'] for line in lines), Decimal('0.00'))
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def quantities(self):
+        """The cleaned cart, ready to store."""
+        return {line['id']: line['quantity'] for line in self.lines}
+
+    def order_items(self):
+        """Line snapshot stored on Order.items."""
+        return [{
+            'product_id': line['id'],
+            'name': line['name'],
+            'quantity': line['quantity'],
+            'unit_price': float(line['price']),
+            'subtotal': float(line['subtotal']),
+        } for line in self.lines]
+
+
+def price_cart(raw_cart):
+    cart = parse_cart(raw_cart)
+    adjusted = len(cart) != len(raw_cart or {})
+    products = Product.objects.only(*PRICED_FIELDS).in_bulk(list(cart)) if cart else {}
+
+    lines = []
+    for pid, requested in cart.items():
+        product = products.get(pid)
+        if product is None or product.stock <= 0:
+            adjusted = True
+            continue
+        quantity = min(requested, product.stock)
+        if quantity != requested:
+            adjusted = True
+        lines.append({
+            'id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'quantity': quantity,
+            'subtotal': product.price * quantity,
+            'image': product.image.url if product.image else None,
+        })
+    return PricedCart(lines, adjusted)
+
+
+# ----------------- Cart Storage -----------------
+# Where the cart is kept is set by settings.CART_STORAGE:
+#   SessionCartStorage  - in request.session (a session write per change)
+#   CookieCartStorage   - in a signed cookie of packed varints, no server state
+#   CacheCartStorage    - in the cache under a random id from a cookie, or
+#                         under the user for signed-in shoppers
+# Views reach it through get_cart(request); shop.middleware.CartMiddleware
+# writes cookies back. On login the anonymous cart is merged into the user's (see
+# shop.signals), keeping the larger quantity of any product in both.
+
+COOKIE_NAME = 'cart'
+COOKIE_AGE = 30 * 24 * 60 * 60
+MAX_LINES = 100  # keeps the cookie well under the 4 KB limit
+CACHE_PREFIX = 'shop:cart:'
+
+
+def pack_cart(cart):
+    """{id: qty} -> url-safe text: base64 of LEB128 varints id, qty, id, qty..."""
+    out = bytearray()
+    for number in (n for pair in list(cart.items())[:MAX_LINES] for n in pair):
+        while number > 0x7F:
+            out.append(number & 0x7F | 0x80)
+            number >>= 7
+        out.append(number)
+    return base64.urlsafe_b64encode(bytes(out)).decode().rstrip('=')
+
+
+def unpack_cart(text):
+    data = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+    numbers, number, shift = [], 0, 0
+    for byte in data:
+        number |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            numbers.append(number)
+            number, shift = 0, 0
+    return parse_cart(dict(zip(numbers[::2], numbers[1::2])))
+
+
+def merge_carts(*carts):
+    merged = {}
+    for cart in carts:
+        for pid, qty in cart.items():
+            merged[pid] = max(merged.get(pid, 0), qty)
+    return merged
+
+
+class CartStorage:
+    def __init__(self, request):
+        self.request = request
+        self.cookie = None  # value to set on the response; '' deletes it
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, cart):
+        raise NotImplementedError
+
+    def clear(self):
+        self.save({})
+
+    def merge_on_login(self):
+        pass
+
+    def on_logout(self):
+        pass
+
+    def update_response(self, response):
+        if self.cookie == '':
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        elif self.cookie is not None:
+            response.set_cookie(
+                COOKIE_NAME, self.cookie, max_age=COOKIE_AGE, httponly=True, samesite='Lax',
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+
+
+class SessionCartStorage(CartStorage):
+    def load(self):
+        return parse_cart(self.request.session.get('cart'))
+
+    def save(self, cart):
+        self.request.session['cart'] = {str(pid): qty for pid, qty in cart.items()}
+
+
+class CookieCartStorage(CartStorage):
+    signer = signing.Signer(salt='shop.cart')
+
+    def load(self):
+        value = self.request.COOKIES.get(COOKIE_NAME)
+        if not value:
+            return {}
+        try:
+            return unpack_cart(self.signer.unsign(value))
+        except (signing.BadSignature, ValueError):
+            return {}
+
+    def save(self, cart):
+        self.cookie = self.signer.sign(pack_cart(cart)) if cart else ''
+
+    def on_logout(self):
+        # The session used to hold the cart and went with it; keep that.
+        self.clear()
+
+
+class CacheCartStorage(CartStorage):
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.COOKIES.get(COOKIE_NAME, '')
+
+    def key(self):
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"{CACHE_PREFIX}user:{user.pk}"
+        return f"{CACHE_PREFIX}{self.cart_id}" if self.cart_id else None
+
+    def load(self):
+        key = self.key()
+        return parse_cart(cache.get(key)) if key else {}
+
+    def save(self, cart):
+        key = self.key()
+        if key is None:
+            if not cart:
+                return
+            self.cart_id = self.cookie = secrets.token_urlsafe(16)
+            key = self.key()
+        if cart:
+            cache.set(key, cart, COOKIE_AGE)
+        else:
+            cache.delete(key)
+
+    def merge_on_login(self):
+        if not self.cart_id:
+            return
+        anonymous = cache.get(f"{CACHE_PREFIX}{self.cart_id}")
+        if anonymous:
+            self.save(merge_carts(self.load(), parse_cart(anonymous)))
+        cache.delete(f"{CACHE_PREFIX}{self.cart_id}")
+        self.cart_id, self.cookie = '', ''
+
+    def on_logout(self):
+        # The user's cart stays under their account for next time.
+        if self.cart_id:
+            self.cart_id, self.cookie = '', ''
+
+
+def get_cart(request):
+    """The request's cart storage, created on first use."""
+    storage = getattr(request, '_cart_storage', None)
+    if storage is None:
+        storage_class = import_string(getattr(settings, 'CART_STORAGE', 'shop.cart.SessionCartStorage'))
+        storage = request._cart_storage = storage_class(request)
+    return storage
+
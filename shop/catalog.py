@@ -0,0 +1,317 @@
+import base64
+import json
+import random
+import threading
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+
+from django.db.models import Max, Min, Q
+
+from .models import Category, Product
+from .versions import acontent_version, bump_content_version, content_version
+
+# ----------------- Catalog Snapshot -----------------
+# Catalog pages are read far more often than the catalog changes. Each worker
+# keeps one snapshot per catalog version holding the category list and the
+# pages it has already served, as immutable, compact per-product records. The
+# shared catalog version (bumped by the Product/Category signals) retires the
+# whole snapshot at once.
+#
+# Pages are fetched with keyset pagination: the cursor is the sort key of the
+# last row shown, and the next page is a handful of index seeks on the
+# composite indexes declared on Product, so a page costs the same however deep
+# it is and however large the table grows.
+
+CATALOG_VERSION_KEY = 'shop:catalog_version'
+UNCATEGORIZED = "Uncategorized"
+PAGE_SIZE = 24
+MAX_CACHED_PAGES = 256
+SORT_KEYS = {
+    'id': ('category_id', 'id'),
+    'price': ('category_id', 'price', 'id'),
+}
+
+
+class ProductRecord(NamedTuple):
+    id: int
+    name: str
+    price: Decimal
+    stock: int
+    category: str
+    image: str  # storage name, '' when there is none
+
+    @property
+    def in_stock(self):
+        return self.stock > 0
+
+
+class CatalogQuery(NamedTuple):
+    in_stock: bool = True
+    category_id: Optional[int] = None
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    sort: str = 'id'
+    cursor: tuple = ()
+
+    @classmethod
+    def from_request(cls, request, **defaults):
+        params = request.GET
+        query = cls(**defaults)._replace(
+            category_id=_parse(int, params.get('category')),
+            min_price=_parse(Decimal, params.get('min_price')),
+            max_price=_parse(Decimal, params.get('max_price')),
+            sort=params.get('sort') if params.get('sort') in SORT_KEYS else 'id',
+        )
+        return query._replace(cursor=query.decode_cursor(params.get('after', '')))
+
+    @property
+    def keys(self):
+        keys = SORT_KEYS[self.sort]
+        # A category filter pins the leading key; seek on the rest.
+        return keys[1:] if self.category_id is not None else keys
+
+    def encode_cursor(self, product):
+        values = {'category_id': product.category_id, 'price': str(product.price), 'id': product.id}
+        raw = json.dumps([values[key] for key in self.keys], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return ()
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                return ()
+            types = {'category_id': int, 'price': Decimal, 'id': int}
+            cursor = tuple(
+                None if value is None and key == 'category_id' else types[key](str(value))
+                for key, value in zip(self.keys, values)
+            )
+        except (ValueError, TypeError, InvalidOperation):
+            return ()
+        if any(isinstance(value, Decimal) and not value.is_finite() for value in cursor):
+            return ()
+        return cursor
+
+
+def _parse(type_, value):
+    try:
+        value = type_(value) if value not in (None, '') else None
+    except (ValueError, InvalidOperation):
+        return None
+    if isinstance(value, Decimal) and not value.is_finite():
+        return None
+    return value
+
+
+class CatalogPage(NamedTuple):
+    products: tuple
+    by_category: dict
+    next_cursor: Optional[str]
+
+
+def _category_list():
+    return Category.objects.order_by('name').values_list('id', 'name')
+
+
+class CatalogSnapshot:
+    __slots__ = ('version', 'categories', 'pages', 'lock', '_image_id_bounds')
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = categories
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+        self._image_id_bounds = None
+
+    @property
+    def image_id_bounds(self):
+        """(lowest, highest) id of the products that have an image, or None."""
+        if self._image_id_bounds is None:
+            bounds = Product.objects.filter(WITH_IMAGE).aggregate(low=Min('id'), high=Max('id'))
+            self._image_id_bounds = (bounds['low'], bounds['high']) if bounds['low'] is not None else ()
+        return self._image_id_bounds or None
+
+    def page(self, query, page_size=PAGE_SIZE):
+        page = self._cached_page((query, page_size))
+        if page is None:
+            page = self._keep_page((query, page_size), fetch_page(query, page_size))
+        return page
+
+    async def apage(self, query, page_size=PAGE_SIZE):
+        page = self._cached_page((query, page_size))
+        if page is None:
+            page = self._keep_page((query, page_size), await afetch_page(query, page_size))
+        return page
+
+    def _cached_page(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+            return page
+
+    def _keep_page(self, key, page):
+        with self.lock:
+            self.pages[key] = page
+            if len(self.pages) > MAX_CACHED_PAGES:
+                self.pages.popitem(last=False)
+        return page
+
+
+# ----------------- Featured Products -----------------
+# Random picks probe a random id between the lowest and highest image-bearing
+# product and take the first one at or after it: one index seek each, with no
+# id list held in memory, so cost stays flat however large the catalog grows.
+# Products that follow a gap in the ids are slightly more likely to be picked,
+# which is fine for a showcase.
+
+WITH_IMAGE = Q(image__isnull=False) & ~Q(image='')
+
+
+def featured_products(count=3, rng=random):
+    bounds = get_catalog().image_id_bounds
+    if not bounds:
+        return []
+    low, high = bounds
+    with_image = Product.objects.filter(WITH_IMAGE).only('id', 'name', 'description', 'image').order_by('id')
+    picked = {}
+    # A few spare probes in case two of them land on the same product.
+    for _ in range(count * 3):
+        if len(picked) >= count:
+            break
+        product = with_image.filter(id__gte=rng.randint(low, high)).first() or with_image.first()
+        if product is None:
+            break
+        picked.setdefault(product.id, product)
+    return list(picked.values())
+
+
+def _after(key, value):
+    # NULL categories sort first, so "after NULL" is "any category at all".
+    if value is None:
+        return {f'{key}__isnull': False}
+    return {f'{key}__gt': value}
+
+
+def _seek_ranges(keys, cursor):
+    """Yield (filters, ordering) for each index range following the cursor.
+
+    A keyset predicate like (category, price, id) > (c, p, i) can't be served
+    by one ordered index range, so it is split into the ranges that follow it
+    in key order: (c, p, id > i), then (c, price > p), then (category > c).
+    An empty cursor (or one shorter than the keys) starts at its prefix.
+    """
+    if not cursor:
+        if keys[0] == 'category_id':
+            yield {'category_id': None}, keys[1:]
+            yield {'category_id__isnull': False}, keys
+        else:
+            yield {}, keys
+        return
+    for i in reversed(range(len(cursor))):
+        filters = dict(zip(keys[:i], cursor[:i]))
+        filters.update(_after(keys[i], cursor[i]))
+        yield filters, keys[i:]
+
+
+def _page_queryset(query):
+    base = Product.objects.select_related('category').only(
+        'id', 'name', 'price', 'stock', 'image', 'category_id', 'category__name',
+    )
+    if query.in_stock:
+        base = base.filter(stock__gt=0)
+    if query.category_id is not None:
+        base = base.filter(category_id=query.category_id)
+    if query.min_price is not None:
+        base = base.filter(price__gte=query.min_price)
+    if query.max_price is not None:
+        base = base.filter(price__lte=query.max_price)
+    return base
+
+
+def fetch_page(query, page_size=PAGE_SIZE):
+    base = _page_queryset(query)
+    rows = []
+    for filters, ordering in _seek_ranges(query.keys, query.cursor):
+        rows += base.filter(**filters).order_by(*ordering)[:page_size + 1 - len(rows)]
+        if len(rows) > page_size:
+            break
+    return _build_page(query, rows, page_size)
+
+
+async def afetch_page(query, page_size=PAGE_SIZE):
+    base = _page_queryset(query)
+    rows = []
+    for filters, ordering in _seek_ranges(query.keys, query.cursor):
+        rows += [p async for p in base.filter(**filters).order_by(*ordering)[:page_size + 1 - len(rows)]]
+        if len(rows) > page_size:
+            break
+    return _build_page(query, rows, page_size)
+
+
+def _build_page(query, rows, page_size):
+    products = tuple(_record(p) for p in rows[:page_size])
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = query.encode_cursor(rows[page_size - 1])
+    by_category = {}
+    for record in products:
+        by_category.setdefault(record.category, []).append(record)
+    return CatalogPage(products, {c: tuple(r) for c, r in by_category.items()}, next_cursor)
+
+
+def _record(product):
+    return ProductRecord(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        stock=product.stock,
+        category=product.category.name if product.category else UNCATEGORIZED,
+        image=product.image.name or '',
+    )
+
+
+def catalog_version():
+    return content_version(CATALOG_VERSION_KEY)
+
+
+async def acatalog_version():
+    return await acontent_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_content_version(CATALOG_VERSION_KEY)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_catalog():
+    global _snapshot
+    version = catalog_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = _snapshot = CatalogSnapshot(version, tuple(_category_list()))
+    return snapshot
+
+
+async def aget_catalog():
+    """get_catalog() for async views. The lock can't be held across the
+    query, so two requests that miss together may both load the categories;
+    the last one in wins."""
+    global _snapshot
+    version = await acatalog_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        categories = tuple([row async for row in _category_list()])
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = _snapshot = CatalogSnapshot(version, categories)
+    return snapshot
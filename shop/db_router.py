@@ -0,0 +1,37 @@
+from django.db import connections
+
+# ----------------- Read Connection Router -----------------
+# Sends catalog and blog reads to the 'replica' alias: a second, read-only
+# connection to the same SQLite file (see DATABASES in settings). In WAL mode
+# it reads the last committed snapshot without waiting for the writer, and
+# being query_only it can't take the write lock by accident.
+#
+# Reads made inside a transaction stay on 'default': they must see the
+# transaction's own uncommitted writes, and select_for_update() has to run on
+# the connection that will write. Everything else - carts, orders, users,
+# sessions, migrations - only ever touches 'default'.
+
+READ_ALIAS = 'replica'
+READ_MODELS = frozenset({
+    'shop.product', 'shop.category',
+    'blog.blogpost', 'blog.tag', 'blog.blogpost_tags',
+    'blog.aboutcomment', 'blog.aboutrating',
+})
+
+
+class ReadConnectionRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in READ_MODELS or READ_ALIAS not in connections:
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # both aliases are the same database
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
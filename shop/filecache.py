@@ -0,0 +1,37 @@
+import threading
+import time
+
+from django.core.cache.backends import filebased
+
+# ----------------- File Cache -----------------
+# Django's file cache counts its entries, by listing the directory, on every
+# write. That is cheap at the default MAX_ENTRIES of 300, but the cache also
+# holds carts, tracking records and image manifests, and 300 entries would
+# have it culling live data all the time. Settings give it a large
+# MAX_ENTRIES instead, and this backend counts at most every CULL_INTERVAL
+# seconds per process. When it is over the limit, expired entries go first,
+# and random ones only if that isn't enough.
+
+CULL_INTERVAL = 30  # seconds
+
+_checked = 0.0
+_lock = threading.Lock()
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    def _cull(self):
+        global _checked
+        with _lock:
+            if time.monotonic() - _checked < CULL_INTERVAL:
+                return
+            _checked = time.monotonic()
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        for fname in filelist:
+            try:
+                with open(fname, 'rb') as file:
+                    self._is_expired(file)  # deletes the file when it is
+            except FileNotFoundError:
+                pass  # deleted meanwhile
+        super()._cull()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versions import bump_content_version
+
+# ----------------- Image Derivatives -----------------
+# Uploaded images are served as a set of resized JPEG/PNG and WebP copies so
+# a product card downloads a few KB instead of the original photo. Copies are
+# content-addressed: they live under MEDIA_ROOT/DERIVATIVES_DIR named by a
+# hash of the source bytes, so identical uploads share one set, a replaced
+# file gets new names (safe to cache forever), and a manifest next to them
+# marks the set as complete.
+#
+# Derivatives are made by a background job when an image field is saved
+# (see shop.signals), or in bulk by the build_image_derivatives command;
+# both record the manifest in the cache, keyed by the source's size and
+# mtime, and then bump the content version of the pages showing the image so
+# their cached markup picks the derivatives up. A render only looks the
+# manifest up, which costs a stat, and shows the original image until the
+# job has run: resizing never happens inside a request. If the cache entry is
+# culled or cleared, the render reads the manifest back from disk.
+
+DERIVATIVES_DIR = 'derivatives'
+WIDTHS = (160, 320, 640, 960, 1280)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+CACHE_PREFIX = 'shop:img:'
+# How long a render remembers that an image has no derivatives on disk yet,
+# rather than hashing the file again on every render.
+MISSING_TIMEOUT = 60
+
+
+def media_root():
+    return Path(settings.MEDIA_ROOT)
+
+
+def derivative_url(relative):
+    return f"{settings.MEDIA_URL}{DERIVATIVES_DIR}/{relative}"
+
+
+def _tmp_path(path):
+    # Another worker, or another thread of this one, may be writing the same
+    # file; each writes its own temporary and renames it over the target, so
+    # a partial file is never exposed.
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _save_atomic(image, path, **params):
+    tmp = _tmp_path(path)
+    image.save(tmp, **params)
+    os.replace(tmp, path)
+
+
+def _manifest_path(root, name):
+    """Where the manifest of MEDIA_ROOT/name goes, or None if it is missing."""
+    try:
+        data = (root / name).read_bytes()
+    except OSError:
+        return None
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return root / DERIVATIVES_DIR / digest[:2] / f"{digest}.json"
+
+
+def _read_manifest(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def stored_manifest(name, root=None):
+    """The manifest already on disk for MEDIA_ROOT/name, or None. Never builds."""
+    path = _manifest_path(Path(root or media_root()), name)
+    return _read_manifest(path) if path else None
+
+
+def build_derivatives(name, root=None):
+    """Make the derivatives of MEDIA_ROOT/name if they don't exist yet.
+
+    Returns the manifest: {'width', 'height', 'fallback': [[width, path]],
+    'webp': [[width, path]]} with paths relative to DERIVATIVES_DIR, or None
+    if the file is missing or not an image.
+    """
+    root = Path(root or media_root())
+    manifest_path = _manifest_path(root, name)
+    if manifest_path is None:
+        return None
+    manifest = _read_manifest(manifest_path)
+    if manifest is not None:
+        return manifest
+    folder = manifest_path.parent
+    digest = manifest_path.stem
+
+    try:
+        with Image.open(root / name) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    fallback_ext, fallback_params = (
+        ('png', {'format': 'PNG', 'optimize': True}) if has_alpha
+        else ('jpg', {'format': 'JPEG', 'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True})
+    )
+
+    folder.mkdir(parents=True, exist_ok=True)
+    manifest = {'width': image.width, 'height': image.height, 'fallback': [], 'webp': []}
+    # Never upscale; the largest WebP is the original size.
+    widths = [width for width in WIDTHS if width < image.width] + [image.width]
+    for width in widths:
+        resized = image if width == image.width else image.resize(
+            (width, max(1, round(image.height * width / image.width))), Image.LANCZOS,
+        )
+        webp = f"{digest[:2]}/{digest}-{width}.webp"
+        _save_atomic(resized, root / DERIVATIVES_DIR / webp, format='WEBP', quality=WEBP_QUALITY, method=4)
+        manifest['webp'].append([width, webp])
+        if width < image.width:
+            fallback = f"{digest[:2]}/{digest}-{width}.{fallback_ext}"
+            _save_atomic(resized, root / DERIVATIVES_DIR / fallback, **fallback_params)
+            manifest['fallback'].append([width, fallback])
+
+    tmp = _tmp_path(manifest_path)
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def _cache_key(name):
+    try:
+        stat = (media_root() / name).stat()
+    except OSError:
+        return None
+    return f"{CACHE_PREFIX}{hashlib.md5(name.encode()).hexdigest()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def derivatives_for(name, version_key=None):
+    """Build the derivatives of a stored image and record its manifest (the
+    job queued when an image is saved). A newly recorded manifest bumps the
+    content version under version_key, if given."""
+    key = _cache_key(name) if name else None
+    if key is None:
+        return None
+    manifest = cache.get(key)
+    if not isinstance(manifest, dict):  # not recorded, or only marked missing
+        manifest = build_derivatives(name) or {}
+        cache.set(key, manifest, timeout=None)
+        if manifest and version_key:
+            bump_content_version(version_key)
+    return manifest or None
+
+
+def cached_derivatives(name):
+    """The recorded manifest for a stored image, or None while its
+    derivatives haven't been made (or it isn't an image). Never builds."""
+    key = _cache_key(name) if name else None
+    if key is None:
+        return None
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = stored_manifest(name)
+        if manifest is None:
+            cache.set(key, False, timeout=MISSING_TIMEOUT)
+        else:
+            cache.set(key, manifest, timeout=None)
+    return manifest or None
+
+
+def find_images(root=None):
+    """Relative names of every image under MEDIA_ROOT, derivatives excluded."""
+    root = Path(root or media_root())
+    for folder, dirs, files in os.walk(root):
+        if Path(folder) == root and DERIVATIVES_DIR in dirs:
+            dirs.remove(DERIVATIVES_DIR)
+        for file in files:
+            if Path(file).suffix.lower() in IMAGE_EXTENSIONS:
+                yield (Path(folder) / file).relative_to(root).as_posix()
@@ -0,0 +1,153 @@
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .middleware import AsyncCapableMiddleware
+
+# ----------------- Request Instrumentation -----------------
+# InstrumentationMiddleware times every request and the SQL it runs, on every
+# database connection, and reports both in a Server-Timing header (visible in
+# the browser's network panel). Requests slower than SLOW_REQUEST_MS are
+# appended to a rotating JSONL slow log with the view, the query count, the
+# database time and the statements that ran more than once.
+#
+# The per-query cost is two perf_counter() calls and a dict increment keyed by
+# the SQL text, which Django keeps separate from the parameters, so the text
+# already identifies the statement. Fingerprints are only normalized for
+# requests that make it into the slow log.
+
+SLOW_REQUEST_MS = 500
+SLOW_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_LOG_BACKUPS = 5
+MAX_LOGGED_DUPLICATES = 10
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class QueryStats:
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def duplicates(self):
+        """[(fingerprint, times)] for the statements run more than once,
+        most repeated first."""
+        counts = {}
+        for sql, times in self.statements.items():
+            key = fingerprint(sql)
+            counts[key] = counts.get(key, 0) + times
+        repeated = [(sql, times) for sql, times in counts.items() if times > 1]
+        return sorted(repeated, key=lambda item: -item[1])
+
+
+def fingerprint(sql):
+    """The statement with IN lists of any length and inlined numbers folded,
+    so an N+1 loop is one fingerprint."""
+    return NUMBER_RE.sub('N', IN_LIST_RE.sub('(...)', sql))
+
+
+def server_timing(total, stats):
+    return (f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", '
+            f'app;dur={(total - stats.seconds) * 1000:.1f}, total;dur={total * 1000:.1f}')
+
+
+# ----------------- Slow Log -----------------
+_slow_log = (None, None)  # (path, logger)
+
+
+def slow_log():
+    """The slow-request logger, writing one JSON object per line to
+    SLOW_LOG_PATH; opened on first use and reopened if the path changes."""
+    global _slow_log
+    path = Path(getattr(settings, 'SLOW_LOG_PATH', settings.BASE_DIR / 'logs' / 'slow_requests.jsonl'))
+    if _slow_log[0] != path:
+        logger = logging.getLogger('shop.slow_requests')
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+            handler.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=getattr(settings, 'SLOW_LOG_MAX_BYTES', SLOW_LOG_MAX_BYTES),
+            backupCount=getattr(settings, 'SLOW_LOG_BACKUPS', SLOW_LOG_BACKUPS), encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _slow_log = (path, logger)
+    return _slow_log[1]
+
+
+def slow_request_record(request, response, total, stats):
+    match = getattr(request, 'resolver_match', None)
+    return {
+        'time': round(time.time(), 3),
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'ms': round(total * 1000, 1),
+        'db_ms': round(stats.seconds * 1000, 1),
+        'queries': stats.count,
+        'duplicates': [{'sql': sql, 'times': times} for sql, times in stats.duplicates()[:MAX_LOGGED_DUPLICATES]],
+    }
+
+
+# ----------------- Middleware -----------------
+class InstrumentationMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.threshold = getattr(settings, 'SLOW_REQUEST_MS', SLOW_REQUEST_MS) / 1000
+
+    @staticmethod
+    def wrap_connections(stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def handle(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with self.wrap_connections(stats):
+            response = self.get_response(request)
+        return self.finish(request, response, started, stats)
+
+    async def ahandle(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        # Connections belong to a thread, and the async ORM runs its queries
+        # on the request's sync thread, so the wrappers go on that thread's.
+        stack = await sync_to_async(self.wrap_connections)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, started, stats)
+
+    def finish(self, request, response, started, stats):
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(total, stats)
+        if total >= self.threshold:
+            slow_log().info(json.dumps(slow_request_record(request, response, total, stats)))
+        return response
@@ -0,0 +1,37 @@
+import os
+
+# ----------------- Load-Test Processes -----------------
+# Load tests that run real processes (worker pools, servers) can't share a
+# scratch_database(): they seed a temporary SQLite file instead, from spawned
+# processes whose settings are read from the environment. This module is
+# what those processes import before Django is set up, so it must not import
+# models at the top.
+
+
+def file_database_env(database_path, cache_dir, profile='production'):
+    return {'DATABASE_PATH': str(database_path), 'CACHE_DIR': str(cache_dir), 'SQLITE_PROFILE': profile}
+
+
+def use_file_database(database_path, cache_dir, profile='production'):
+    """Process initializer: point a freshly spawned process at the file
+    database and cache before its settings are read, and set Django up."""
+    os.environ.update(file_database_env(database_path, cache_dir, profile))
+    import django
+    django.setup()
+
+
+def seed_file_database(size):
+    """Migrate and seed the file database; returns the ids and slugs load
+    tests aim their requests at."""
+    from django.core.management import call_command
+    from blog.models import BlogPost
+    from .bench_suite import seed_dataset
+
+    call_command('migrate', verbosity=0)
+    dataset = seed_dataset(size)
+    return {
+        'product_id': dataset.product.pk,
+        'category_id': dataset.category_id,
+        'tracking_id': dataset.tracking_id,
+        'slugs': list(BlogPost.objects.values_list('slug', flat=True)[:500]),
+    }
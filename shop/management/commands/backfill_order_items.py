@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import Order, OrderItem, Product
+from shop.orders import build_order_items
+from shop.reports import roll_up_sales
+
+CHECKPOINT_KEY = 'shop:backfill_order_items:last_order_id'
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy Order.items JSON into OrderItem rows in batches. Safe to stop and "
+        "re-run: it resumes after the last finished batch and skips orders "
+        "that already have rows. The rows keep their orders' dates, which the "
+        "sales rollup has already passed, so when any are added the rollup is "
+        "rebuilt afterwards (as rollup_sales --rebuild does) unless --skip-rollup "
+        "is given; then run rollup_sales --rebuild yourself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-after', type=int, default=None,
+                            help="Order id to resume after (default: the saved checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore the saved checkpoint.")
+        parser.add_argument('--skip-rollup', action='store_true', help="Don't rebuild the sales rollup afterwards.")
+
+    def handle(self, *args, **options):
+        last_id = options['start_after']
+        if last_id is None:
+            last_id = 0 if options['restart'] else cache.get(CHECKPOINT_KEY, 0)
+        batch_size = options['batch_size']
+        created = orders_done = 0
+
+        while True:
+            batch = list(Order.objects.filter(id__gt=last_id).order_by('id').only('id', 'items', 'created_at')[:batch_size])
+            if not batch:
+                break
+            order_ids = [order.id for order in batch]
+            done = set(OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+            pending = [order for order in batch if order.id not in done]
+            product_ids = {item.get('product_id') for order in pending for item in order.items or []}
+            known = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+
+            rows = [row for order in pending for row in build_order_items(order, order.items or [], known)]
+            with transaction.atomic():
+                OrderItem.objects.bulk_create(rows, batch_size=1000)
+
+            created += len(rows)
+            orders_done += len(pending)
+            last_id = order_ids[-1]
+            cache.set(CHECKPOINT_KEY, last_id, timeout=None)
+            self.stdout.write(f"... up to order {last_id}: {orders_done} orders, {created} items")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {created} items for {orders_done} orders."))
+        if created and not options['skip_rollup']:
+            touched = roll_up_sales(rebuild=True)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the sales rollup: {touched} rows."))
+        elif created:
+            self.stdout.write("Run rollup_sales --rebuild to count the backfilled items in the sales report.")
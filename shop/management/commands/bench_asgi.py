@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from shop.benchmarks import percentile
+from shop.loadtest import file_database_env, seed_file_database, use_file_database
+
+SEARCHES = ['red', 'watch', 'brand1', 'silk lamp', 'wireless speaker']
+
+
+def server_commands(workers, port):
+    bind = f"127.0.0.1:{port}"
+    return {
+        # What the Dockerfile used to run: sync workers, one request each at a time.
+        'wsgi': ['gunicorn', 'MyEcomStoreNew.wsgi:application', '--bind', bind, '--workers', str(workers),
+                 '--log-level', 'warning'],
+        # What it runs now. gunicorn manages the uvicorn workers: uvicorn's own
+        # --workers hands the listening socket to its children in a form asyncio
+        # won't set TCP_NODELAY on, which adds a delayed-ACK stall to every
+        # keep-alive response.
+        'asgi': ['gunicorn', 'MyEcomStoreNew.asgi:application', '-k', 'uvicorn.workers.UvicornWorker',
+                 '--bind', bind, '--workers', str(workers), '--log-level', 'warning'],
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"Server on port {port} didn't come up within {timeout}s.")
+
+
+async def fetch(reader, writer, path):
+    """One GET on an open connection; returns the status code and whether
+    the server keeps the connection open (gunicorn's sync workers don't)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.lower().split(': ', 1) for line in lines[1:] if ': ' in line)
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close'
+
+
+async def connection(port, paths, deadline, timings, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status, keep_alive = await fetch(reader, writer, path)
+            except (OSError, asyncio.IncompleteReadError):
+                errors.append(path)
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                errors.append(path)
+            if not keep_alive:
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    finally:
+        writer.close()
+
+
+async def load(port, paths, connections, seconds):
+    timings, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        connection(port, paths[n::connections] or paths, deadline, timings, errors) for n in range(connections)
+    ))
+    return sorted(timings), errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare WSGI (gunicorn, sync workers) with ASGI (gunicorn, uvicorn workers) serving the "
+        "async catalog, search, tracking and blog pages: both servers run "
+        "against the same seeded file database and are driven by N concurrent "
+        "keep-alive connections; reports requests/s and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2000, help="Products, orders and blog posts.")
+        parser.add_argument('--connections', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--workers', type=int, default=2, help="Server worker processes.")
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--server', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+
+    def handle(self, *args, **options):
+        for program in ('gunicorn', 'uvicorn'):
+            if not shutil.which(program):
+                raise CommandError(f"{program} isn't installed (see requirements.txt).")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            database, cache_dir = Path(scratch) / 'bench.sqlite3', Path(scratch) / 'cache'
+            self.stderr.write(f"Seeding {options['size']}...")
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(1, mp_context=context, initializer=use_file_database,
+                                     initargs=(database, cache_dir)) as pool:
+                targets = pool.submit(seed_file_database, options['size']).result()
+            paths = self.paths(targets)
+            env = {**os.environ, **file_database_env(database, cache_dir), 'DEBUG': 'False'}
+
+            self.stdout.write(f"{'server':>6} {'conns':>5} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+            for server in options['server']:
+                port = free_port()
+                process = subprocess.Popen(
+                    server_commands(options['workers'], port)[server], cwd=settings.BASE_DIR, env=env,
+                    stdout=subprocess.DEVNULL,
+                )
+                try:
+                    wait_for(port)
+                    asyncio.run(load(port, paths, 1, 1))  # warm the workers' snapshots and fragments
+                    for connections in options['connections']:
+                        timings, errors = asyncio.run(load(port, paths, connections, options['seconds']))
+                        self.report(server, connections, timings, errors, options['seconds'])
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+    @staticmethod
+    def paths(targets):
+        # blog_home is left out: it renders every post, and would dominate.
+        paths = [reverse('shop_home'), reverse('shop_products'),
+                 f"{reverse('shop_products')}?{urlencode({'category': targets['category_id']})}",
+                 reverse('shop_track_order')]
+        paths += [f"{reverse('shop_search')}?{urlencode({'query': query})}" for query in SEARCHES]
+        paths += [reverse('blog_post_detail', args=[slug]) for slug in targets['slugs'][:20]]
+        return paths
+
+    def report(self, server, connections, timings, errors, seconds):
+        if not timings:
+            self.stdout.write(f"{server:>6} {connections:>5}  no responses ({len(errors)} errors)")
+            return
+        self.stdout.write(
+            f"{server:>6} {connections:>5} {len(timings) / seconds:9.1f} {percentile(timings, 50):7.1f}ms "
+            f"{percentile(timings, 95):7.1f}ms {percentile(timings, 99):7.1f}ms {len(errors):>7}"
+        )
@@ -0,0 +1,34 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import autocomplete
+from shop.benchmarks import ADJECTIVES, BRANDS, NOUNS, scratch_database, seed_products, summarize, timed
+
+
+class Command(BaseCommand):
+    help = "Measure autocomplete latency per keystroke on a seeded scratch database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--keystrokes', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_products(options['products'])
+            started = time.perf_counter()
+            index = autocomplete.get_index()
+            self.stdout.write(
+                f"Built index over {len(index.entries)} names ({len(index.keys)} keys) "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+
+            # Every prefix of a word a shopper might type, one keystroke at a time.
+            rng = random.Random(1)
+            words = ADJECTIVES + NOUNS + BRANDS
+            prefixes = []
+            while len(prefixes) < options['keystrokes']:
+                word = rng.choice(words)
+                prefixes += [word[:n] for n in range(1, len(word) + 1)]
+            self.stdout.write(f"autocomplete: {summarize(timed(lambda q: autocomplete.get_index().lookup(q), prefixes))}")
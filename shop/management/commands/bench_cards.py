@@ -0,0 +1,106 @@
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.test import override_settings
+
+from shop.cards import product_cards
+from shop.models import Product
+
+# The product card loop as the grids rendered it before shop.cards: three
+# get_item lookups into the cart and a responsive_image call per card.
+LEGACY_CARDS = Template("""{% load static shop_extras %}
+{% for product in products %}
+  <div class="col-12 col-sm-6 col-md-4 col-lg-3">
+    <div class="product-card">
+      <div class="product-image-container">
+        {% if product.image %}
+          {% responsive_image product.image alt=product.name sizes="(min-width: 992px) 25vw, (min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw" %}
+        {% else %}
+          <img src="{% static 'default-product.png' %}" alt="No Image Available">
+        {% endif %}
+      </div>
+      <div class="product-body">
+        <div class="product-title">{{ product.name }}</div>
+        <div class="product-price">Rs. {{ product.price }}</div>
+
+        <div class="d-flex justify-content-center align-items-center gap-2">
+          <button type="button" class="btn btn-danger btn-sm"
+            onclick="changeQty('{{ product.id }}', -1)"
+            {% if not cart_quantities|get_item:product.id or cart_quantities|get_item:product.id <= 0 %} disabled {% endif %}>−</button>
+
+          <span class="fs-5 fw-bold" id="display-qty-{{ product.id }}">
+            {{ cart_quantities|get_item:product.id|default:"0" }}
+          </span>
+
+          <button type="button" class="btn btn-primary btn-sm"
+            onclick="changeQty('{{ product.id }}', 1)">+</button>
+
+          <input type="hidden" name="quantity_{{ product.id }}" id="qty-{{ product.id }}" value="{{ cart_quantities|get_item:product.id|default:"0" }}" />
+        </div>
+      </div>
+    </div>
+  </div>
+{% endfor %}""")
+
+
+class Command(BaseCommand):
+    help = (
+        "Render product cards the old way (get_item and responsive_image per "
+        "card) and from precomputed ProductCard records, and report the time "
+        "per 1,000 cards. Half the products have images; a tenth are in the cart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        ):
+            cache.clear()
+            root = Path(media) / 'products'
+            root.mkdir()
+            for i in range(20):
+                Image.new('RGB', (800, 600), (i * 12, 80, 160)).save(root / f"item{i}.jpg")
+            products = [
+                Product(id=i, name=f"Product {i}", price=Decimal(1000 + i) / 100,
+                        image=f"products/item{i % 20}.jpg" if i % 2 else None)
+                for i in range(1, options['cards'] + 1)
+            ]
+            cart = {product.id: 2 for product in products[::10]}
+            grid = get_template('shop/product_cards.html')
+
+            def legacy():
+                return LEGACY_CARDS.render(Context({'products': products, 'cart_quantities': cart}))
+
+            def precomputed():
+                return grid.render({'cards': product_cards(products, cart)})
+
+            cards = product_cards(products, cart)
+            results = [
+                ("get_item + responsive_image", self.time(legacy, options)),
+                ("ProductCard, render only", self.time(lambda: grid.render({'cards': cards}), options)),
+                ("ProductCard, build + render", self.time(precomputed, options)),
+            ]
+
+        per_thousand = 1000 / options['cards']
+        for label, seconds in results:
+            self.stdout.write(f"{label:>28}: {seconds * 1000 * per_thousand:7.2f} ms per 1,000 cards")
+
+    def time(self, render, options):
+        render()  # builds the derivatives and warms the caches
+        best = float('inf')
+        for _ in range(options['rounds']):
+            started = time.perf_counter()
+            render()
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,90 @@
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from shop.bench_suite import ENDPOINTS, load_baseline, run_suite, save_baseline, seed_dataset
+from shop.benchmarks import scratch_database
+
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+# Below this p99 is just the slowest request (and p95 not far off), so a
+# baseline would record outliers, not percentiles.
+MIN_BASELINE_REQUESTS = 200
+DEFAULT_BASELINE = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with 1k/10k/100k products, orders and blog "
+        "posts and drive every shop, blog and accounts URL through the test "
+        "client. Reports latency percentiles and query counts against the "
+        "stored baseline and fails when an endpoint runs more queries than "
+        "its budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', nargs='+', choices=SIZES, default=['1k'])
+        parser.add_argument('--requests', type=int, default=50, help="Requests per endpoint.")
+        parser.add_argument('--only', nargs='+', metavar='ENDPOINT', help="Run just these endpoints.")
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Record this run as the new baseline for the sizes run.")
+        parser.add_argument('--max-slowdown', type=float,
+                            help="Also fail when an endpoint's p95 exceeds its baseline by this factor.")
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and options['requests'] < MIN_BASELINE_REQUESTS:
+            raise CommandError(f"A baseline needs --requests {MIN_BASELINE_REQUESTS} or more.")
+        endpoints = ENDPOINTS
+        if options['only']:
+            endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in options['only']]
+            unknown = set(options['only']) - {endpoint.name for endpoint in endpoints}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        baseline = load_baseline(options['baseline'])
+        failures = []
+
+        # A throwaway file cache too, so versions and fragments start cold and
+        # the dev server's cache is left alone.
+        with tempfile.TemporaryDirectory() as cache_dir, scratch_database(), override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+        }):
+            for size in options['size']:
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                self.stderr.write(f"Seeding {size}...")
+                dataset = seed_dataset(SIZES[size])
+                results = run_suite(dataset, options['requests'], endpoints)
+                failures += self.report(size, results, baseline.get(size, {}), options['max_slowdown'])
+                if options['save_baseline']:
+                    baseline[size] = {**baseline.get(size, {}), **{r.name: r.summary() for r in results}}
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], baseline)
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+        if failures:
+            raise CommandError("\n".join(failures))
+
+    def report(self, size, results, baseline, max_slowdown):
+        failures = []
+        self.stdout.write(f"\n{size}: {'endpoint':<28} {'p50':>8} {'p95':>8} {'p99':>8} {'vs base':>8} "
+                          f"{'queries':>8} {'status':>8}")
+        for result in results:
+            summary, base = result.summary(), baseline.get(result.name)
+            change = f"{summary['p95'] / base['p95']:7.2f}x" if base and base['p95'] else '       -'
+            queries = f"{result.queries}/{result.budget}"
+            if base and base['queries'] != result.queries:
+                queries += f" (was {base['queries']})"
+            line = (f"{'':>{len(size) + 1}} {result.name:<28} {summary['p50']:7.2f}ms {summary['p95']:7.2f}ms "
+                    f"{summary['p99']:7.2f}ms {change} {queries:>8} {','.join(map(str, result.statuses)):>8}")
+            self.stdout.write(self.style.ERROR(line) if result.over_budget or result.failed else line)
+            if result.over_budget:
+                failures.append(f"{size} {result.name}: {result.queries} queries, budget {result.budget}")
+            if result.failed:
+                failures.append(f"{size} {result.name}: status {result.statuses}, expected {result.expected_status}")
+            if max_slowdown and base and base['p95'] and summary['p95'] > base['p95'] * max_slowdown:
+                failures.append(f"{size} {result.name}: p95 {summary['p95']:.2f}ms, baseline {base['p95']:.2f}ms")
+        return failures
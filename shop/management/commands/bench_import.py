@@ -0,0 +1,69 @@
+import os
+import random
+import tempfile
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from shop.benchmarks import ADJECTIVES, BRANDS, NOUNS, scratch_database
+from shop.models import Category, Product
+from shop.product_io import export_products, import_products, read_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure import_products throughput (rows/s) for fresh inserts and for "
+        "re-importing the same rows as updates, against saving products one at "
+        "a time, on a scratch database (the configured database is not touched)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--one-by-one', type=int, default=2000,
+                            help="Rows to time through Product.save() for comparison.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        count = options['products']
+        categories = [f"Category {i}" for i in range(options['categories'])]
+        rows = (
+            (None, f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+             f"{rng.randint(100, 99_999) / 100:.2f}", rng.randint(0, 50), rng.choice(categories), '',
+             " ".join(rng.choices(ADJECTIVES + NOUNS, k=12)))
+            for i in range(count)
+        )
+        with tempfile.TemporaryDirectory() as tmp, scratch_database():
+            source = os.path.join(tmp, 'products.csv')
+            with open(source, 'w', newline='') as stream:
+                write_rows(stream, 'csv', rows)
+
+            self.report("insert", self.run(source, 'csv', options['batch_size']))
+
+            exported = os.path.join(tmp, 'export.jsonl')
+            started = time.perf_counter()
+            with open(exported, 'w') as stream:
+                exported_count = export_products(stream, 'jsonl')
+            self.report("export", (exported_count, time.perf_counter() - started))
+            self.report("upsert", self.run(exported, 'jsonl', options['batch_size']))
+
+            sample = min(options['one_by_one'], count)
+            by_name = dict(Category.objects.values_list('name', 'id'))
+            started = time.perf_counter()
+            with open(source, newline='') as stream:
+                for _, row in islice(read_rows(stream, 'csv'), sample):
+                    Product.objects.create(name=row['name'], price=row['price'], stock=row['stock'],
+                                           category_id=by_name[row['category']], description=row['description'])
+            self.report("save()", (sample, time.perf_counter() - started))
+
+    def run(self, path, format, batch_size):
+        started = time.perf_counter()
+        with open(path, newline='') as stream:
+            result = import_products(read_rows(stream, format), batch_size)
+        return result.rows, time.perf_counter() - started
+
+    def report(self, label, outcome):
+        rows, elapsed = outcome
+        self.stdout.write(f"{label:>8}: {rows} rows in {elapsed:.2f}s = {rows / elapsed:,.0f} rows/s")
@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from shop.benchmarks import scratch_database, seed_products
+
+INSTRUMENTATION = 'shop.instrumentation.InstrumentationMiddleware'
+PAGES = ['shop_home', 'shop_products', 'shop_cart', 'blog_home']
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what InstrumentationMiddleware adds to a request: the same "
+        "warm pages with and without it, on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with_it = list(settings.MIDDLEWARE)
+        if INSTRUMENTATION not in with_it:
+            with_it.insert(1, INSTRUMENTATION)
+        without = [name for name in with_it if name != INSTRUMENTATION]
+
+        with scratch_database(), override_settings(SLOW_REQUEST_MS=60_000):
+            seed_products(500)
+            urls = [reverse(name) for name in PAGES]
+            results = {}
+            # Alternate so drift in machine load hits both equally.
+            for _ in range(3):
+                for label, middleware in (("without", without), ("with", with_it)):
+                    with override_settings(MIDDLEWARE=middleware):
+                        results.setdefault(label, []).append(self.run(urls, options['requests']))
+
+        best = {label: min(runs) for label, runs in results.items()}
+        for label, seconds in best.items():
+            self.stdout.write(f"{label:>8}: {seconds * 1e6 / options['requests']:8.1f} us/request")
+        self.stdout.write(f"overhead: {(best['with'] - best['without']) * 1e6 / options['requests']:8.1f} us/request")
+
+    def run(self, urls, count):
+        client = Client()
+        for url in urls:
+            client.get(url)  # warm caches and fragments
+        started = time.perf_counter()
+        for i in range(count):
+            client.get(urls[i % len(urls)])
+        return time.perf_counter() - started
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import RequestFactory, override_settings
+from django.urls import re_path
+from django.views.static import serve
+
+from shop.images import find_images
+from shop.media import etag_for, resolve
+
+# What static() mounted before MediaFilesMiddleware: django.views.static.serve
+# behind the whole middleware stack. Used as ROOT_URLCONF for the "static()" runs.
+urlpatterns = [
+    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare media serving through MediaFilesMiddleware with the old "
+        "static() view: plain GETs, revalidations and range requests for the "
+        "images under MEDIA_ROOT, through the full WSGI handler and middleware stack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        names = list(find_images())
+        if not names:
+            raise CommandError("No images under MEDIA_ROOT to serve.")
+        count = options['requests']
+        old_stack = [m for m in settings.MIDDLEWARE if m != 'shop.middleware.MediaFilesMiddleware']
+
+        cases = [
+            ("GET", {}),
+            ("revalidate", {'etag': True}),
+            ("range 0-1023", {'HTTP_RANGE': 'bytes=0-1023'}),
+        ]
+        for label, headers in cases:
+            with override_settings(MIDDLEWARE=old_stack, ROOT_URLCONF=__name__):
+                old = self.run(WSGIHandler(), names, count, headers)
+            new = self.run(WSGIHandler(), names, count, headers)
+            self.stdout.write(
+                f"{label:>13}: static() {old[0]:7.0f} req/s ({old[1]})  "
+                f"middleware {new[0]:7.0f} req/s ({new[1]})"
+            )
+
+    def run(self, handler, names, count, headers):
+        factory = RequestFactory()
+        statuses = set()
+        started = time.perf_counter()
+        for i in range(count):
+            name = names[i % len(names)]
+            extra = dict(headers)
+            if extra.pop('etag', False):
+                extra['HTTP_IF_NONE_MATCH'] = etag_for(resolve(name)[1])
+                # static() only understands If-Modified-Since.
+                extra['HTTP_IF_MODIFIED_SINCE'] = 'Tue, 19 Jan 2038 03:14:07 GMT'
+            path = f"{settings.MEDIA_URL}{name}".encode().decode('iso-8859-1')  # WSGI's str-as-bytes
+            environ = factory._base_environ(PATH_INFO=path, **extra)
+            body = handler(environ, lambda status, headers: statuses.add(status[:3]))
+            b''.join(body)
+            body.close()
+        return count / (time.perf_counter() - started), ",".join(sorted(statuses))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.benchmarks import scratch_database, seed_products, summarize, timed
+from shop.models import Product
+from shop.search import fts_enabled, rebuild_search_index, search_products
+
+QUERIES = ['wireless', 'leather wallet', 'smart watch', 'red sho', 'vintage camera', 'brand17', 'brand42 lamp']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare FTS5 product search with the old name__icontains scan on a "
+        "seeded scratch database (the configured database is not touched)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("Full-text search needs SQLite FTS5.")
+        with scratch_database():
+            started = time.perf_counter()
+            seed_products(options['products'])
+            indexed = rebuild_search_index()
+            self.stdout.write(f"Seeded and indexed {indexed} products in {time.perf_counter() - started:.1f}s")
+
+            queries = QUERIES * options['repeat']
+            old = timed(lambda q: list(Product.objects.filter(name__icontains=q)), queries)
+            new = timed(search_products, queries)
+            self.stdout.write(f" icontains: {summarize(old)}")
+            self.stdout.write(f"      fts5: {summarize(new)}")
@@ -0,0 +1,67 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from shop.benchmarks import scratch_database, seed_products
+from shop.middleware import AutoLogoutMiddleware
+
+SESSION_WRITE_RE = re.compile(r'^\s*(INSERT INTO|UPDATE|DELETE FROM)\s+"django_session"', re.IGNORECASE)
+PAGES = ['shop_home', 'shop_products', 'shop_about', 'shop_contact', 'shop_cart', 'blog_home']
+AUTO_LOGOUT = 'shop.middleware.AutoLogoutMiddleware'
+PER_REQUEST = f'{__name__}.PerRequestActivityMiddleware'
+
+
+class PerRequestActivityMiddleware(AutoLogoutMiddleware):
+    """The old path, for --per-request: activity stored on every request."""
+    granularity = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Count django_session writes per 1,000 requests from one signed-in "
+        "user browsing the shop and blog, on a scratch database. Logging back "
+        "in after being signed out counts too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--per-request', action='store_true',
+                            help="Store activity on every request, as before ACTIVITY_GRANULARITY, for comparison.")
+
+    def handle(self, *args, **options):
+        middleware = [dotted for dotted in settings.MIDDLEWARE if dotted != AUTO_LOGOUT]
+        middleware.insert(
+            middleware.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+            PER_REQUEST if options['per_request'] else AUTO_LOGOUT,
+        )
+        writes = logins = 0
+
+        def count_writes(execute, sql, params, many, context):
+            nonlocal writes
+            if SESSION_WRITE_RE.match(sql):
+                writes += 1
+            return execute(sql, params, many, context)
+
+        with scratch_database(), override_settings(MIDDLEWARE=middleware):
+            seed_products(200)
+            user = User.objects.create_user('shopper', password='pw')
+            client = Client()
+            client.force_login(user)
+            urls = [reverse(name) for name in PAGES]
+            with connection.execute_wrapper(count_writes):
+                for i in range(options['requests']):
+                    client.get(urls[i % len(urls)])
+                    if '_auth_user_id' not in client.session:
+                        client.force_login(user)
+                        logins += 1
+
+        per_thousand = writes * 1000 / options['requests']
+        self.stdout.write(
+            f"{writes} session writes in {options['requests']} requests "
+            f"({per_thousand:.1f} per 1,000), {logins} forced re-logins"
+        )
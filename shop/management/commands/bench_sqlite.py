@@ -0,0 +1,90 @@
+import multiprocessing
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from shop.loadtest import seed_file_database, use_file_database
+
+PROFILES = ('plain', 'production')
+WRITE_SHARE = 0.2
+
+
+def _run_worker(seed, targets, seconds):
+    """Mixed traffic until the deadline: catalog and blog pages through the
+    test client, and checkouts written through the order pipeline."""
+    from django.db import OperationalError, connections
+    from django.test import Client
+    from django.urls import reverse
+    from shop.cart import price_cart
+    from shop.orders import place_order
+
+    rng = random.Random(seed)
+    client = Client()
+    reads = [
+        lambda: reverse('shop_products') + f"?category={targets['category_id']}",
+        lambda: reverse('shop_search') + f"?query={rng.choice(['red', 'watch', 'brand1', 'silk lamp'])}",
+        lambda: reverse('blog_post_detail', args=[rng.choice(targets['slugs'])]),
+        lambda: reverse('shop_home'),
+    ]
+    done = {'reads': 0, 'writes': 0, 'locked': 0}
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < WRITE_SHARE:
+                    priced = price_cart({str(targets['product_id']): 1})
+                    place_order(priced, "Load test", f"load-{seed}@example.com", "Nowhere", 'cod')
+                    done['writes'] += 1
+                else:
+                    client.get(rng.choice(reads)())
+                    done['reads'] += 1
+            except OperationalError:
+                done['locked'] += 1
+    finally:
+        connections.close_all()
+    return done
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the SQLite profiles: concurrent worker processes send mixed "
+        "catalog/blog reads and checkouts at a seeded file database under "
+        "SQLITE_PROFILE=plain (Django's defaults) and =production (WAL, "
+        "pragmas, persistent connections, the read replica), and report the "
+        "throughput and 'database is locked' errors of each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2000, help="Products, orders and blog posts.")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--profile', nargs='+', choices=PROFILES, default=list(PROFILES))
+
+    def handle(self, *args, **options):
+        # spawn, not fork: each pool has to read settings afresh.
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        for profile in options['profile']:
+            with tempfile.TemporaryDirectory() as scratch:
+                init = (Path(scratch) / 'bench.sqlite3', Path(scratch) / 'cache', profile)
+                with ProcessPoolExecutor(1, mp_context=context, initializer=use_file_database, initargs=init) as pool:
+                    targets = pool.submit(seed_file_database, options['size']).result()
+                workers = options['workers']
+                with ProcessPoolExecutor(workers, mp_context=context, initializer=use_file_database,
+                                         initargs=init) as pool:
+                    runs = list(pool.map(_run_worker, range(workers), [targets] * workers,
+                                         [options['seconds']] * workers))
+            totals = {key: sum(run[key] for run in runs) for key in runs[0]}
+            results[profile] = totals
+            self.stdout.write(
+                f"{profile:>10}: {(totals['reads'] + totals['writes']) / options['seconds']:8.1f} req/s  "
+                f"reads={totals['reads']} writes={totals['writes']} locked={totals['locked']}"
+            )
+
+        if len(results) == 2:
+            before, after = ((results[p]['reads'] + results[p]['writes']) for p in PROFILES)
+            self.stdout.write(f"production/plain throughput: {after / max(before, 1):.2f}x")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.bench_suite import seed_dataset
+from shop.benchmarks import scratch_database
+from shop.query_plans import HOT_ENDPOINTS, check_endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the hot shop, blog and admin views on a seeded scratch "
+        "database, run EXPLAIN QUERY PLAN on every SELECT they make and fail "
+        "if any of them reads a table by full scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help="Products, orders and blog posts to seed.")
+        parser.add_argument('--analyze', action='store_true',
+                            help="Run ANALYZE after seeding, so the planner sees realistic statistics.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Query plans are checked with SQLite's EXPLAIN QUERY PLAN.")
+        with scratch_database():
+            dataset = seed_dataset(options['size'])
+            if options['analyze']:
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            problems = check_endpoints(dataset)
+
+        for problem in problems:
+            self.stdout.write(f"{problem.endpoint}: full scan of {problem.table}\n  {problem.sql}\n  "
+                              + "\n  ".join(problem.plan))
+        if problems:
+            raise CommandError(f"{len(problems)} full table scans on the hot paths.")
+        self.stdout.write(self.style.SUCCESS(f"{len(HOT_ENDPOINTS)} views checked, no full table scans."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.product_io import FORMATS, detect_format, export_products
+
+
+class Command(BaseCommand):
+    help = "Write every product to a CSV or JSONL file (or - for stdout) that import_products reads back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            format = detect_format(path, options['format'] or ('csv' if path == '-' else None))
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        started = time.perf_counter()
+        if path == '-':
+            export_products(self.stdout, format)
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            count = export_products(stream, format)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count} products in {time.perf_counter() - started:.2f}s."
+        ))
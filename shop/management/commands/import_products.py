@@ -0,0 +1,51 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.product_io import BATCH_SIZE, FORMATS, detect_format, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV or JSONL file (or - for stdin). "
+        "Columns: id, name, price, stock, category, image, description. Rows "
+        "with an id update that product; image paths are relative to MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            format = detect_format(path, options['format'] or ('csv' if path == '-' else None))
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        started = time.perf_counter()
+
+        def progress(done):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"... {done} rows ({done / elapsed:.0f} rows/s)")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            result = import_products(read_rows(stream, format), options['batch_size'], on_batch=progress)
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        for number, message in result.errors:
+            self.stderr.write(f"line {number}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more bad rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created}, updated {result.updated}, skipped {result.failed} "
+            f"in {elapsed:.2f}s ({result.rows / elapsed:.0f} rows/s)."
+        ))
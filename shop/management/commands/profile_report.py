@@ -0,0 +1,81 @@
+import pstats
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.profiling import EXTENSIONS
+
+APPS = ('shop', 'blog', 'accounts')
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate the request profiles under PROFILES_DIR into a top-N "
+        "hot-function report for the shop, blog and accounts views. Sampled "
+        "profiles rank functions by the share of samples spent in them; "
+        "cProfile ones by their own time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Defaults to PROFILES_DIR.")
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--app', nargs='+', choices=APPS, default=list(APPS))
+        parser.add_argument('--view', nargs='+', metavar='URL_NAME', help="Only these URL names.")
+
+    def handle(self, *args, **options):
+        root = Path(options['dir'] or getattr(settings, 'PROFILES_DIR', settings.BASE_DIR / 'profiles'))
+        collapsed, prof, per_view = [], [], Counter()
+        for app in options['app']:
+            for folder in sorted((root / app).glob('*')):
+                if options['view'] and folder.name not in options['view']:
+                    continue
+                for path in folder.iterdir():
+                    if path.suffix == EXTENSIONS['sampler']:
+                        collapsed.append(path)
+                    elif path.suffix == EXTENSIONS['cprofile']:
+                        prof.append(path)
+                    else:
+                        continue
+                    per_view[f"{app}:{folder.name}"] += 1
+        if not per_view:
+            raise CommandError(f"No profiles under {root}.")
+
+        self.stdout.write(f"{sum(per_view.values())} profiles: "
+                          + ", ".join(f"{view} {count}" for view, count in per_view.most_common()))
+        if collapsed:
+            self.report_samples(collapsed, options['top'])
+        if prof:
+            self.report_pstats(prof, options['top'])
+
+    def report_samples(self, paths, top):
+        own, inclusive, total = Counter(), Counter(), 0
+        for path in paths:
+            for line in path.read_text().splitlines():
+                stack, _, count = line.rpartition(' ')
+                if not stack:
+                    continue
+                count = int(count)
+                frames = stack.split(';')
+                total += count
+                own[frames[-1]] += count
+                for frame in set(frames):  # recursion counts once per sample
+                    inclusive[frame] += count
+        if not total:
+            self.stdout.write("\nSampled profiles hold no samples (requests shorter than the interval).")
+            return
+        self.stdout.write(f"\nSampled: {total} samples in {len(paths)} profiles\n"
+                          f"{'self':>7} {'total':>7}  function")
+        for frame, count in own.most_common(top):
+            self.stdout.write(f"{count * 100 / total:6.1f}% {inclusive[frame] * 100 / total:6.1f}%  {frame}")
+
+    def report_pstats(self, paths, top):
+        stats = pstats.Stats(str(paths[0]), stream=self.stdout)
+        for path in paths[1:]:
+            stats.add(str(path))
+        self.stdout.write(f"\ncProfile: {len(paths)} profiles, {stats.total_tt * 1000:.1f} ms\n"
+                          f"{'own ms':>9} {'cum ms':>9} {'calls':>8}  function")
+        rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:top]
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows:
+            self.stdout.write(f"{own * 1000:9.2f} {cumulative * 1000:9.2f} {calls:8}  {filename}:{line}({name})")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.profiling import HEADER, PARAM, profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed token that makes ProfilingMiddleware profile a "
+        "request; valid for PROFILE_TOKEN_MAX_AGE seconds."
+    )
+
+    def handle(self, *args, **options):
+        token = profile_token()
+        self.stdout.write(token)
+        self.stderr.write(f"Send it as '{HEADER}: {token}' or add ?{PARAM}={token} to the URL.")
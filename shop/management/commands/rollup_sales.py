@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.reports import roll_up_sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold orders placed since the last run into the daily sales rollup "
+        "(day x category x payment method). Meant to run from cron every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Drop the rollup and recompute it from scratch.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        touched = roll_up_sales(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {touched} rollup rows in {time.perf_counter() - started:.2f}s."
+        ))
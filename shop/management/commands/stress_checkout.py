@@ -0,0 +1,105 @@
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from shop.cart import price_cart
+from shop.models import Customer, Order, Product
+from shop.orders import OutOfStock, place_order
+
+
+def _setup_django():
+    import django
+    django.setup()
+
+
+def _run_checkouts(product_id, run_id, start, count, quantity):
+    placed, rejected, errors = [], 0, 0
+    try:
+        for i in range(start, start + count):
+            priced = price_cart({str(product_id): quantity})
+            if not priced or priced.adjusted:
+                rejected += 1
+                continue
+            try:
+                order = place_order(
+                    priced, f"Stress {i}", f"stress-{run_id}-{i % 50}@example.com", "Nowhere", 'cod',
+                )
+            except OutOfStock:
+                rejected += 1
+            except OperationalError:
+                errors += 1
+            else:
+                placed.append(order.pk)
+    finally:
+        connections.close_all()
+    return placed, rejected, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the checkout pipeline from concurrent threads or processes against "
+        "the configured database and verify that stock is never oversold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--attempts', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--quantity', type=int, default=1, help="Units per checkout.")
+        parser.add_argument('--processes', action='store_true', help="Use a process pool instead of threads.")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated product and orders.")
+
+    def handle(self, *args, **options):
+        stock, attempts, workers = options['stock'], options['attempts'], options['workers']
+        quantity = options['quantity']
+        run_id = uuid.uuid4().hex[:8]
+        product = Product.objects.create(
+            name=f"stress-checkout-{run_id}", price=Decimal('1.00'), description="", stock=stock,
+        )
+
+        chunk = -(-attempts // workers)
+        jobs = [(product.pk, run_id, start, min(chunk, attempts - start), quantity)
+                for start in range(0, attempts, chunk)]
+
+        # Workers open their own connections; don't share (or fork) ours.
+        connections.close_all()
+        if options['processes']:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_setup_django)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        started = time.perf_counter()
+        with pool:
+            results = list(pool.map(_run_checkouts, *zip(*jobs)))
+        elapsed = time.perf_counter() - started
+
+        placed = [pk for ids, _, _ in results for pk in ids]
+        rejected = sum(r for _, r, _ in results)
+        errors = sum(e for _, _, e in results)
+
+        product.refresh_from_db()
+        orders = Order.objects.filter(pk__in=placed).count()
+        sold = stock - product.stock
+        expected_sold = min(stock // quantity, attempts - errors) * quantity
+
+        self.stdout.write(
+            f"{'processes' if options['processes'] else 'threads'}={workers} attempts={attempts} "
+            f"placed={len(placed)} rejected={rejected} errors={errors} "
+            f"stock_left={product.stock} elapsed={elapsed:.2f}s "
+            f"checkouts/s={len(placed) / elapsed:.1f}"
+        )
+
+        if not options['keep']:
+            Order.objects.filter(pk__in=placed).delete()
+            Customer.objects.filter(email__startswith=f"stress-{run_id}-").delete()
+            product.delete()
+
+        if product.stock < 0 or sold != len(placed) * quantity or orders != len(placed):
+            raise CommandError(f"Oversold: {sold} units left stock for {orders} orders.")
+        if errors == 0 and sold != expected_sold:
+            raise CommandError(f"Expected {expected_sold} units sold, got {sold}.")
+        self.stdout.write(self.style.SUCCESS("No oversell."))
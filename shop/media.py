@@ -0,0 +1,124 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# ----------------- Media Serving -----------------
+# Uploaded files are served by MediaFilesMiddleware ahead of every other
+# middleware, so an image costs a stat and an open rather than a session load,
+# CSRF and auth. Responses carry a strong ETag and Last-Modified (answered
+# with 304s), honour single byte ranges, and are handed to the server's
+# sendfile through FileResponse when whole. Names containing a content hash
+# (see shop.images) never change, so they may be cached for a year.
+
+CHUNK_SIZE = 64 * 1024
+MAX_AGE = 60 * 60
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+HASHED_NAME_RE = re.compile(r'(^|[^0-9a-f])[0-9a-f]{32}([^0-9a-f]|$)')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def resolve(path, root=None):
+    """The file under MEDIA_ROOT for a URL path and its stat, or (None, None)
+    for anything that escapes the root or isn't a regular file."""
+    root = os.path.abspath(root or settings.MEDIA_ROOT)
+    # normpath rather than realpath: no per-component lstat on the hot path.
+    # Like django.views.static.serve, symlinks inside MEDIA_ROOT are trusted.
+    target = os.path.normpath(os.path.join(root, path.lstrip('/')))
+    if not target.startswith(root + os.sep):
+        return None, None
+    try:
+        status = os.stat(target)
+    except (OSError, ValueError):
+        return None, None
+    if not stat.S_ISREG(status.st_mode):
+        return None, None
+    return target, status
+
+
+def etag_for(status):
+    return f'"{status.st_mtime_ns:x}-{status.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable range, None to send the
+    whole file, or False when the range can't be satisfied."""
+    match = RANGE_RE.match(header.strip())
+    if not match or not size:
+        return None  # multiple or malformed ranges: send everything
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        if not int(last):
+            return False
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start > end:
+            return False if start >= size else None
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    target, status = resolve(path)
+    if target is None:
+        return HttpResponseNotFound()
+
+    etag, last_modified = etag_for(status), int(status.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if 'Range' in request.headers and (if_range is None or if_range == etag
+                                           or parse_http_date_safe(if_range) == last_modified):
+            byte_range = parse_range(request.headers['Range'], status.st_size)
+
+        content_type, encoding = mimetypes.guess_type(target)
+        if encoding or not content_type:
+            content_type = 'application/octet-stream'  # never let a .gz be unpacked by the browser
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{status.st_size}'
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = status.st_size
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(target, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{status.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(target, 'rb'), content_type=content_type)
+            response.block_size = CHUNK_SIZE  # when the server has no sendfile
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    if HASHED_NAME_RE.search(os.path.basename(path)):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={MAX_AGE}'
+    return response
@@ -1,25 +1,134 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.utils import timezone
-from django.contrib.auth import logout
-# Middleware for auto-logout after a period of inactivity
-class AutoLogoutMiddleware:
+from django.utils.cache import patch_vary_headers
+from django.contrib.auth import alogout, logout
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .cart import SessionCartStorage
+from .media import serve
+
+# Base for the project's middleware: runs natively under WSGI and ASGI alike.
+# Django calls a middleware that is only sync-capable from a worker thread on
+# the ASGI stack (and the reverse under WSGI); one that handles both is
+# called directly, so an async view is reached without leaving the event
+# loop. Subclasses implement handle() and ahandle().
+class AsyncCapableMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.timeout = 300  # 5 minutes in seconds
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            last_activity = request.session.get('last_activity')
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        raise NotImplementedError
+
+# Serves MEDIA_URL ahead of the rest of the stack; list it first in MIDDLEWARE.
+class MediaFilesMiddleware(AsyncCapableMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = settings.MEDIA_URL if settings.MEDIA_URL.startswith('/') else f'/{settings.MEDIA_URL}'
+
+    def handle(self, request):
+        if request.path_info.startswith(self.prefix):
+            return serve(request, request.path_info[len(self.prefix):])
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        if request.path_info.startswith(self.prefix):
+            return serve(request, request.path_info[len(self.prefix):])
+        return await self.get_response(request)
+
+# Middleware for auto-logout after a period of inactivity.
+# Activity is persisted only when the stored timestamp is ACTIVITY_GRANULARITY
+# old, so a busy user costs one session write a minute rather than one per
+# request (every write takes SQLite's database-wide write lock). Idle time is
+# therefore measured to within ACTIVITY_GRANULARITY.
+ACTIVITY_GRANULARITY = 60  # seconds
+
+class AutoLogoutMiddleware(AsyncCapableMiddleware):
+    timeout = 300  # 5 minutes in seconds
+    granularity = ACTIVITY_GRANULARITY
 
-            now = timezone.now().timestamp()  # current time in seconds
+    def check(self, last_activity):
+        """'logout', 'touch' (store the current time) or None."""
+        now = int(timezone.now().timestamp())  # current time in seconds
+        if last_activity and now - last_activity > self.timeout + self.granularity:
+            # The stored time can trail the real last request by up to
+            # one granularity step; never log out before the full timeout.
+            return 'logout', now
+        if not last_activity or now - last_activity >= self.granularity:
+            return 'touch', now
+        return None, now
 
-            if last_activity:
-                elapsed = now - last_activity
-                if elapsed > self.timeout:
-                    logout(request)
-                    # Optionally: clear session completely
-                    request.session.flush()
-            # update last activity time on each request
-            request.session['last_activity'] = now
+    def handle(self, request):
+        if request.user.is_authenticated:
+            action, now = self.check(request.session.get('last_activity'))
+            if action == 'logout':
+                logout(request)
+            elif action == 'touch':
+                request.session['last_activity'] = now
 
         response = self.get_response(request)
         return response
+
+    async def ahandle(self, request):
+        # Resolving the user loads the session too. Both are then cached on
+        # the request, so the view, the cart and the templates (which read
+        # request.user synchronously) don't query from the event loop.
+        user = await request.auser()
+        request.user = user
+        if user.is_authenticated:
+            action, now = self.check(await request.session.aget('last_activity'))
+            if action == 'logout':
+                await alogout(request)
+            elif action == 'touch':
+                await request.session.aset('last_activity', now)
+
+        return await self.get_response(request)
+
+# Lets the cart storage (shop.cart.get_cart) write its cookie on the way out.
+class CartMiddleware(AsyncCapableMiddleware):
+    def handle(self, request):
+        return self.process_response(request, self.get_response(request))
+
+    async def ahandle(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        storage = getattr(request, '_cart_storage', None)
+        if storage is not None:
+            storage.update_response(response)
+            if not isinstance(storage, SessionCartStorage):
+                patch_vary_headers(response, ('Cookie',))
+        return response
+
+# WhiteNoise's middleware is sync-only; this serves the same files from either stack.
+class StaticFilesMiddleware(AsyncCapableMiddleware, WhiteNoiseMiddleware):
+    def __init__(self, get_response):
+        WhiteNoiseMiddleware.__init__(self, get_response)
+        AsyncCapableMiddleware.__init__(self, get_response)
+
+    def static_response(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        return self.serve(static_file, request) if static_file is not None else None
+
+    def handle(self, request):
+        return self.static_response(request) or self.get_response(request)
+
+    async def ahandle(self, request):
+        return self.static_response(request) or await self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('image__isnull', False), models.Q(('image', ''), _negated=True)), fields=['id'], name='shop_prod_with_image_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 09:37
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_content_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='shop_cust_email_lower_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 import uuid
 from django.utils import timezone
 
@@ -16,6 +17,20 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', null=True, blank=True)
     stock = models.IntegerField(default=0)
 
+    class Meta:
+        # Keyset pagination of the catalog (see shop.catalog) seeks on these;
+        # the partial ones serve the in-stock storefront listing.
+        indexes = [
+            models.Index(fields=['category', 'id'], name='shop_prod_cat_id_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='shop_prod_cat_price_idx'),
+            models.Index(fields=['category', 'id'], condition=models.Q(stock__gt=0),
+                         name='shop_prod_instock_cat_id_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=models.Q(stock__gt=0),
+                         name='shop_prod_instock_cat_pri_idx'),
+            # Random featured-product probes (see shop.catalog.featured_products).
+            models.Index(fields=['id'], condition=models.Q(image__isnull=False) & ~models.Q(image=''),
+                         name='shop_prod_with_image_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -26,6 +41,13 @@ class Customer(models.Model):
     address = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Case-insensitive name-prefix and email search in the admin (see shop.admin).
+            models.Index(Lower('full_name'), name='shop_cust_name_lower_idx'),
+            models.Index(Lower('email'), name='shop_cust_email_lower_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.email})"
 
@@ -54,6 +76,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     payment_date = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        # Admin changelist filters and date ranges.
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='shop_order_status_date_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='shop_order_payment_date_idx'),
+            models.Index(fields=['created_at'], name='shop_order_date_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.tracking_id:
@@ -63,3 +92,86 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.tracking_id} by {self.customer.full_name}"
 
+    @property
+    def line_items(self):
+        """The order lines in the Order.items format, read from OrderItem when
+        the order has rows there and from the JSON blob otherwise."""
+        rows = self.order_items.all()
+        if rows:
+            return [row.as_item() for row in rows]
+        return self.items
+
+
+class OrderItemQuerySet(models.QuerySet):
+    def units_sold(self):
+        return self.aggregate(units=models.Sum('quantity'))['units'] or 0
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
+    # Kept when the product is deleted; name and prices are snapshots anyway.
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
+    name = models.CharField(max_length=255)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    # Copy of Order.created_at so per-product sales over a date range are one index range.
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='shop_item_product_date_idx'),
+            models.Index(fields=['created_at'], name='shop_item_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.name}"
+
+    def as_item(self):
+        return {
+            'product_id': self.product_id,
+            'name': self.name,
+            'quantity': self.quantity,
+            'unit_price': float(self.unit_price),
+            'subtotal': float(self.subtotal),
+        }
+
+
+
+class DailySalesRollup(models.Model):
+    # Maintained by the rollup_sales command from OrderItem rows; never edited by hand.
+    day = models.DateField()
+    category = models.CharField(max_length=100)
+    payment_method = models.CharField(max_length=50, blank=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'payment_method'], name='shop_rollup_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category} {self.payment_method or '-'}"
+
+
+class RollupWatermark(models.Model):
+    # Orders created at or before high_water have been folded into the rollup.
+    name = models.CharField(max_length=50, unique=True)
+    high_water = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water}"
+
+
+class ContentVersion(models.Model):
+    # The counters behind shop.versions; the shared cache holds a copy.
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField()
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .catalog import bump_catalog_version
+from .models import Customer, Order, OrderItem, Product
+
+# ----------------- Order Placement -----------------
+# Stock is reserved with conditional UPDATEs (stock = stock - qty WHERE
+# stock >= qty) so two concurrent checkouts can never take the same unit: the
+# database decides, not a read-modify-write in Python. The transaction opens
+# with a write, so on SQLite the write lock is taken up front and waits on the
+# busy timeout instead of failing on a lock upgrade.
+
+
+class OutOfStock(Exception):
+    def __init__(self, line):
+        self.line = line
+        super().__init__(f"Not enough stock for {line['name']}")
+
+
+def upsert_customer(full_name, email, address):
+    """Insert or update the customer by email in a single statement."""
+    customer = Customer(full_name=full_name, email=email, address=address)
+    Customer.objects.bulk_create(
+        [customer],
+        update_conflicts=True,
+        unique_fields=['email'],
+        update_fields=['full_name', 'address'],
+    )
+    return customer
+
+
+def reserve_stock(lines):
+    # Lock rows in a stable order so concurrent checkouts can't deadlock.
+    for line in sorted(lines, key=lambda line: line['id']):
+        updated = Product.objects.filter(pk=line['id'], stock__gte=line['quantity']).update(
+            stock=F('stock') - line['quantity']
+        )
+        if not updated:
+            raise OutOfStock(line)
+    # F() updates bypass the model signals; the storefront only cares when a
+    # product drops out of stock, so that's the only case that invalidates it.
+    if Product.objects.filter(pk__in=[line['id'] for line in lines], stock__lte=0).exists():
+        bump_catalog_version()
+
+
+def build_order_items(order, items, known_product_ids=None):
+    """OrderItem rows for an order from its Order.items entries.
+
+    Product ids not in known_product_ids (when given) are stored as NULL, for
+    old orders whose products have since been deleted.
+    """
+    rows = []
+    for item in items:
+        product_id = item.get('product_id')
+        if known_product_ids is not None and product_id not in known_product_ids:
+            product_id = None
+        rows.append(OrderItem(
+            order=order,
+            product_id=product_id,
+            name=item.get('name', ''),
+            quantity=int(item.get('quantity', 0)),
+            unit_price=Decimal(str(item.get('unit_price', 0))),
+            subtotal=Decimal(str(item.get('subtotal', 0))),
+            created_at=order.created_at,
+        ))
+    return rows
+
+
+def place_order(priced, full_name, email, address, payment_method):
+    """Reserve stock for every line and create the order atomically.
+
+    Raises OutOfStock (and rolls everything back) if any line can no longer
+    be fulfilled.
+    """
+    with transaction.atomic():
+        reserve_stock(priced.lines)
+        customer = upsert_customer(full_name, email, address)
+        order = Order.objects.create(
+            customer=customer,
+            items=priced.order_items(),
+            total_price=priced.total,
+            payment_method=payment_method,
+        )
+        OrderItem.objects.bulk_create(build_order_items(order, order.items))
+        return order
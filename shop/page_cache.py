@@ -0,0 +1,120 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cart import get_cart
+from .catalog import CATALOG_VERSION_KEY
+from .versions import acontent_version, content_version, last_modified, release
+
+# ----------------- Page Caching -----------------
+# Catalog and blog pages are a shared body plus a few per-visitor bits (the
+# navbar user, cart quantities, the CSRF token). The shared body is cached as
+# a template fragment keyed by request.content_version, which also carries
+# the release, and by the page's parsed query parameters (see
+# shop/product_grid.html and the blog templates); cart quantities are
+# overlaid in the browser from a small JSON blob, so they never split the
+# fragment.
+#
+# @conditional_page(...) gives the whole page a weak ETag built from the
+# release, the content versions and the visitor's bits, so a repeat visit
+# that changes nothing is a 304. Last-Modified is only sent when there are no
+# per-visitor bits to go stale. Pages are private and revalidated on every
+# use.
+
+BLOG_VERSION_KEY = 'blog:version'
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+
+def _visitor_state(request, user):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    cart = sorted(get_cart(request).load().items())
+    # The secret CSRF tokens on the page are derived from; set by
+    # CsrfViewMiddleware from the cookie, or by the render on a first visit.
+    csrf = request.META.get('CSRF_COOKIE', '')
+    return user_id, cart, csrf
+
+
+def _etag(request, view, versions, state):
+    raw = repr((release(), view.__module__, view.__qualname__, request.get_full_path(), versions, state))
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+
+def _precondition(request, view, version_keys, versions, user):
+    """(versions, etag, last modified, response) for a page request;
+    response is the 304/412 when the client's copy is current, else None."""
+    request.content_version = '.'.join(map(str, [release(), *versions]))
+    if request.method not in ('GET', 'HEAD'):
+        return versions, None, None, None
+    # Flash messages are shown once; a 304 would swallow them.
+    if len(get_messages(request)):
+        return versions, None, None, None
+
+    state = _visitor_state(request, user)
+    etag = _etag(request, view, versions, state)
+    modified = None
+    user_id, cart, _ = state
+    if user_id is None and not cart:
+        stamps = [last_modified(key) for key in version_keys]
+        if stamps and None not in stamps:
+            modified = max(stamps)
+    return versions, etag, modified, get_conditional_response(request, etag=etag, last_modified=modified)
+
+
+def _finish(request, view, user, versions, etag, modified, response, rendered):
+    if rendered:
+        if response.status_code != 200:
+            return response
+        # A first visit gets its CSRF secret during the render.
+        etag = _etag(request, view, versions, _visitor_state(request, user))
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(*version_keys):
+    # Async views get an async wrapper. The cache calls stay synchronous in
+    # it: the file cache is a local read, and Django's async cache methods
+    # would hand each one to a thread. The user is resolved here with
+    # request.auser() and put on the request, so the view's templates can
+    # read request.user without querying from the event loop.
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = None
+                if hasattr(request, 'auser'):
+                    user = request.user = await request.auser()
+                versions = [await acontent_version(key) for key in version_keys]
+                versions, etag, modified, response = _precondition(request, view, version_keys, versions, user)
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                rendered = response is None
+                if rendered:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, view, user, versions, etag, modified, response, rendered)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'user', None)
+            versions = [content_version(key) for key in version_keys]
+            versions, etag, modified, response = _precondition(request, view, version_keys, versions, user)
+            if etag is None:
+                return view(request, *args, **kwargs)
+            rendered = response is None
+            if rendered:
+                response = view(request, *args, **kwargs)
+            return _finish(request, view, user, versions, etag, modified, response, rendered)
+        return wrapper
+    return decorator
+
+
+catalog_page = conditional_page(CATALOG_VERSION_KEY)
+blog_page = conditional_page(BLOG_VERSION_KEY)
@@ -0,0 +1,248 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .catalog import bump_catalog_version
+from .models import Category, Product
+from .search import reindex_products
+
+# ----------------- Product Import / Export -----------------
+# Files are read and written one row at a time and imported in batches, so
+# memory is bounded by the batch size (plus the category name -> id map)
+# whatever the file size. Rows with an id upsert that product in one
+# INSERT ... ON CONFLICT per batch; rows without one are created. Columns
+# missing from the file are left alone on existing products.
+#
+# Bulk writes skip the Product signals, so each batch reindexes the products
+# it wrote (only when names or descriptions may have changed) and the catalog
+# version is bumped once at the end instead of once per row.
+
+COLUMNS = ('id', 'name', 'price', 'stock', 'category', 'image', 'description')
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportResult(NamedTuple):
+    created: int
+    updated: int
+    failed: int
+    errors: list  # (line number, message) for the first MAX_REPORTED_ERRORS failures
+
+    @property
+    def rows(self):
+        return self.created + self.updated
+
+
+def detect_format(path, format=None):
+    format = format or Path(path).suffix.lstrip('.').lower()
+    if format == 'ndjson':
+        format = 'jsonl'
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}; use one of {', '.join(FORMATS)}.")
+    return format
+
+
+def read_rows(stream, format):
+    """Yield (line number, dict) from an open text stream."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"line {number}: not valid JSON ({exc.msg})") from None
+
+
+def write_rows(stream, format, rows):
+    if format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(COLUMNS, row)), default=str, separators=(',', ':')) + '\n')
+
+
+# ----------------- Row Parsing -----------------
+def resolve_image(value, media_root=None):
+    """Return the image path relative to MEDIA_ROOT, checking the file exists.
+
+    Accepts paths relative to MEDIA_ROOT or absolute paths inside it.
+    """
+    if not value:
+        return ''
+    media_root = Path(media_root or settings.MEDIA_ROOT).resolve()
+    path = (media_root / value).resolve()
+    if not path.is_relative_to(media_root):
+        raise RowError(f"image {value!r} is outside MEDIA_ROOT")
+    if not path.is_file():
+        raise RowError(f"image {value!r} not found under MEDIA_ROOT")
+    return path.relative_to(media_root).as_posix()
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def parse_row(row, fields):
+    values = {}
+    if 'id' in row and not _blank(row['id']):
+        try:
+            values['id'] = int(row['id'])
+        except (TypeError, ValueError):
+            raise RowError(f"bad id {row['id']!r}")
+    if 'name' in fields:
+        if _blank(row.get('name')):
+            raise RowError("name is required")
+        values['name'] = str(row['name']).strip()
+    if 'price' in fields:
+        try:
+            price = Decimal(str(row.get('price')).strip())
+        except InvalidOperation:
+            raise RowError(f"bad price {row.get('price')!r}")
+        if not price.is_finite() or price < 0:
+            raise RowError(f"bad price {row.get('price')!r}")
+        values['price'] = price.quantize(Decimal('0.01'))
+    if 'stock' in fields:
+        try:
+            values['stock'] = 0 if _blank(row.get('stock')) else int(row['stock'])
+        except (TypeError, ValueError):
+            raise RowError(f"bad stock {row.get('stock')!r}")
+    if 'description' in fields:
+        values['description'] = row.get('description') or ''
+    if 'category' in fields:
+        values['category'] = (row.get('category') or '').strip()
+    if 'image' in fields:
+        values['image'] = resolve_image((row.get('image') or '').strip())
+    return values
+
+
+# ----------------- Import -----------------
+def _category_ids(names, known):
+    """Map category names to ids, creating the missing ones in one statement."""
+    missing = {name for name in names if name and name not in known}
+    if missing:
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        known.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+    return known
+
+
+def _import_batch(batch, fields, categories):
+    _category_ids({values.get('category') for _, values in batch}, categories)
+    keyed, new = {}, []
+    for number, values in batch:
+        if 'category' in values:
+            name = values.pop('category')
+            values['category_id'] = categories.get(name) if name else None
+        product = Product(**values)
+        if product.id is None:
+            new.append(product)
+        else:
+            keyed[product.id] = (number, product)  # a later row for the same id wins
+
+    existing = set(Product.objects.filter(pk__in=keyed).values_list('pk', flat=True))
+    update_fields = [('category_id' if f == 'category' else f) for f in fields if f != 'id']
+    errors = []
+    with transaction.atomic():
+        if 'name' in fields and 'price' in fields:
+            # Full rows: one INSERT ... ON CONFLICT (id) DO UPDATE per batch.
+            written = [product for _, product in keyed.values()]
+            if written:
+                Product.objects.bulk_create(
+                    written, update_conflicts=True, unique_fields=['id'], update_fields=update_fields,
+                )
+        else:
+            # Partial rows (say id + stock) can only update existing products.
+            errors = [(number, f"no product with id {pk}") for pk, (number, _) in keyed.items() if pk not in existing]
+            written = [product for pk, (_, product) in keyed.items() if pk in existing]
+            if written:
+                Product.objects.bulk_update(written, update_fields)
+        Product.objects.bulk_create(new)
+        if 'name' in fields or 'description' in fields:  # the only indexed columns
+            reindex_products([product.pk for product in written + new])
+    updated = len(existing)
+    created = len(new) + len(keyed) - updated - len(errors)
+    return created, updated, errors
+
+
+def import_products(rows, batch_size=BATCH_SIZE, on_batch=None):
+    """Import (line number, dict) rows; bad rows are skipped and reported."""
+    created = updated = failed = 0
+    errors, categories, fields = [], {}, None
+    rows = iter(rows)
+    explicit_ids = False
+    while batch := list(islice(rows, batch_size)):
+        if fields is None:
+            # The first row fixes the columns; for CSV that's the header.
+            fields = [column for column in COLUMNS if column in batch[0][1]]
+            if 'id' not in fields and not {'name', 'price'} <= set(fields):
+                raise ValueError("The file needs an id column, or name and price columns.")
+        parsed = []
+        for number, row in batch:
+            try:
+                values = parse_row(row, fields)
+                if 'id' not in values and not {'name', 'price'} <= set(values):
+                    raise RowError("new products need a name and a price")
+                parsed.append((number, values))
+            except RowError as exc:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((number, str(exc)))
+        explicit_ids = explicit_ids or any('id' in values for _, values in parsed)
+        batch_created, batch_updated, batch_errors = _import_batch(parsed, fields, categories)
+        created += batch_created
+        updated += batch_updated
+        failed += len(batch_errors)
+        errors += batch_errors[:MAX_REPORTED_ERRORS - len(errors)]
+        if on_batch:
+            on_batch(created + updated)
+
+    if explicit_ids:
+        # Inserting explicit ids doesn't advance the id sequence on backends
+        # that keep one (a no-op on SQLite).
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+                cursor.execute(sql)
+    if created or updated:
+        bump_catalog_version()
+    return ImportResult(created, updated, failed, errors)
+
+
+# ----------------- Export -----------------
+def export_rows(queryset=None, chunk_size=BATCH_SIZE):
+    queryset = Product.objects.all() if queryset is None else queryset
+    return (
+        queryset.order_by('id')
+        .values_list('id', 'name', 'price', 'stock', 'category__name', 'image', 'description')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def export_products(stream, format, queryset=None):
+    """Write products to an open text stream; returns the number of rows."""
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for id, name, price, stock, category, image, description in rows:
+            count += 1
+            yield id, name, price, stock, category or '', image or '', description
+
+    write_rows(stream, format, counted(export_rows(queryset)))
+    return count
@@ -0,0 +1,187 @@
+import cProfile
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+from .middleware import AsyncCapableMiddleware
+
+# ----------------- Request Profiling -----------------
+# ProfilingMiddleware profiles single requests in production. A request is
+# profiled when it carries a valid token, in the X-Profile header or the
+# _profile query parameter, or when it falls in the PROFILE_SAMPLE_RATE random
+# sample. Tokens are signed with SECRET_KEY and expire after
+# PROFILE_TOKEN_MAX_AGE, so visitors can't switch profiling on; the
+# profile_token command prints a fresh one.
+#
+# The default profiler samples the request thread's stack every
+# PROFILE_INTERVAL_MS from a helper thread and writes collapsed stacks (one
+# "frame;frame;frame count" line per distinct stack, the input format of
+# flamegraph.pl and speedscope). It costs little whatever the code does.
+# PROFILER = 'cprofile' writes pstats files instead: exact call counts, at a
+# much higher cost per function call.
+#
+# Profiles go to PROFILES_DIR/<app>/<url name>/; the profile_report command
+# aggregates them into a hot-function report.
+
+HEADER = 'X-Profile'
+PARAM = '_profile'
+SALT = 'shop.profiling'
+TOKEN_MAX_AGE = 24 * 60 * 60
+INTERVAL_MS = 5
+EXTENSIONS = {'sampler': '.collapsed', 'cprofile': '.prof'}
+
+
+def profile_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(value, max_age=None):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(
+            value, max_age=max_age or getattr(settings, 'PROFILE_TOKEN_MAX_AGE', TOKEN_MAX_AGE),
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_label(code):
+    """module-ish path and function name for a code object."""
+    filename = code.co_filename
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        filename = filename[len(base):]
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f"{filename}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's stack from a helper thread until stopped."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, root=None):
+        self._target = threading.get_ident()
+        # Stacks are cut at root, by default the caller of start().
+        self._root = root or sys._getframe(1)
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and frame is not self._root:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if self._stop.is_set():
+                break  # the thread is in stop(), not the view
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w') as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+
+def profile_path(request, extension):
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.url_name:
+        app, name = match.func.__module__.split('.')[0], match.url_name
+    else:
+        app, name = '_', 'unresolved'
+    folder = Path(getattr(settings, 'PROFILES_DIR', settings.BASE_DIR / 'profiles')) / app / name
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{secrets.token_hex(4)}{extension}"
+
+
+# ----------------- Middleware -----------------
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """List it last in MIDDLEWARE so the profile covers the view.
+
+    Under ASGI the profile covers the event loop's thread while the view
+    runs, so requests served concurrently show up in it as well.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+        self.profiler = getattr(settings, 'PROFILER', 'sampler')
+        self.interval = getattr(settings, 'PROFILE_INTERVAL_MS', INTERVAL_MS) / 1000
+
+    def wanted(self, request):
+        token = request.headers.get(HEADER) or request.GET.get(PARAM)
+        if token:
+            return valid_token(token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        if self.profiler == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(self.interval)
+            profiler.start(root=sys._getframe(1))  # the middleware's handle()
+        return profiler
+
+    def finish(self, request, response, profiler):
+        if self.profiler == 'cprofile':
+            path = profile_path(request, EXTENSIONS['cprofile'])
+            profiler.dump_stats(path)
+        else:
+            path = profile_path(request, EXTENSIONS['sampler'])
+            write_collapsed(path, profiler.stacks)
+        response['X-Profile-Id'] = path.name
+        return response
+
+    @staticmethod
+    def stop(profiler):
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+
+    def handle(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+        profiler = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(profiler)
+        return self.finish(request, response, profiler)
+
+    async def ahandle(self, request):
+        if not self.wanted(request):
+            return await self.get_response(request)
+        profiler = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(profiler)
+        return self.finish(request, response, profiler)
@@ -0,0 +1,107 @@
+import re
+from contextlib import ExitStack
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client, override_settings
+
+from .bench_suite import ENDPOINTS, Endpoint, PASSWORD, url
+
+# ----------------- Query Plan Checks -----------------
+# Captures the SELECTs the hot views run, asks SQLite for each one's plan
+# (EXPLAIN QUERY PLAN, on the connection that ran it) and reports every
+# table read by a full scan: a plan step "SCAN <table>" with no index. A
+# scan through an index, or of the FTS virtual table, is fine.
+#
+# Pages are requested with a dummy cache so no fragment hides their
+# queries. Tables that stay small whatever the catalog size (the category
+# and tag lists) may be scanned, and so may the tables in EXPECTED_SCANS,
+# which read everything on purpose.
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+SMALL_TABLES = frozenset({'shop_category', 'blog_tag'})
+EXPECTED_SCANS = {
+    # Builds the per-worker prefix index, once per catalog version.
+    ('shop_autocomplete', 'shop_product'),
+    # The average of every rating: one pass over a narrow table.
+    ('blog_about', 'blog_aboutrating'),
+}
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def superuser(client, dataset):
+    user = User.objects.filter(username='plans-admin').first() or User.objects.create_superuser(
+        'plans-admin', 'plans-admin@example.com', PASSWORD,
+    )
+    client.force_login(user)
+
+
+HOT_ENDPOINTS = [endpoint for endpoint in ENDPOINTS if endpoint.name in {
+    'shop_home', 'shop_home?category', 'shop_products', 'shop_search', 'shop_autocomplete',
+    'shop_track_order POST', 'shop_cart', 'blog_home', 'blog_post_detail', 'blog_posts_by_tag', 'blog_about',
+}] + [
+    Endpoint('admin orders', url('admin:shop_order_changelist'), 0, before=superuser),
+    Endpoint('admin orders?status', url('admin:shop_order_changelist'), 0, before=superuser,
+             data=lambda d: {'status__exact': 'pending'}),
+    Endpoint('admin orders?q=email', url('admin:shop_order_changelist'), 0, before=superuser,
+             data=lambda d: {'q': 'CUSTOMER1@EXAMPLE.COM'}),
+    Endpoint('admin customers?q=email', url('admin:shop_customer_changelist'), 0, before=superuser,
+             data=lambda d: {'q': 'CUSTOMER1@EXAMPLE.COM'}),
+]
+
+
+class FullScan(NamedTuple):
+    endpoint: str
+    table: str
+    sql: str
+    plan: list
+
+
+def query_plan(alias, sql, params):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    # Reading back a subquery's result (a LIMITed count, say) is no table scan.
+    subqueries = {step.split()[-1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    scanned = []
+    for step in plan:
+        match = SCAN_RE.match(step)
+        if match and match.group(1) not in SMALL_TABLES | subqueries:
+            scanned.append(match.group(1))
+    return scanned
+
+
+def capture_selects(endpoint, dataset):
+    """[(alias, sql, params)] for the SELECTs one request to the endpoint ran."""
+    client = Client()
+    if endpoint.before:
+        endpoint.before(client, dataset)
+    selects = []
+
+    def capture(alias):
+        def wrapper(execute, sql, params, many, context):
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                selects.append((alias, sql, params))
+            return execute(sql, params, many, context)
+        return wrapper
+
+    with override_settings(CACHES=NO_CACHE), ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(capture(alias)))
+        data = endpoint.data(dataset) if endpoint.data else None
+        getattr(client, endpoint.method)(endpoint.url(dataset), data)
+    return selects
+
+
+def check_endpoints(dataset, endpoints=HOT_ENDPOINTS):
+    problems = []
+    for endpoint in endpoints:
+        for alias, sql, params in capture_selects(endpoint, dataset):
+            plan = query_plan(alias, sql, params)
+            problems += [FullScan(endpoint.name, table, sql, plan) for table in full_scans(plan)
+                         if (endpoint.name, table) not in EXPECTED_SCANS]
+    return problems
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from jobs.queue import LOW, enqueue
+
+from .catalog import UNCATEGORIZED
+from .models import DailySalesRollup, OrderItem, RollupWatermark
+
+# ----------------- Sales Rollups -----------------
+# DailySalesRollup holds order count, units and revenue per day x category x
+# payment method. roll_up_sales() folds in only the order lines created since
+# the stored high-water mark, in the same transaction that moves the mark, so
+# each order is counted exactly once however often it runs. Rows with category
+# ALL_CATEGORIES count each order once across categories, for exact per-day
+# and per-payment-method order counts.
+#
+# Orders younger than SETTLE_DELAY are left for the next run: created_at is
+# stamped before the checkout transaction commits, so a slow commit could
+# otherwise land behind the mark and be skipped.
+#
+# Checkout schedules a run for each new order (schedule_rollup), and the
+# rollup_sales command still does a run on demand.
+
+ROLLUP_NAME = 'daily_sales'
+ALL_CATEGORIES = ''
+SETTLE_DELAY = timedelta(minutes=5)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+TOTALS = ('order_count', 'units', 'revenue')
+
+
+def _groups(items, by_category):
+    keys = {'day': TruncDate('created_at'), 'pm': Coalesce('order__payment_method', Value(''))}
+    if by_category:
+        keys['cat'] = Coalesce('product__category__name', Value(UNCATEGORIZED))
+    for group in items.values(**keys).annotate(
+        order_count=Count('order', distinct=True), units=Sum('quantity'), revenue=Sum('subtotal'),
+    ):
+        yield (group['day'], group.get('cat', ALL_CATEGORIES), group['pm']), group
+
+
+def roll_up_sales(now=None, rebuild=False):
+    """Fold new order lines into the rollup; returns the number of rows touched."""
+    upper = (now or timezone.now()) - SETTLE_DELAY
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+            name=ROLLUP_NAME, defaults={'high_water': EPOCH},
+        )
+        if rebuild:
+            DailySalesRollup.objects.all().delete()
+            watermark.high_water = EPOCH
+        if upper <= watermark.high_water:
+            return 0
+
+        items = OrderItem.objects.filter(created_at__gt=watermark.high_water, created_at__lte=upper)
+        deltas = dict(_groups(items, by_category=True))
+        deltas.update(_groups(items, by_category=False))
+
+        existing = {
+            (row.day, row.category, row.payment_method): row
+            for row in DailySalesRollup.objects.filter(day__in={day for day, _, _ in deltas})
+        }
+        created, updated = [], []
+        for key, delta in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                day, category, payment_method = key
+                row = DailySalesRollup(day=day, category=category, payment_method=payment_method, revenue=0)
+                created.append(row)
+            else:
+                updated.append(row)
+            for field in TOTALS:
+                setattr(row, field, getattr(row, field) + (delta[field] or 0))
+
+        DailySalesRollup.objects.bulk_create(created)
+        DailySalesRollup.objects.bulk_update(updated, TOTALS)
+        watermark.high_water = upper
+        watermark.save(update_fields=['high_water'])
+    return len(created) + len(updated)
+
+
+def schedule_rollup():
+    """Queue a rollup run that covers an order placed now.
+
+    Orders placed in the same minute share one job (by key), due once the
+    last of them has settled, so the report stays current without cron.
+    Only the minute's first order writes it: the cache remembers the rest.
+    """
+    now = timezone.now()
+    due = now.replace(second=0, microsecond=0) + timedelta(minutes=1) + SETTLE_DELAY
+    key = f"{ROLLUP_NAME}:{due:%Y%m%d%H%M}"
+    if not cache.add(f"shop:rollup-scheduled:{key}", True, timeout=(due - now).total_seconds() + 60):
+        return None
+    return enqueue(roll_up_sales, priority=LOW, delay=due - now, key=key)
+
+
+# ----------------- Sales Report -----------------
+def sales_report(start, end):
+    rows = DailySalesRollup.objects.filter(day__gte=start, day__lte=end)
+    totals = {f'total_{field}': Sum(field) for field in TOTALS}
+    overall = rows.filter(category=ALL_CATEGORIES)
+    return {
+        'totals': overall.aggregate(**totals),
+        'by_day': overall.values('day').annotate(**totals).order_by('day'),
+        'by_payment_method': overall.values('payment_method').annotate(**totals).order_by('-total_revenue'),
+        'by_category': rows.exclude(category=ALL_CATEGORIES).values('category').annotate(**totals).order_by('-total_revenue'),
+        'high_water': RollupWatermark.objects.filter(name=ROLLUP_NAME).values_list('high_water', flat=True).first(),
+    }
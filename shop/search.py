@@ -0,0 +1,164 @@
+import re
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+# ----------------- Product Search -----------------
+# On SQLite, product names and descriptions are indexed in an FTS5 table whose
+# rowid is the product id. The Product signals keep it in sync row by row;
+# bulk writes that skip them reindex the rows they touched with
+# reindex_products(), and rebuild_search_index() reloads the whole table.
+# Other backends fall back to a plain icontains filter.
+
+FTS_TABLE = 'shop_product_fts'
+PAGE_SIZE = 24
+MAX_PAGE = 50
+# bm25() column weights: a hit in the name counts far more than the description.
+NAME_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 1.0
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchPage(NamedTuple):
+    products: list
+    number: int
+    has_next: bool
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word must match, and the last
+    one may be a prefix ("red sho" finds "red shoes")."""
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _ranked_ids(expression, limit, offset):
+    # The index lives next to the products; read it where they're read.
+    with connections[router.db_for_read(Product)].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s), rowid LIMIT %s OFFSET %s",
+            [expression, NAME_WEIGHT, DESCRIPTION_WEIGHT, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_matches(query):
+    return Product.objects.filter(Q(name__icontains=query) | Q(description__icontains=query)).order_by('id')
+
+
+def search_products(query, page=1, page_size=PAGE_SIZE):
+    page = min(max(page, 1), MAX_PAGE)
+    offset = (page - 1) * page_size
+    if fts_enabled():
+        expression = match_expression(query)
+        if not expression:
+            return SearchPage([], page, False)
+        ids = _ranked_ids(expression, page_size + 1, offset)
+        more = len(ids) > page_size
+        products = Product.objects.in_bulk(ids[:page_size])
+        ranked = [products[pk] for pk in ids[:page_size] if pk in products]
+    else:
+        rows = list(_fallback_matches(query)[offset:offset + page_size + 1])
+        more = len(rows) > page_size
+        ranked = rows[:page_size]
+    return SearchPage(ranked, page, more and page < MAX_PAGE)
+
+
+async def asearch_products(query, page=1, page_size=PAGE_SIZE):
+    """search_products() for async views."""
+    page = min(max(page, 1), MAX_PAGE)
+    offset = (page - 1) * page_size
+    if fts_enabled():
+        expression = match_expression(query)
+        if not expression:
+            return SearchPage([], page, False)
+        # Django has no async cursor: the one raw FTS query runs on the
+        # request's sync thread, like every async ORM query does.
+        ids = await sync_to_async(_ranked_ids)(expression, page_size + 1, offset)
+        more = len(ids) > page_size
+        products = await Product.objects.ain_bulk(ids[:page_size])
+        ranked = [products[pk] for pk in ids[:page_size] if pk in products]
+    else:
+        rows = [p async for p in _fallback_matches(query)[offset:offset + page_size + 1]]
+        more = len(rows) > page_size
+        ranked = rows[:page_size]
+    return SearchPage(ranked, page, more and page < MAX_PAGE)
+
+
+def filter_matching(queryset, query):
+    """Narrow a Product queryset to full-text matches, unranked (for the admin)."""
+    if not fts_enabled():
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression],
+    ))
+
+
+# ----------------- Index Maintenance -----------------
+def index_product(product):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (%s, %s, %s)",
+            [product.pk, product.name, product.description],
+        )
+
+
+def unindex_product(product_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def reindex_products(ids, chunk_size=500):
+    """Reload the index rows of the given product ids from shop_product (for
+    bulk writes that skip the signals); ids with no product are dropped."""
+    if not fts_enabled():
+        return
+    ids = list(ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table} WHERE id IN ({placeholders})",
+                chunk,
+            )
+
+
+def rebuild_search_index():
+    """Reload the whole index from shop_product in one pass; returns the row count."""
+    if not fts_enabled():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description) "
+            f"SELECT id, name, description FROM {Product._meta.db_table}"
+        )
+        count = cursor.rowcount
+        # Merge the b-trees written by the bulk load into one.
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return count
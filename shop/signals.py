@@ -0,0 +1,109 @@
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from accounts.models import UserProfile
+from blog.models import AboutComment, AboutRating, BlogPost, Tag
+from jobs.queue import enqueue
+
+from .cart import get_cart
+from .catalog import CATALOG_VERSION_KEY, bump_catalog_version
+from .images import derivatives_for
+from .page_cache import BLOG_VERSION_KEY
+from .models import Category, Customer, Order, Product
+from .search import index_product, unindex_product
+from .versions import bump_content_version
+from .tracking import forget_customer, forget_order, remember_order
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=BlogPost)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=AboutComment)
+@receiver([post_save, post_delete], sender=AboutRating)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def blog_changed(sender, action=None, **kwargs):
+    if action is None or action.startswith('post_'):  # not the m2m pre_* signals
+        bump_content_version(BLOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    # New orders are cached right away so every worker can find them before
+    # its Bloom filter catches up; changed ones are dropped and reloaded.
+    if created:
+        transaction.on_commit(lambda: remember_order(instance))
+    else:
+        transaction.on_commit(lambda: forget_order(instance.tracking_id))
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_order(instance.tracking_id))
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    # Checkout's upsert sends no signal; the new order's record refreshes
+    # the customer's details instead (see shop.tracking.remember_order).
+    transaction.on_commit(lambda: forget_customer(instance.pk))
+
+
+IMAGE_FIELDS = {Product: 'image', BlogPost: 'image', UserProfile: 'profile_picture'}
+# The content version of the pages showing each model's images.
+IMAGE_VERSIONS = {Product: CATALOG_VERSION_KEY, BlogPost: BLOG_VERSION_KEY}
+
+
+def stored_image(instance):
+    # Read from __dict__ so a deferred field isn't loaded; None when it is.
+    value = instance.__dict__.get(IMAGE_FIELDS[type(instance)])
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=BlogPost)
+@receiver(post_init, sender=UserProfile)
+def remember_image(sender, instance, **kwargs):
+    instance._stored_image = stored_image(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=UserProfile)
+def image_saved(sender, instance, created, **kwargs):
+    # Resize on upload so the first visitor doesn't pay for it, in a worker
+    # rather than the request. Only when the image changed: other edits
+    # leave its derivatives as they are. The job commits with the save, and
+    # bumps the pages' version once the derivatives are there.
+    name = stored_image(instance)
+    if name and (created or name != instance._stored_image):
+        enqueue(derivatives_for, name, IMAGE_VERSIONS.get(sender), key=f"derivatives:{name}")
+    instance._stored_image = name
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        get_cart(request).merge_on_login()
+
+
+@receiver(user_logged_out)
+def forget_cart_on_logout(sender, request, user, **kwargs):
+    if request is not None:
+        get_cart(request).on_logout()
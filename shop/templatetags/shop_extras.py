@@ -1,7 +1,37 @@
 from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from ..images import cached_derivatives, derivative_url
 
 register = template.Library()
 
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key)
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', **attrs):
+    """<picture> with WebP and resized srcsets for a stored image (a FieldFile
+    or its name), lazily loaded. Falls back to a plain <img> of the original
+    until the derivatives have been made, or when none can be."""
+    name = getattr(image, 'name', image) or ''
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    manifest = cached_derivatives(name)
+    if not manifest:
+        return format_html('<img src="{}" alt="{}" loading="lazy" decoding="async"{}>',
+                           default_storage.url(name), alt, extra)
+
+    def srcset(entries):
+        return ', '.join(f"{derivative_url(path)} {width}w" for width, path in entries)
+
+    original = default_storage.url(name)
+    fallback = srcset(manifest['fallback'])
+    fallback = f"{fallback}, {original} {manifest['width']}w" if fallback else f"{original} {manifest['width']}w"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async"{}>'
+        '</picture>',
+        srcset(manifest['webp']), sizes, original, fallback, sizes,
+        manifest['width'], manifest['height'], alt, extra,
+    )
@@ -1,3 +1,1431 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, resolve, reverse
+from django.utils.module_loading import import_string
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.worker import Worker
+
+from . import (
+    autocomplete, bench_suite, cards, catalog, db_router, images, instrumentation, media, product_io, profiling,
+    query_plans, search, tracking, versions,
+)
+from .cart import COOKIE_NAME, CookieCartStorage, pack_cart, price_cart, unpack_cart
+from .middleware import ACTIVITY_GRANULARITY, AutoLogoutMiddleware
+from .models import Category, ContentVersion, Customer, DailySalesRollup, Order, OrderItem, Product
+from .orders import OutOfStock, place_order
+from .page_cache import BLOG_VERSION_KEY
+from .reports import SETTLE_DELAY, roll_up_sales, sales_report, schedule_rollup
+from .search import rebuild_search_index, search_products
+
+
+def make_products(n, stock=5, price='10.00', category=None):
+    return Product.objects.bulk_create([
+        Product(name=f"Product {i}", price=Decimal(price), description="", stock=stock, category=category)
+        for i in range(n)
+    ])
+
+
+def fresh_autocomplete_index(test):
+    # The index is module state: start without one, and leave none behind for
+    # a later test to find stale and rebuild in a background thread.
+    def reset():
+        autocomplete._index, autocomplete._retry_at = None, 0.0
+    reset()
+    test.addCleanup(reset)
+
+
+def set_cart(client, cart):
+    """Put a cart in the test client's cookie (the configured CookieCartStorage)."""
+    client.cookies[COOKIE_NAME] = CookieCartStorage.signer.sign(pack_cart(cart))
+
+
+def client_cart(client):
+    cookie = client.cookies.get(COOKIE_NAME)
+    return unpack_cart(CookieCartStorage.signer.unsign(cookie.value)) if cookie and cookie.value else {}
+
+
+# ----------------- Cart Pricing -----------------
+class PriceCartTests(TestCase):
+    def test_prices_lines_with_decimal_subtotals(self):
+        a, b = make_products(2, price='2.50')
+        priced = price_cart({str(a.id): 2, str(b.id): 1})
+        self.assertEqual(priced.total, Decimal('7.50'))
+        self.assertEqual([line['subtotal'] for line in priced.lines], [Decimal('5.00'), Decimal('2.50')])
+        self.assertFalse(priced.adjusted)
+
+    def test_drops_unknown_and_sold_out_and_caps_to_stock(self):
+        in_stock, sold_out = make_products(2, stock=3)
+        sold_out.stock = 0
+        sold_out.save()
+        priced = price_cart({str(in_stock.id): 10, str(sold_out.id): 1, '999999': 1, 'junk': 1})
+        self.assertTrue(priced.adjusted)
+        self.assertEqual(priced.quantities, {in_stock.id: 3})
+
+    def test_single_query_regardless_of_cart_size(self):
+        products = make_products(25)
+        with self.assertNumQueries(1):
+            price_cart({str(p.id): 1 for p in products})
+
+
+class CartPageQueryCountTests(TestCase):
+    def fill_cart(self, products):
+        set_cart(self.client, {p.id: 1 for p in products})
+
+    def count_queries(self, method, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+        self.assertIn(response.status_code, (200, 302))
+        return len(ctx.captured_queries)
+
+    def test_cart_pages_cost_constant_queries(self):
+        products = make_products(30)
+        for name in ('shop_cart', 'shop_checkout'):
+            with self.subTest(view=name):
+                self.fill_cart(products[:1])
+                small = self.count_queries('get', reverse(name))
+                self.fill_cart(products)
+                large = self.count_queries('get', reverse(name))
+                self.assertEqual(small, large)
+
+    def test_bulk_add_validates_in_one_query(self):
+        products = make_products(30, stock=2)
+        data = {f"quantity_{p.id}": 5 for p in products}
+        data['quantity_999999'] = 1
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('shop_add_multiple_to_cart'), data)
+        product_queries = [q for q in ctx.captured_queries if 'shop_product' in q['sql']]
+        self.assertEqual(len(product_queries), 1)
+        self.assertEqual(client_cart(self.client), {p.id: 2 for p in products})
+
+
+WRITE_SQL = ('INSERT', 'UPDATE', 'DELETE')
+CACHE_CART = 'shop.cart.CacheCartStorage'
+
+
+class CartStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b = make_products(2, stock=10)
+
+    def test_cookie_packs_pairs_compactly(self):
+        cart = {self.a.id: 2, 300: 1, 70000: 15}
+        packed = pack_cart(cart)
+        self.assertEqual(unpack_cart(packed), cart)
+        self.assertLessEqual(len(packed), 12)
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        set_cart(self.client, {self.a.id: 1})
+        self.client.cookies[COOKIE_NAME] = self.client.cookies[COOKIE_NAME].value.replace(':', ':x')
+        response = self.client.get(reverse('shop_cart'))
+        self.assertEqual(response.context['cart_items'], [])
+
+    def test_anonymous_cart_makes_no_database_writes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('shop_home'))
+            self.client.get(reverse('shop_cart'), {'add': self.a.id})
+            self.client.post(reverse('shop_add_multiple_to_cart'), {f'quantity_{self.b.id}': 3})
+            response = self.client.get(reverse('shop_checkout'))
+        self.assertEqual(len(response.context['cart_items']), 2)
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if q['sql'].startswith(WRITE_SQL)], [])
+        self.assertEqual(client_cart(self.client), {self.a.id: 1, self.b.id: 3})
+
+    def test_logout_clears_cookie_cart(self):
+        User.objects.create_user('shopper', password='pw')
+        self.client.login(username='shopper', password='pw')
+        set_cart(self.client, {self.a.id: 1})
+        self.client.post(reverse('logout'))
+        self.assertEqual(client_cart(self.client), {})
+
+    @override_settings(CART_STORAGE='shop.cart.SessionCartStorage')
+    def test_session_storage(self):
+        self.client.get(reverse('shop_cart'), {'add': self.a.id})
+        self.assertEqual(self.client.session['cart'], {str(self.a.id): 1})
+        self.assertNotIn(COOKIE_NAME, self.client.cookies)
+
+    @override_settings(CART_STORAGE=CACHE_CART)
+    def test_cache_storage_merges_into_user_cart_on_login(self):
+        user = User.objects.create_user('shopper', password='pw')
+        cache.set(f'shop:cart:user:{user.pk}', {self.a.id: 3, self.b.id: 1})
+        self.client.get(reverse('shop_cart'), {'add': self.a.id})
+        self.client.get(reverse('shop_cart'), {'add': self.b.id})
+        self.client.get(reverse('shop_cart'), {'add': self.b.id})
+        self.assertTrue(self.client.cookies[COOKIE_NAME].value)
+
+        self.client.post(reverse('login'), {'username': 'shopper', 'password': 'pw'})
+        response = self.client.get(reverse('shop_cart'))
+        quantities = {line['id']: line['quantity'] for line in response.context['cart_items']}
+        self.assertEqual(quantities, {self.a.id: 3, self.b.id: 2})
+        self.assertEqual(self.client.cookies[COOKIE_NAME].value, '')
+
+        self.client.post(reverse('logout'))
+        self.assertEqual(cache.get(f'shop:cart:user:{user.pk}'), {self.a.id: 3, self.b.id: 2})
+
+
+# ----------------- Order Placement -----------------
+class PlaceOrderTests(TestCase):
+    def place(self, product, qty, email="buyer@example.com", name="Buyer"):
+        return place_order(price_cart({str(product.id): qty}), name, email, "Street 1", 'cod')
+
+    def test_decrements_stock_and_upserts_customer(self):
+        product, = make_products(1, stock=3)
+        self.place(product, 2)
+        order = self.place(product, 1, name="Renamed")
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(Customer.objects.get().full_name, "Renamed")
+        self.assertEqual(order.customer.email, "buyer@example.com")
+
+    def test_rejects_line_when_stock_runs_out(self):
+        product, other = make_products(2, stock=1)
+        stale = price_cart({str(product.id): 1, str(other.id): 1})
+        self.place(product, 1)
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(stale, "Late", "late@example.com", "Street 2", 'cod')
+        self.assertEqual(ctx.exception.line['id'], product.id)
+        # The whole order rolled back, including the line that did have stock.
+        other.refresh_from_db()
+        self.assertEqual(other.stock, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(Customer.objects.filter(email="late@example.com").exists())
+
+    def test_checkout_view_reports_sold_out_line(self):
+        product, = make_products(1, stock=1)
+        set_cart(self.client, {product.id: 1})
+        Product.objects.filter(pk=product.pk).update(stock=0)
+        response = self.client.post(reverse('shop_checkout'), {
+            'full_name': "Buyer", 'email': "buyer@example.com", 'address': "Street", 'payment_method': 'cod',
+        })
+        self.assertRedirects(response, reverse('shop_cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+
+# ----------------- Catalog Snapshot -----------------
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._snapshot = None
+
+    def catalog_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'shop_product' in q['sql'] or 'shop_category' in q['sql']]
+
+    def test_groups_by_category_and_hides_sold_out_on_home(self):
+        shoes = Category.objects.create(name="Shoes")
+        boot, sandal = make_products(2, category=shoes)
+        loose, = make_products(1, stock=0)
+        everything = catalog.get_catalog().page(catalog.CatalogQuery(in_stock=False))
+        self.assertEqual([p.id for p in everything.by_category["Shoes"]], [boot.id, sandal.id])
+        self.assertEqual([p.id for p in everything.by_category[catalog.UNCATEGORIZED]], [loose.id])
+        in_stock = catalog.get_catalog().page(catalog.CatalogQuery())
+        self.assertNotIn(catalog.UNCATEGORIZED, in_stock.by_category)
+
+    def test_warm_worker_renders_without_catalog_queries(self):
+        make_products(20, category=Category.objects.create(name="Gadgets"))
+        for name in ('shop_home', 'shop_products'):
+            with self.subTest(view=name):
+                self.catalog_queries(reverse(name))
+                self.assertEqual(self.catalog_queries(reverse(name)), [])
+
+    def test_product_and_category_changes_invalidate_snapshot(self):
+        product, = make_products(1)
+        first = catalog.get_catalog()
+        self.assertIs(catalog.get_catalog(), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Renamed"
+            product.save()
+        self.assertEqual(catalog.get_catalog().page(catalog.CatalogQuery()).products[0].name, "Renamed")
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="New")
+        self.assertNotEqual(catalog.get_catalog().version, first.version)
+
+    def test_checkout_that_sells_out_invalidates_snapshot(self):
+        product, = make_products(1, stock=1)
+        self.assertEqual(len(catalog.get_catalog().page(catalog.CatalogQuery()).products), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(price_cart({str(product.id): 1}), "Buyer", "b@example.com", "Street", 'cod')
+        self.assertEqual(catalog.get_catalog().page(catalog.CatalogQuery()).products, ())
+
+
+# ----------------- Catalog Pagination -----------------
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=name) for name in ("B", "A")]
+        products = []
+        for i in range(40):
+            products.append(Product(
+                name=f"P{i}", description="", price=Decimal(5 + (i * 7) % 11),
+                stock=i % 4, category=categories[i % 3] if i % 3 < 2 else None,
+            ))
+        Product.objects.bulk_create(products)
+
+    def walk(self, query, page_size=7):
+        seen, cursors = [], []
+        while True:
+            page = catalog.fetch_page(query, page_size)
+            seen += [p.id for p in page.products]
+            if not page.next_cursor:
+                return seen, cursors
+            cursors.append(query.decode_cursor(page.next_cursor))
+            query = query._replace(cursor=cursors[-1])
+
+    def expected(self, query):
+        qs = Product.objects.all()
+        if query.in_stock:
+            qs = qs.filter(stock__gt=0)
+        if query.category_id is not None:
+            qs = qs.filter(category_id=query.category_id)
+        if query.min_price is not None:
+            qs = qs.filter(price__gte=query.min_price)
+        if query.max_price is not None:
+            qs = qs.filter(price__lte=query.max_price)
+        rows = list(qs)
+        key = {'id': lambda p: (p.id,), 'price': lambda p: (p.price, p.id)}[query.sort]
+        rows.sort(key=lambda p: (p.category_id is not None, p.category_id or 0) + key(p))
+        return [p.id for p in rows]
+
+    def test_pages_cover_filtered_catalog_in_key_order(self):
+        category = Category.objects.get(name="A")
+        queries = [
+            catalog.CatalogQuery(),
+            catalog.CatalogQuery(in_stock=False),
+            catalog.CatalogQuery(in_stock=False, sort='price'),
+            catalog.CatalogQuery(sort='price', min_price=Decimal(7), max_price=Decimal(12)),
+            catalog.CatalogQuery(in_stock=False, category_id=category.id, sort='price'),
+            catalog.CatalogQuery(category_id=category.id),
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                seen, _ = self.walk(query)
+                self.assertEqual(seen, self.expected(query))
+
+    def test_deep_page_costs_same_queries_as_first(self):
+        query = catalog.CatalogQuery(in_stock=False, sort='price')
+        _, cursors = self.walk(query, page_size=3)
+        for cursor in (cursors[0], cursors[-1]):
+            with CaptureQueriesContext(connection) as ctx:
+                catalog.fetch_page(query._replace(cursor=cursor), 3)
+            # At most one index seek per sort key, and never an OFFSET scan.
+            self.assertLessEqual(len(ctx.captured_queries), len(query.keys))
+            self.assertTrue(all('OFFSET' not in q['sql'] for q in ctx.captured_queries))
+
+    def test_garbage_cursor_starts_from_first_page(self):
+        query = catalog.CatalogQuery()
+        self.assertEqual(query.decode_cursor('not-a-cursor'), ())
+        self.assertEqual(query.decode_cursor('WyJ4Il0'), ())
+
+
+# ----------------- Product Search -----------------
+class ProductSearchTests(TestCase):
+    def create(self, name, description=""):
+        return Product.objects.create(name=name, description=description, price=Decimal('1.00'), stock=1)
+
+    def test_ranks_name_hits_above_description_hits(self):
+        mention = self.create("Canvas tote", "Fits a laptop and a camera")
+        camera = self.create("Digital camera", "Mirrorless body")
+        page = search_products("camera")
+        self.assertEqual([p.id for p in page.products], [camera.id, mention.id])
+
+    def test_all_words_must_match_and_last_is_prefix(self):
+        shoes = self.create("Red running shoes")
+        self.create("Red scarf")
+        self.assertEqual([p.id for p in search_products("red sho").products], [shoes.id])
+        self.assertEqual(search_products('"; DROP TABLE --').products, [])
+        self.assertEqual(search_products("!!!").products, [])
+
+    def test_signals_keep_index_in_sync(self):
+        product = self.create("Old name")
+        product.name = "Fresh name"
+        product.save()
+        self.assertEqual(search_products("old").products, [])
+        self.assertEqual(search_products("fresh").products, [product])
+        product.delete()
+        self.assertEqual(search_products("fresh").products, [])
+
+    def test_rebuild_picks_up_bulk_created_products(self):
+        make_products(3)
+        self.assertEqual(search_products("product").products, [])
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(len(search_products("product").products), 3)
+
+    def test_view_paginates_results(self):
+        make_products(30)
+        rebuild_search_index()
+        response = self.client.get(reverse('shop_search'), {'query': "product", 'page': 2})
+        self.assertEqual(len(response.context['products']), 30 - search.PAGE_SIZE)
+        self.assertFalse(response.context['page'].has_next)
+
+
+# ----------------- Autocomplete -----------------
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fresh_autocomplete_index(self)
+
+    def test_matches_any_word_prefix_of_products_and_categories(self):
+        Category.objects.create(name="Running Gear")
+        Product.objects.create(name="Red running shoes", description="", price=Decimal('1.00'))
+        Product.objects.create(name="Blue scarf", description="", price=Decimal('1.00'))
+        names = [name for _, _, name in autocomplete.get_index().lookup("RUN")]
+        self.assertEqual(sorted(names), ["Red running shoes", "Running Gear"])
+        self.assertEqual(autocomplete.get_index().lookup("red run")[0][2], "Red running shoes")
+        self.assertEqual(autocomplete.get_index().lookup("   "), [])
+
+    def test_long_queries_are_checked_against_full_name(self):
+        stem = "x" * autocomplete.KEY_LENGTH
+        Product.objects.create(name=stem + "alpha", description="", price=Decimal('1.00'))
+        Product.objects.create(name=stem + "beta", description="", price=Decimal('1.00'))
+        self.assertEqual([name for _, _, name in autocomplete.get_index().lookup(stem + "b")], [stem + "beta"])
+
+    def test_rebuilds_in_the_background_when_catalog_version_changes(self):
+        first = autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Lamp", description="", price=Decimal('1.00'))
+        rebuilds = []
+        with patch.object(autocomplete, '_in_background', lambda func, *args: rebuilds.append((func, args))):
+            self.assertIs(autocomplete.get_index(), first)  # served while the new one builds
+            self.assertIs(autocomplete.get_index(), first)
+        self.assertEqual(len(rebuilds), 1)  # one rebuild at a time
+        func, args = rebuilds[0]
+        func(*args)
+        self.assertIsNot(autocomplete.get_index(), first)
+        self.assertEqual(len(autocomplete.get_index().lookup("la")), 1)
+
+    def test_failed_rebuild_waits_before_the_next_try(self):
+        first = autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Lamp", description="", price=Decimal('1.00'))
+        rebuilds = []
+        with patch.object(autocomplete, '_in_background', lambda func, *args: rebuilds.append((func, args))), \
+                patch.object(autocomplete, 'build_index', side_effect=DatabaseError("locked")), \
+                self.assertLogs('shop.autocomplete', 'ERROR'):
+            autocomplete.get_index()
+            func, args = rebuilds[0]
+            func(*args)
+            self.assertIs(autocomplete.get_index(), first)  # still served
+        self.assertEqual(len(rebuilds), 1)  # no new thread per request
+        autocomplete._retry_at = 0.0
+        with patch.object(autocomplete, '_in_background', lambda func, *args: func(*args)):
+            autocomplete.get_index()  # tried again once the wait is over
+        self.assertEqual(len(autocomplete.get_index().lookup("la")), 1)
+
+    def test_endpoint_answers_without_queries_when_warm(self):
+        make_products(5)
+        self.client.get(reverse('shop_autocomplete'), {'q': "prod"})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('shop_autocomplete'), {'q': "prod"})
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]['type'], 'product')
+
+
+# ----------------- Featured Products -----------------
+class FeaturedProductsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog._snapshot = None
+
+    def test_picks_distinct_products_with_images(self):
+        with_images = make_products(10)
+        for product in with_images[::2]:
+            product.image = f"products/{product.id}.jpg"
+        Product.objects.bulk_update(with_images, ['image'])
+        Product.objects.filter(pk=with_images[1].pk).update(image='')
+        expected = {p.id for p in with_images[::2]}
+        for seed in range(10):
+            picked = catalog.featured_products(3, rng=random.Random(seed))
+            self.assertEqual(len({p.id for p in picked}), 3)
+            self.assertLessEqual({p.id for p in picked}, expected)
+
+    def test_cost_does_not_grow_with_catalog(self):
+        products = make_products(200)
+        for product in products:
+            product.image = "products/x.jpg"
+        Product.objects.bulk_update(products, ['image'])
+        catalog.featured_products(3)  # warm the id bounds
+        with CaptureQueriesContext(connection) as ctx:
+            catalog.featured_products(3, rng=random.Random(0))
+        self.assertLessEqual(len(ctx.captured_queries), 9)
+        self.assertTrue(all('LIMIT 1' in q['sql'] for q in ctx.captured_queries))
+
+    def test_no_images_means_no_featured_products(self):
+        make_products(3)
+        self.assertEqual(catalog.featured_products(3), [])
+        self.assertEqual(self.client.get(reverse('shop_about')).status_code, 200)
+
+
+# ----------------- Order Tracking -----------------
+class TrackOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tracking.tracker = tracking.OrderTracker()
+        self.customer = Customer.objects.create(full_name="Buyer", email="b@example.com", address="Street 1")
+
+    def create_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(customer=self.customer, items=[], total_price=Decimal('1.00'))
+
+    def track(self, tracking_id):
+        return self.client.post(reverse('shop_track_order'), {'tracking_id': tracking_id})
+
+    def test_found_order_is_served_from_cache(self):
+        order = self.create_order()
+        cache.clear()
+        self.assertEqual(self.track(order.tracking_id.lower()).context['order']['customer']['full_name'], "Buyer")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.track(order.tracking_id)
+        self.assertEqual(response.context['order']['status'], 'pending')
+        self.assertFalse([q for q in ctx.captured_queries if 'shop_order' in q['sql']])
+
+    def test_status_change_invalidates_cached_entry(self):
+        order = self.create_order()
+        self.track(order.tracking_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'shipped'
+            order.save()
+        self.assertEqual(self.track(order.tracking_id).context['order']['status'], 'shipped')
+
+    def test_customer_changes_reach_cached_orders(self):
+        order = self.create_order()
+        self.track(order.tracking_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.address = "Street 2"
+            self.customer.save()
+        self.assertEqual(self.track(order.tracking_id).context['order']['customer']['address'], "Street 2")
+
+        # Checkout updates a returning customer's details without a signal.
+        product, = make_products(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(price_cart({str(product.id): 1}), "Buyer Renamed", self.customer.email, "Street 3", 'cod')
+        customer = self.track(order.tracking_id).context['order']['customer']
+        self.assertEqual(customer, {'full_name': "Buyer Renamed", 'address': "Street 3"})
+
+    def test_misses_do_not_touch_orders_table(self):
+        self.create_order()
+        self.track("000000000000")  # builds the Bloom filter
+        with CaptureQueriesContext(connection) as ctx:
+            for guess in ("ABCDEF123456", "not-an-id", "123456789ABC"):
+                self.assertEqual(self.track(guess).context['error'], "Order not found with that Tracking ID.")
+        self.assertFalse([q for q in ctx.captured_queries if 'shop_order' in q['sql']])
+
+    def test_new_order_is_found_before_filter_refresh(self):
+        self.track("000000000000")
+        order = self.create_order()
+        self.assertIsNotNone(tracking.lookup_order(order.tracking_id))
+        cache.clear()
+        tracking.tracker.refreshed_at = 0.0
+        self.assertIsNotNone(tracking.lookup_order(order.tracking_id))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = tracking.BloomFilter(1000)
+        keys = [f"{i:012X}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f"{i:012X}" in bloom for i in range(10_000, 20_000))
+        self.assertLess(false_positives, 300)
+
+
+# ----------------- Order Items -----------------
+class OrderItemTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(full_name="Buyer", email="b@example.com", address="Street")
+
+    def test_checkout_writes_order_items(self):
+        a, b = make_products(2, price='2.50')
+        order = place_order(price_cart({str(a.id): 2, str(b.id): 1}), "Buyer", "b@example.com", "Street", 'cod')
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+        self.assertEqual(OrderItem.objects.filter(product=a).units_sold(), 2)
+        self.assertEqual(order.line_items, order.items)
+
+    def test_backfill_is_batched_resumable_and_idempotent(self):
+        product, = make_products(1)
+        orders = [
+            Order.objects.create(customer=self.customer, total_price=Decimal('20.00'), items=[
+                {'product_id': product.id, 'name': "Product 0", 'quantity': 2, 'unit_price': 10.0, 'subtotal': 20.0},
+                {'product_id': 999999, 'name': "Deleted", 'quantity': 1, 'unit_price': 5.0, 'subtotal': 5.0},
+            ])
+            for _ in range(5)
+        ]
+        self.assertEqual(orders[0].line_items[1]['name'], "Deleted")  # falls back to JSON
+        out = StringIO()
+        call_command('backfill_order_items', batch_size=2, restart=True, stdout=out)
+        self.assertEqual(OrderItem.objects.count(), 10)
+        self.assertIsNone(OrderItem.objects.get(order=orders[0], name="Deleted").product_id)
+        call_command('backfill_order_items', restart=True, stdout=out)
+        self.assertEqual(OrderItem.objects.count(), 10)
+        self.assertEqual(orders[0].line_items[0]['quantity'], 2)
+
+    def test_backfilled_items_reach_the_sales_report(self):
+        product, = make_products(1)
+        order = Order.objects.create(customer=self.customer, total_price=Decimal('20.00'), items=[
+            {'product_id': product.id, 'name': "Product 0", 'quantity': 2, 'unit_price': 10.0, 'subtotal': 20.0},
+        ])
+        placed = timezone.now() - timedelta(days=2)
+        Order.objects.filter(pk=order.pk).update(created_at=placed)
+        roll_up_sales()  # the mark is now past the order
+        call_command('backfill_order_items', restart=True, stdout=StringIO())
+        self.assertEqual(sales_report(placed.date(), placed.date())['totals']['total_units'], 2)
+
+
+# ----------------- Sales Rollups -----------------
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shoes = Category.objects.create(name="Shoes")
+        self.boot, = make_products(1, price='10.00', category=self.shoes, stock=100)
+        self.loose, = make_products(1, price='3.00', stock=100)
+
+    def test_the_test_run_has_a_cache_of_its_own(self):
+        # setUp clears the cache; the configured CACHE_DIR must survive that.
+        from django.core.cache.backends.locmem import LocMemCache
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def order(self, cart, payment_method, when):
+        order = place_order(price_cart(cart), "Buyer", "b@example.com", "Street", payment_method)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        OrderItem.objects.filter(order=order).update(created_at=when)
+
+    def test_rolls_up_incrementally_from_high_water_mark(self):
+        day = timezone.now() - timedelta(days=2)
+        self.order({str(self.boot.id): 2, str(self.loose.id): 1}, 'cod', day)
+        self.order({str(self.boot.id): 1}, 'card', day)
+        first_run = day + timedelta(minutes=30)
+        roll_up_sales(now=first_run)
+        self.assertEqual(roll_up_sales(now=first_run), 0)  # nothing new since the mark
+
+        self.order({str(self.boot.id): 1}, 'cod', day + timedelta(hours=1))
+        roll_up_sales()
+
+        report = sales_report(day.date(), day.date())
+        self.assertEqual(report['totals'], {'total_order_count': 3, 'total_units': 5, 'total_revenue': Decimal('43.00')})
+        by_category = {row['category']: row for row in report['by_category']}
+        self.assertEqual(by_category["Shoes"]['total_units'], 4)
+        self.assertEqual(by_category[catalog.UNCATEGORIZED]['total_revenue'], Decimal('3.00'))
+        by_payment = {row['payment_method']: row['total_order_count'] for row in report['by_payment_method']}
+        self.assertEqual(by_payment, {'cod': 2, 'card': 1})
+
+    def test_leaves_unsettled_orders_for_next_run(self):
+        self.order({str(self.boot.id): 1}, 'cod', timezone.now())
+        roll_up_sales()
+        self.assertFalse(DailySalesRollup.objects.exists())
+        roll_up_sales(now=timezone.now() + timedelta(minutes=10))
+        self.assertTrue(DailySalesRollup.objects.exists())
+
+    def test_orders_in_the_same_minute_share_a_scheduled_run(self):
+        minute = timezone.now().replace(second=0, microsecond=0)
+        for moment in (minute + timedelta(seconds=10), minute + timedelta(seconds=50), minute + timedelta(minutes=1)):
+            with patch('django.utils.timezone.now', return_value=moment):
+                schedule_rollup()
+        runs = list(Job.objects.filter(task='shop.reports.roll_up_sales').order_by('run_at'))
+        self.assertEqual([job.run_at for job in runs],
+                         [minute + timedelta(minutes=1) + SETTLE_DELAY, minute + timedelta(minutes=2) + SETTLE_DELAY])
+
+    def test_checkout_schedules_a_rollup(self):
+        set_cart(self.client, {self.boot.id: 1})
+        self.client.post(reverse('shop_checkout'), {
+            'full_name': "Buyer", 'email': "b@example.com", 'address': "Street", 'payment_method': 'cod',
+        })
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(Job.objects.filter(task='shop.reports.roll_up_sales', status=Job.QUEUED).exists())
+
+    def test_report_view_is_staff_only(self):
+        url = reverse('shop_sales_report')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        self.client.get(reverse('admin:index'))  # first request stamps session activity
+        self.customer = Customer.objects.create(full_name="Ada Lovelace", email="ada@example.com", address="1 Street")
+
+    def make_orders(self, n):
+        customers = Customer.objects.bulk_create(
+            Customer(full_name=f"Customer {i}", email=f"c{i}-{random.random()}@example.com", address="x")
+            for i in range(n)
+        )
+        Order.objects.bulk_create(
+            Order(customer=c, items=[], total_price=1, tracking_id=f"{c.pk:012X}") for c in customers
+        )
+
+    def changelist_queries(self, model, **params):
+        url = reverse(f'admin:shop_{model}_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        make_products(3, category=Category.objects.create(name="Shoes"))
+        self.make_orders(3)
+        counts = {model: self.changelist_queries(model)[1] for model in ('order', 'product', 'customer')}
+        make_products(150, category=Category.objects.create(name="Hats"))
+        self.make_orders(150)
+        for model, count in counts.items():
+            self.assertEqual(self.changelist_queries(model)[1], count, model)
+
+    def test_order_search_by_tracking_id_email_and_name(self):
+        order = Order.objects.create(customer=self.customer, items=[], total_price=1)
+        self.make_orders(5)
+        for term in (order.tracking_id.lower(), "ADA@example.com", "ada lov"):
+            response, _ = self.changelist_queries('order', q=term)
+            self.assertEqual(list(response.context['cl'].result_list), [order], term)
+
+    def test_product_search_uses_full_text_index(self):
+        make_products(3)
+        boot = Product.objects.create(name="Leather Boot", price=1, stock=1, description="")
+        response, _ = self.changelist_queries('product', q="leath")
+        self.assertEqual(list(response.context['cl'].result_list), [boot])
+
+    def test_unfiltered_count_is_estimated_above_limit(self):
+        from .admin import EstimatedCountPaginator
+        self.make_orders(5)
+        orders = Order.objects.order_by('pk')
+        Order.objects.filter(pk=orders.first().pk).delete()
+        paginator = EstimatedCountPaginator(orders, 100)
+        self.assertEqual(paginator.count, 4)  # exact under the limit
+        paginator = EstimatedCountPaginator(orders, 100)
+        paginator.exact_count_limit = 2
+        self.assertEqual(paginator.count, orders.last().pk)
+        self.assertEqual(EstimatedCountPaginator(orders.filter(status='pending'), 100).count, 4)
+
+    def test_estimate_is_settled_by_the_last_page(self):
+        from .admin import EstimatedCountPaginator
+        self.make_orders(5)
+        orders = Order.objects.order_by('pk')
+        Order.objects.filter(pk__in=list(orders.values_list('pk', flat=True)[:3])).delete()
+        paginator = EstimatedCountPaginator(orders, 1)
+        paginator.exact_count_limit = 1
+        self.assertGreater(paginator.num_pages, 2)  # Max(pk) overestimates
+        page = paginator.page(paginator.num_pages)  # past the real end
+        self.assertEqual((page.number, paginator.count, paginator.num_pages), (2, 2, 2))
+        self.assertEqual(list(page.object_list), [orders.last()])
+
+    def test_customer_search_by_email_and_name_prefix(self):
+        response, _ = self.changelist_queries('customer', q="ADA@Example.com")
+        self.assertEqual(list(response.context['cl'].result_list), [self.customer])
+        response, _ = self.changelist_queries('customer', q="ada lo")
+        self.assertEqual(list(response.context['cl'].result_list), [self.customer])
+        response, _ = self.changelist_queries('customer', q="lovelace")  # prefix only
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        self.assertContains(response, "the start of a customer")
+
+    def test_non_ascii_terms_still_match(self):
+        # SQLite's LOWER() leaves É alone, so the Lower() range can't serve these.
+        emile = Customer.objects.create(full_name="Émile Zola", email="Émile@example.com", address="x")
+        Order.objects.create(customer=emile, items=[], total_price=1, tracking_id="ABCDEF123456")
+        for model in ('customer', 'order'):
+            for term in ("Émile", "Émile Z", "Émile@example.com"):
+                response, _ = self.changelist_queries(model, q=term)
+                found = response.context['cl'].result_list
+                self.assertEqual([getattr(obj, 'customer', obj) for obj in found], [emile], (model, term))
+
+
+class ProductImportExportTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        (self.media_root / 'products').mkdir()
+        (self.media_root / 'products' / 'boot.jpg').write_bytes(b'jpg')
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+    def run_import(self, text, format='csv', batch_size=2):
+        return product_io.import_products(product_io.read_rows(StringIO(text), format), batch_size)
+
+    def test_creates_categories_and_products_in_batches(self):
+        Category.objects.create(name="Shoes")
+        result = self.run_import(
+            "name,price,stock,category,image\n"
+            "Boot,49.90,3,Shoes,products/boot.jpg\n"
+            "Hat,10,1,Hats,\n"
+            "Scarf,5,0,Hats,\n"
+        )
+        self.assertEqual((result.created, result.updated, result.failed), (3, 0, 0))
+        self.assertEqual(Category.objects.count(), 2)
+        boot = Product.objects.get(name="Boot")
+        self.assertEqual((boot.category.name, boot.image.name, boot.price), ("Shoes", 'products/boot.jpg', Decimal('49.90')))
+        self.assertEqual(search_products("boot").products[0], boot)
+
+    def test_rows_with_ids_upsert_and_missing_columns_are_kept(self):
+        boot = Product.objects.create(name="Boot", price=1, stock=1, description="Warm")
+        result = self.run_import(f'{{"id": {boot.id}, "name": "Boot II", "price": "2.50"}}\n'
+                                 '{"id": 9000, "name": "New", "price": "3"}\n', format='jsonl')
+        self.assertEqual((result.created, result.updated), (1, 1))
+        boot.refresh_from_db()
+        self.assertEqual((boot.name, boot.price, boot.stock, boot.description), ("Boot II", Decimal('2.50'), 1, "Warm"))
+        self.assertTrue(Product.objects.filter(pk=9000).exists())
+
+    def test_partial_rows_only_update_existing_products(self):
+        boot = Product.objects.create(name="Boot", price=1, stock=1, description="")
+        result = self.run_import(f"id,stock\n{boot.id},7\n12345,1\n")
+        self.assertEqual((result.updated, result.failed, result.errors), (1, 1, [(3, "no product with id 12345")]))
+        boot.refresh_from_db()
+        self.assertEqual(boot.stock, 7)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = self.run_import(
+            "name,price,image\n"
+            "Boot,abc,\n"
+            ",1,\n"
+            "Hat,1,products/missing.jpg\n"
+            "Cap,1,../../etc/passwd\n"
+            "Scarf,1,\n"
+        )
+        self.assertEqual((result.created, result.failed), (1, 4))
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4, 5])
+
+    def test_export_round_trips_through_import(self):
+        shoes = Category.objects.create(name="Shoes")
+        make_products(3, category=shoes)
+        out = StringIO()
+        call_command('export_products', '-', format='jsonl', stdout=out)
+        Product.objects.update(stock=0)
+        result = self.run_import(out.getvalue(), format='jsonl', batch_size=100)
+        self.assertEqual((result.created, result.updated), (0, 3))
+        self.assertFalse(Product.objects.filter(stock=0).exists())
+
+    def test_only_imported_products_are_reindexed(self):
+        boot = Product.objects.create(name="Boot", price=1, stock=1, description="Warm")
+        # Written behind the signals' back: a full rebuild would pick it up.
+        Product.objects.filter(pk=boot.pk).update(name="Clog")
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_import('id,name,price\n9000,Sandal,2\n')
+        fts = [q['sql'] for q in ctx.captured_queries if search.FTS_TABLE in q['sql']]
+        self.assertTrue(fts and all('IN (%s)' % 9000 in sql for sql in fts), fts)
+        self.assertEqual([p.pk for p in search_products("sandal").products], [9000])
+        self.assertEqual(search_products("clog").products, [])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_import(f"id,stock\n{boot.pk},4\n")  # stock isn't indexed
+        self.assertFalse([q for q in ctx.captured_queries if search.FTS_TABLE in q['sql']])
+
+    def test_import_invalidates_catalog(self):
+        before = catalog.catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_import("name,price\nBoot,1\n")
+        self.assertNotEqual(catalog.catalog_version(), before)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = Path(media.name)
+        (self.root / 'products').mkdir()
+        Image.new('RGB', (800, 400), 'red').save(self.root / 'products' / 'boot.jpg')
+        (self.root / 'products' / 'notes.jpg').write_bytes(b'not an image')
+        self.enterContext(override_settings(MEDIA_ROOT=self.root, MEDIA_URL='/media/'))
+
+    def render(self, image):
+        return Template('{% load shop_extras %}{% responsive_image image alt="Boot" sizes="50vw" %}').render(
+            Context({'image': image})
+        )
+
+    def test_tag_emits_webp_and_resized_srcsets(self):
+        images.derivatives_for('products/boot.jpg')  # the queued job
+        html = self.render('products/boot.jpg')
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="800" height="400"', html)
+        for width in (160, 320, 640):
+            self.assertIn(f"-{width}.webp {width}w", html)
+            self.assertIn(f"-{width}.jpg {width}w", html)
+        self.assertIn('/media/products/boot.jpg 800w', html)
+        self.assertNotIn('-960.', html)  # never upscaled
+
+    def test_derivatives_are_content_addressed(self):
+        first = images.build_derivatives('products/boot.jpg')
+        (self.root / 'products' / 'copy.jpg').write_bytes((self.root / 'products' / 'boot.jpg').read_bytes())
+        self.assertEqual(images.build_derivatives('products/copy.jpg'), first)
+        for _, path in first['webp'] + first['fallback']:
+            self.assertTrue((self.root / images.DERIVATIVES_DIR / path).is_file())
+
+    def test_unreadable_image_falls_back_to_original(self):
+        images.derivatives_for('products/notes.jpg')
+        html = self.render('products/notes.jpg')
+        self.assertNotIn('<picture>', html)
+        self.assertIn('src="/media/products/notes.jpg"', html)
+
+    def test_render_shows_the_original_until_the_job_has_run(self):
+        html = self.render('products/boot.jpg')
+        self.assertNotIn('<picture>', html)
+        self.assertIn('src="/media/products/boot.jpg"', html)
+        self.assertFalse((self.root / images.DERIVATIVES_DIR).exists())  # nothing built in the request
+        images.derivatives_for('products/boot.jpg')
+        self.assertIn('<picture>', self.render('products/boot.jpg'))
+
+    def test_saving_a_product_queues_its_derivatives(self):
+        Product.objects.create(name="Boot", price=1, stock=1, description="", image='products/boot.jpg')
+        Product.objects.create(name="Boot 2", price=1, stock=1, description="", image='products/boot.jpg')
+        self.assertEqual(Job.objects.filter(task='shop.images.derivatives_for').count(), 1)
+        self.assertFalse((self.root / images.DERIVATIVES_DIR).exists())
+        Worker().run(once=True)
+        self.assertEqual(len(list((self.root / images.DERIVATIVES_DIR).glob('*/*.json'))), 1)
+
+    def test_only_a_changed_image_is_queued_again(self):
+        product = Product.objects.create(name="Boot", price=1, stock=1, description="", image='products/boot.jpg')
+        Worker().run(once=True)
+        product = Product.objects.get(pk=product.pk)
+        product.price = 2
+        product.save()
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+        product.image = 'products/notes.jpg'
+        product.save()
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).args, ['products/notes.jpg', catalog.CATALOG_VERSION_KEY])
+
+    def test_job_bumps_the_version_so_cards_pick_the_derivatives_up(self):
+        from .cards import product_cards
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name="Boot", price=1, stock=1, description="", image='products/boot.jpg')
+        self.assertNotIn('<picture>', product_cards([product])[0].image)
+        before = catalog.catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Worker().run(once=True)
+        self.assertNotEqual(catalog.catalog_version(), before)
+        self.assertIn('<picture>', product_cards([product])[0].image)
+
+    def test_manifest_is_read_from_disk_when_the_cache_loses_it(self):
+        images.derivatives_for('products/boot.jpg')
+        cache.clear()
+        self.assertIn('<picture>', self.render('products/boot.jpg'))
+        self.assertIsNotNone(cache.get(images._cache_key('products/boot.jpg')))  # recorded again
+
+    def test_backfill_command_skips_derivatives_and_bad_files(self):
+        shared = tempfile.TemporaryDirectory()  # a cache the pool's processes share, as in production
+        self.addCleanup(shared.cleanup)
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'shop.filecache.FileBasedCache', 'LOCATION': shared.name,
+        }}))
+        out, err = StringIO(), StringIO()
+        call_command('build_image_derivatives', workers=2, stdout=out, stderr=err)
+        self.assertIn("Processed 1 images", out.getvalue())
+        self.assertIn("products/notes.jpg", err.getvalue())
+        self.assertIn('<picture>', self.render('products/boot.jpg'))  # manifests recorded
+        self.assertEqual(sorted(images.find_images()), ['products/boot.jpg', 'products/notes.jpg'])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = Path(media.name)
+        (self.root / 'products').mkdir()
+        self.data = bytes(range(256)) * 40
+        (self.root / 'products' / 'boot.jpg').write_bytes(self.data)
+        (self.root / 'products' / f"{'ab' * 16}-320.webp").write_bytes(b'webp')
+        self.enterContext(override_settings(MEDIA_ROOT=self.root, MEDIA_URL='/media/'))
+
+    def get(self, path='/media/products/boot.jpg', **headers):
+        response = self.client.get(path, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_serves_file_with_validators_and_no_queries(self):
+        with self.assertNumQueries(0):
+            response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.data))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], f'public, max-age={media.MAX_AGE}')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn('Set-Cookie', response)
+
+    def test_conditional_requests_get_304(self):
+        first, _ = self.get()
+        response, body = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertEqual(response['ETag'], first['ETag'])
+        response, _ = self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        response, _ = self.get(HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_byte_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.get(HTTP_RANGE='bytes=-5')[1], self.data[-5:])
+        self.assertEqual(self.get(HTTP_RANGE='bytes=10000-')[1], self.data[10000:])
+        response, _ = self.get(HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.data)}'))
+        # A stale If-Range means the client's copy is gone: send it all.
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_hashed_names_are_immutable(self):
+        response, _ = self.get(f"/media/products/{'ab' * 16}-320.webp")
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_rejects_escapes_missing_files_and_writes(self):
+        (self.root.parent / 'secret.txt').write_text('x')
+        self.addCleanup((self.root.parent / 'secret.txt').unlink)
+        for path in ('/media/../secret.txt', '/media/products/', '/media/products/missing.jpg'):
+            self.assertEqual(self.get(path)[0].status_code, 404, path)
+        self.assertEqual(self.client.post('/media/products/boot.jpg').status_code, 405)
+
+
+class SessionWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper", password="pw")
+        self.client.force_login(self.user)
+
+    def session_writes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        return sum(1 for q in ctx.captured_queries
+                   if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT'))
+
+    def set_last_activity(self, seconds_ago):
+        session = self.client.session
+        session['last_activity'] = int(timezone.now().timestamp()) - seconds_ago
+        session.save()
+
+    def test_activity_is_persisted_at_coarse_granularity(self):
+        home = reverse('shop_home')
+        self.assertEqual(self.session_writes(home), 1)  # first stamp
+        self.assertEqual([self.session_writes(home) for _ in range(5)], [0] * 5)
+        self.set_last_activity(ACTIVITY_GRANULARITY + 1)
+        self.assertEqual(self.session_writes(home), 1)
+
+    def test_home_page_keeps_user_and_cart(self):
+        product, = make_products(1)
+        set_cart(self.client, {product.id: 2})
+        self.client.get(reverse('shop_home'))
+        self.assertEqual(client_cart(self.client), {product.id: 2})
+        self.assertIn('_auth_user_id', self.client.session)
+
+    def test_logs_out_after_idle_timeout(self):
+        self.set_last_activity(AutoLogoutMiddleware(None).timeout + ACTIVITY_GRANULARITY + 1)
+        self.client.get(reverse('shop_home'))
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_logs_out_only_after_timeout_plus_granularity(self):
+        timeout = AutoLogoutMiddleware(None).timeout
+        start = timezone.now()
+
+        def signed_in_after_get(seconds):
+            with patch('shop.middleware.timezone.now', return_value=start + timedelta(seconds=seconds)):
+                self.client.get(reverse('shop_home'))
+            return '_auth_user_id' in self.client.session
+
+        self.assertTrue(signed_in_after_get(0))  # stamps activity
+        idle = timeout + ACTIVITY_GRANULARITY
+        self.assertTrue(signed_in_after_get(idle))  # not yet; stamps again
+        self.assertFalse(signed_in_after_get(2 * idle + 1))
+
+    @override_settings(MIDDLEWARE=[
+        'shop.management.commands.bench_sessions.PerRequestActivityMiddleware' if m.endswith('AutoLogoutMiddleware') else m
+        for m in settings.MIDDLEWARE
+    ])
+    def test_per_request_baseline_writes_every_request(self):
+        home = reverse('shop_home')
+        self.assertEqual([self.session_writes(home) for _ in range(3)], [1] * 3)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.boot, = make_products(1)
+        # make_products skips signals; start from a known version.
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.bump_catalog_version()
+
+    def test_repeat_visit_gets_304_until_catalog_changes(self):
+        url = reverse('shop_home')
+        first = self.client.get(url)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Fresh Hat", price=1, stock=1, description="")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Fresh Hat")
+
+    def test_cart_is_overlaid_on_the_shared_fragment(self):
+        url = reverse('shop_home')
+        empty = self.client.get(url)
+        # Bypasses the signals: only a version bump may change the fragment.
+        Product.objects.filter(pk=self.boot.pk).update(name="Renamed")
+        set_cart(self.client, {self.boot.id: 2})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=empty['ETag'])
+        self.assertEqual(response.status_code, 200)  # the cart is part of the ETag
+        self.assertNotIn('Last-Modified', response)
+        self.assertContains(response, self.boot.name)  # fragment reused, not re-rendered
+        self.assertContains(response, f'{{"{self.boot.id}": 2}}')
+
+    def test_pending_messages_are_never_answered_with_304(self):
+        url = reverse('shop_home')
+        etag = self.client.get(url)['ETag']
+        self.client.get(reverse('shop_cart'), {'add': self.boot.id})  # queues "Added ..." message
+        set_cart(self.client, {})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_blog_post_revalidates_until_a_comment_is_added(self):
+        from blog.models import AboutComment, BlogPost
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(title="Hello", author="Ann", excerpt="e", content="Body")
+        url = reverse('blog_post_detail', args=[post.slug])
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        version = versions.content_version(BLOG_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            AboutComment.objects.create(blog_post=post, name="Bo", comment="Nice")
+        self.assertNotEqual(versions.content_version(BLOG_VERSION_KEY), version)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_a_new_release_retires_etags_and_fragments(self):
+        self.addCleanup(versions.release.cache_clear)
+        contact = self.client.get(reverse('shop_contact'))
+        home = self.client.get(reverse('shop_home'))
+        Product.objects.filter(pk=self.boot.pk).update(name="Renamed")  # no version bump
+        self.assertEqual(self.client.get(reverse('shop_contact'), HTTP_IF_NONE_MATCH=contact['ETag']).status_code, 304)
+        with override_settings(RELEASE='next'):
+            versions.release.cache_clear()
+            catalog._snapshot = None  # as in a restarted worker
+            response = self.client.get(reverse('shop_contact'), HTTP_IF_NONE_MATCH=contact['ETag'])
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse('shop_home'), HTTP_IF_NONE_MATCH=home['ETag'])
+            self.assertContains(response, "Renamed")
+
+    def test_fragments_ignore_unknown_query_parameters(self):
+        url = reverse('shop_home')
+        self.client.get(url, {'utm_source': 'a'})
+        Product.objects.filter(pk=self.boot.pk).update(name="Renamed")  # no version bump
+        response = self.client.get(url, {'utm_source': 'b', 'ref': 'x'})
+        self.assertNotContains(response, "Renamed")  # the same fragment
+        self.assertContains(self.client.get(url, {'sort': 'price'}), "Renamed")
+
+    def test_version_outlives_the_cache_and_moves_once_per_transaction(self):
+        key = catalog.CATALOG_VERSION_KEY
+        version = versions.content_version(key)
+        cache.clear()  # culled or lost: the row still has it
+        self.assertEqual(versions.content_version(key), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            versions.bump_content_version(key)
+            versions.bump_content_version(key)
+        self.assertEqual(versions.content_version(key), version + 1)
+        self.assertEqual(ContentVersion.objects.get(name=key).version, version + 1)
+
+
+# ----------------- Product Cards -----------------
+class ProductCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_carry_preformatted_values(self):
+        boot, hat = make_products(2, price='1234.50')
+        hat.image = 'products/missing.jpg'
+        first, second = cards.product_cards([boot, hat], {hat.id: 3})
+        self.assertEqual((first.id, first.price, first.quantity, first.in_cart), (str(boot.id), '1234.50', '0', False))
+        self.assertIn('default-product.png', first.image)
+        self.assertEqual((second.quantity, second.in_cart), ('3', True))
+        self.assertIn('/media/products/missing.jpg', second.image)
+
+    def test_search_renders_cart_quantities_into_cards(self):
+        boot, hat = make_products(2)
+        rebuild_search_index()
+        set_cart(self.client, {hat.id: 2})
+        response = self.client.get(reverse('shop_search'), {'query': "product"})
+        self.assertContains(response, f'<span class="fs-5 fw-bold" id="display-qty-{hat.id}">2</span>', html=True)
+        self.assertContains(response, f'id="qty-{boot.id}" value="0"')
+        self.assertContains(response, f"""onclick="changeQty('{boot.id}', -1)" disabled""")
+        self.assertNotContains(response, f"""onclick="changeQty('{hat.id}', -1)" disabled""")
+
+    def test_grid_cards_are_only_built_when_the_fragment_renders(self):
+        make_products(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.bump_catalog_version()
+        with patch.object(cards, 'product_cards', wraps=cards.product_cards) as build:
+            self.client.get(reverse('shop_home'))
+            self.client.get(reverse('shop_home'))
+        self.assertEqual(build.call_count, 1)
+
+    def test_templates_use_the_cached_loader(self):
+        from django.template import engines
+        from django.template.loaders.cached import Loader
+        self.assertIsInstance(engines['django'].engine.template_loaders[0], Loader)
+
+
+# ----------------- Endpoint Query Budgets -----------------
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EndpointBudgetTests(TransactionTestCase):
+    # Not TestCase: in its wrapping transaction, views' transactions become
+    # uncounted savepoints and reads don't go to the replica. Here requests
+    # run in autocommit, as in production.
+    databases = {'default', db_router.READ_ALIAS}
+
+    def setUp(self):
+        cache.clear()
+        fresh_autocomplete_index(self)
+
+    def test_every_endpoint_stays_within_its_query_budget(self):
+        dataset = bench_suite.seed_dataset(40)
+        # Twice each: the first request renders cold fragments, the second reuses them.
+        for result in bench_suite.run_suite(dataset, requests=2):
+            with self.subTest(result.name):
+                self.assertLessEqual(result.queries, result.budget)
+                self.assertEqual(result.statuses, (result.expected_status,))
+
+    def test_suite_covers_every_app_url(self):
+        from django.urls import get_resolver
+        covered = {endpoint.name.split('?')[0].split(' ')[0] for endpoint in bench_suite.ENDPOINTS}
+        for app in ('shop', 'blog', 'accounts'):
+            for pattern in get_resolver(f'{app}.urls').url_patterns:
+                self.assertIn(pattern.name, covered)
+
+
+# ----------------- Instrumentation -----------------
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        logs = tempfile.TemporaryDirectory()
+        self.addCleanup(logs.cleanup)
+        self.log_path = Path(logs.name) / 'slow.jsonl'
+        self.enterContext(override_settings(SLOW_LOG_PATH=self.log_path))
+
+    def slow_entries(self):
+        if not self.log_path.exists():
+            return []
+        return [json.loads(line) for line in self.log_path.read_text().splitlines()]
+
+    def test_server_timing_reports_queries(self):
+        make_products(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shop_products'))
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+, total;dur=')
+
+    def test_fast_requests_stay_out_of_the_slow_log(self):
+        self.client.get(reverse('shop_contact'))
+        self.assertEqual(self.slow_entries(), [])
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_is_logged_with_duplicate_fingerprints(self):
+        from blog.models import BlogPost
+        posts = [BlogPost.objects.create(title=f"Post {i}", author="a", excerpt="", content="") for i in range(3)]
+
+        def chatty(request):
+            for post in posts:
+                BlogPost.objects.filter(pk=post.pk).exists()
+            return HttpResponse()
+
+        urlconf = type('urls', (), {'urlpatterns': [path('chatty/', chatty, name='chatty')]})
+        with override_settings(ROOT_URLCONF=urlconf):
+            self.client.get('/chatty/')
+        entry, = self.slow_entries()
+        self.assertEqual((entry['view'], entry['status'], entry['queries']), ('chatty', 200, 3))
+        self.assertGreaterEqual(entry['ms'], entry['db_ms'])
+        duplicate, = entry['duplicates']
+        self.assertEqual(duplicate['times'], 3)
+        self.assertIn('"blog_blogpost"', duplicate['sql'])
+
+    def test_fingerprint_folds_in_lists_and_numbers(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 5'),
+        )
+
+
+# ----------------- Profiling -----------------
+def sleepy_view(request):
+    time.sleep(0.05)
+    return HttpResponse("done")
+
+
+profiling_urls = type('urls', (), {'urlpatterns': [path('sleepy/', sleepy_view, name='sleepy')]})
+
+
+@override_settings(ROOT_URLCONF=profiling_urls, PROFILE_INTERVAL_MS=2)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiles = tempfile.TemporaryDirectory()
+        self.addCleanup(profiles.cleanup)
+        self.root = Path(profiles.name)
+        self.enterContext(override_settings(PROFILES_DIR=self.root))
+
+    def profiles(self):
+        return sorted(p.relative_to(self.root).as_posix() for p in self.root.rglob('*') if p.is_file())
+
+    def test_signed_header_profiles_the_view(self):
+        response = self.client.get('/sleepy/', HTTP_X_PROFILE=profiling.profile_token())
+        profile, = self.profiles()
+        self.assertTrue(profile.startswith('shop/sleepy/'))
+        self.assertTrue(profile.endswith(response['X-Profile-Id']))
+        stacks = (self.root / profile).read_text()
+        self.assertIn('shop/tests.py:sleepy_view', stacks)
+
+        out = StringIO()
+        call_command('profile_report', top=5, stdout=out)
+        self.assertIn('shop:sleepy 1', out.getvalue())
+        self.assertIn('shop/tests.py:sleepy_view', out.getvalue())
+
+    def test_forged_or_missing_tokens_are_ignored(self):
+        self.client.get('/sleepy/', {'_profile': 'profile:forged:token'})
+        response = self.client.get('/sleepy/')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILER='cprofile', PROFILE_SAMPLE_RATE=1.0)
+    def test_random_sample_with_cprofile(self):
+        self.client.get('/sleepy/')
+        profile, = self.profiles()
+        self.assertTrue(profile.endswith('.prof'))
+        out = StringIO()
+        call_command('profile_report', app=['shop'], stdout=out)
+        self.assertIn('cProfile: 1 profiles', out.getvalue())
+        self.assertIn('sleepy_view', out.getvalue())
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        fresh_autocomplete_index(self)
+
+    def test_hot_views_never_scan_a_whole_table(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset = bench_suite.seed_dataset(40)
+        problems = query_plans.check_endpoints(dataset)
+        self.assertEqual([(problem.endpoint, problem.table, problem.plan) for problem in problems], [])
+
+    def test_full_scans_are_told_from_index_scans(self):
+        plan = query_plans.query_plan('default', 'SELECT id FROM shop_product WHERE description = %s', ['x'])
+        self.assertEqual(query_plans.full_scans(plan), ['shop_product'])
+        self.assertEqual(query_plans.full_scans([
+            'SCAN blog_blogpost USING INDEX blog_post_created_idx',
+            'SCAN shop_product_fts VIRTUAL TABLE INDEX 0:M2',
+            'SCAN shop_category',
+            'SCAN CONSTANT ROW',
+            'CO-ROUTINE subquery',
+            'SCAN shop_order USING COVERING INDEX shop_order_date_idx',
+            'SCAN subquery',
+        ]), [])
+
+
+class ReadConnectionRouterTests(TestCase):
+    def test_catalog_and_blog_reads_go_to_the_replica(self):
+        from blog.models import BlogPost
+        with patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(Product.objects.all().db, db_router.READ_ALIAS)
+            self.assertEqual(BlogPost.objects.all().db, db_router.READ_ALIAS)
+            self.assertEqual(Order.objects.all().db, 'default')
+            self.assertEqual(User.objects.all().db, 'default')
+
+    def test_reads_inside_a_transaction_and_writes_stay_on_default(self):
+        # TestCase wraps every test in a transaction.
+        self.assertTrue(connection.in_atomic_block)
+        self.assertEqual(Product.objects.all().db, 'default')
+        router = db_router.ReadConnectionRouter()
+        with patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertFalse(router.allow_migrate(db_router.READ_ALIAS, 'shop'))
+
+
+# ----------------- Async Views -----------------
+class AsyncViewTests(TestCase):
+    ASYNC_VIEWS = ['shop_home', 'shop_products', 'shop_search', 'shop_track_order', 'blog_home']
+
+    def setUp(self):
+        cache.clear()
+        tracking.tracker = tracking.OrderTracker()
+        from blog.models import BlogPost
+        self.post = BlogPost.objects.create(title="Async post", author="a", excerpt="Fast pages", content="c")
+        self.product = Product.objects.create(name="Async lamp", price=3, stock=2, description="Bright")
+        customer = Customer.objects.create(full_name="Buyer", email="b@example.com", address="Street 1")
+        self.order = Order.objects.create(customer=customer, items=[], total_price=Decimal('1.00'))
+
+    def test_hot_views_are_coroutines_behind_async_capable_middleware(self):
+        for name in self.ASYNC_VIEWS:
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse(name)).func), name)
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(self.post.get_absolute_url()).func))
+        # Django runs any sync-only middleware in a thread under ASGI.
+        for dotted in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(dotted), 'async_capable', False), dotted)
+
+    async def test_pages_render_on_the_asgi_stack(self):
+        client = AsyncClient()
+        home = await client.get(reverse('shop_home'))
+        self.assertContains(home, "Async lamp")
+        self.assertIn('Server-Timing', home)
+        self.assertContains(await client.get(reverse('shop_products')), "Async lamp")
+        self.assertContains(await client.get(reverse('shop_search'), {'query': 'lamp'}), "Async lamp")
+        self.assertContains(await client.get(reverse('blog_home')), "Async post")
+        self.assertContains(await client.get(self.post.get_absolute_url()), "Fast pages")
+        self.assertEqual((await client.get(reverse('blog_post_detail', args=['missing']))).status_code, 404)
+
+        found = await client.post(reverse('shop_track_order'), {'tracking_id': self.order.tracking_id})
+        self.assertEqual(found.context['order']['customer']['full_name'], "Buyer")
+        missing = await client.post(reverse('shop_track_order'), {'tracking_id': 'FFFFFFFFFFFF'})
+        self.assertEqual(missing.context['error'], "Order not found with that Tracking ID.")
+
+    async def test_signed_in_visitor_is_resolved_before_the_view(self):
+        user = await User.objects.acreate_user('async-shopper', password='pw-async-123')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        response = await client.get(reverse('shop_home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], user)
+        repeat = await client.get(reverse('shop_home'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(repeat.status_code, 304)
+
+    @override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if not m.endswith('AutoLogoutMiddleware')])
+    async def test_page_cache_resolves_the_user_itself(self):
+        user = await User.objects.acreate_user('async-reader', password='pw-async-123')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        response = await client.get(reverse('shop_home'))  # rendered on the event loop
+        self.assertEqual(response.context['user'], user)
+
+    def test_asgi_entry_point_turns_off_persistent_connections(self):
+        env = {k: v for k, v in os.environ.items() if k != 'DB_CONN_MAX_AGE'}
+        code = ("import MyEcomStoreNew.asgi; from django.conf import settings; "
+                "print(settings.DATABASES['default']['CONN_MAX_AGE'])")
+        out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), '0')
+
+    def test_cached_blog_fragment_skips_the_post_query(self):
+        get = async_to_sync(AsyncClient().get)
+        get(reverse('blog_home'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = get(reverse('blog_home'))
+        self.assertContains(response, "Async post")
+        self.assertFalse([q for q in ctx.captured_queries if 'blog_blogpost' in q['sql']])
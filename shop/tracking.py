@@ -0,0 +1,209 @@
+import hashlib
+import math
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import Customer, Order
+
+# ----------------- Order Tracking Lookups -----------------
+# Found orders are cached (shared across workers) until the order is saved
+# again, and the customer's name and address under a key of their own until
+# the customer is saved or places another order (checkout may update them).
+# Lookups for ids that don't exist are answered by a per-worker Bloom filter
+# over every tracking id, so bots guessing ids don't reach the database. New
+# orders go straight into the shared cache when they are created, and each
+# worker folds them into its filter with at most one small query every
+# REFRESH_SECONDS, so a fresh order is never reported missing.
+
+TRACKING_ID_RE = re.compile(r'^[0-9A-F]{12}$')
+CACHE_PREFIX = 'shop:track:order:'
+CUSTOMER_PREFIX = 'shop:track:customer:'
+CACHE_TIMEOUT = 60 * 60
+REFRESH_SECONDS = 5
+LOAD_BATCH = 10_000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1024)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class OrderTracker:
+    def __init__(self):
+        self.bloom = None
+        self.high_id = 0
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            if self.bloom is None:
+                self.bloom, self.high_id = self._load(BloomFilter(2 * Order.objects.count()), 0)
+            else:
+                self.high_id = self._load(self.bloom, self.high_id)[1]
+            if self.bloom.count > self.bloom.capacity:
+                # Past capacity the false-positive rate climbs; rebuild bigger
+                # on the side and swap it in, so readers never see a gap.
+                self.bloom, self.high_id = self._load(BloomFilter(2 * self.bloom.count), 0)
+            self.refreshed_at = time.monotonic()
+
+    async def arefresh(self):
+        # refresh() for async views, run on the request's sync thread: it
+        # streams the ids in one query, which the async ORM can't do.
+        self.refreshed_at = time.monotonic()  # one refresh per interval, not one per waiting request
+        await sync_to_async(self.refresh)()
+
+    @staticmethod
+    def _new_orders(after_id):
+        return Order.objects.filter(id__gt=after_id).order_by('id').values_list('id', 'tracking_id')
+
+    @classmethod
+    def _load(cls, bloom, after_id):
+        for pk, tracking_id in cls._new_orders(after_id).iterator(chunk_size=LOAD_BATCH):
+            bloom.add(tracking_id)
+            after_id = pk
+        return bloom, after_id
+
+    def stale(self):
+        return self.bloom is None or time.monotonic() - self.refreshed_at > REFRESH_SECONDS
+
+    def might_exist(self, tracking_id):
+        if self.stale():
+            self.refresh()
+        return tracking_id in self.bloom
+
+    async def amight_exist(self, tracking_id):
+        if self.stale():
+            await self.arefresh()
+        return self.bloom is not None and tracking_id in self.bloom
+
+
+tracker = OrderTracker()
+
+
+def order_record(order):
+    return {
+        'tracking_id': order.tracking_id,
+        'status': order.status,
+        'payment_status': order.payment_status,
+        'created_at': order.created_at,
+        'customer_id': order.customer_id,
+    }
+
+
+def customer_record(customer):
+    return {'full_name': customer.full_name, 'address': customer.address}
+
+
+def cache_key(tracking_id):
+    return f"{CACHE_PREFIX}{tracking_id}"
+
+
+def customer_key(customer_id):
+    return f"{CUSTOMER_PREFIX}{customer_id}"
+
+
+def remember_order(order):
+    # The customer's details are cached once, under their own key, so a
+    # change to them reaches every one of their orders.
+    cache.set_many({
+        cache_key(order.tracking_id): order_record(order),
+        customer_key(order.customer_id): customer_record(order.customer),
+    }, CACHE_TIMEOUT)
+
+
+def forget_order(tracking_id):
+    cache.delete(cache_key(tracking_id))
+
+
+def forget_customer(customer_id):
+    cache.delete(customer_key(customer_id))
+
+
+def _order_query(tracking_id):
+    return (
+        Order.objects.select_related('customer')
+        .only('tracking_id', 'status', 'payment_status', 'created_at', 'customer__full_name', 'customer__address')
+        .filter(tracking_id=tracking_id)
+    )
+
+
+def _customer_query(customer_id):
+    return Customer.objects.filter(pk=customer_id).values('full_name', 'address')
+
+
+def _cached(tracking_id):
+    """(order record, customer record) from the cache; either may be None."""
+    record = cache.get(cache_key(tracking_id))
+    if record is None:
+        return None, None
+    return record, cache.get(customer_key(record['customer_id']))
+
+
+def _tracking_record(record, customer):
+    return {**record, 'customer': customer}
+
+
+def lookup_order(tracking_id):
+    """Return the order's tracking record, or None if there is no such order."""
+    tracking_id = tracking_id.strip().upper()
+    if not TRACKING_ID_RE.match(tracking_id):
+        return None
+    record, customer = _cached(tracking_id)
+    if record is not None:
+        if customer is None:
+            customer = _customer_query(record['customer_id']).first()
+            if customer is None:
+                return None
+            cache.set(customer_key(record['customer_id']), customer, CACHE_TIMEOUT)
+        return _tracking_record(record, customer)
+    if not tracker.might_exist(tracking_id):
+        return None
+    order = _order_query(tracking_id).first()
+    if order is None:
+        return None
+    remember_order(order)
+    return _tracking_record(order_record(order), customer_record(order.customer))
+
+
+async def alookup_order(tracking_id):
+    """lookup_order() on the async ORM."""
+    tracking_id = tracking_id.strip().upper()
+    if not TRACKING_ID_RE.match(tracking_id):
+        return None
+    record, customer = _cached(tracking_id)
+    if record is not None:
+        if customer is None:
+            customer = await _customer_query(record['customer_id']).afirst()
+            if customer is None:
+                return None
+            cache.set(customer_key(record['customer_id']), customer, CACHE_TIMEOUT)
+        return _tracking_record(record, customer)
+    if not await tracker.amight_exist(tracking_id):
+        return None
+    order = await _order_query(tracking_id).afirst()
+    if order is None:
+        return None
+    remember_order(order)
+    return _tracking_record(order_record(order), customer_record(order.customer))
@@ -7,8 +7,10 @@ urlpatterns = [
     path('contact/', views_shop.contact, name='shop_contact'),
     path('products/', views_shop.product, name='shop_products'),
     path('search/', views_shop.search, name='shop_search'),
+    path('autocomplete/', views_shop.autocomplete, name='shop_autocomplete'),
     path('track_order/', views_shop.track_order, name='shop_track_order'),
     path('cart/', views_shop.cart, name='shop_cart'),
     path('checkout/', views_shop.checkout, name='shop_checkout'),
     path('add-multiple-to-cart/', views_shop.add_multiple_to_cart, name='shop_add_multiple_to_cart'),
+    path('reports/sales/', views_shop.sales_report_view, name='shop_sales_report'),
 ]
@@ -0,0 +1,117 @@
+import hashlib
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ContentVersion
+
+# ----------------- Content Versions -----------------
+# A content version is a counter that moves on whenever the content behind
+# it changes (the catalog, the blog). Anything derived from that content -
+# worker snapshots, rendered fragments, ETags - is keyed by the version, so
+# one increment retires all of it across workers.
+#
+# The counter is a ContentVersion row, bumped with an atomic UPDATE, so
+# concurrent bumps from different processes can't lose one. Requests read a
+# copy in the shared cache; the bump writes that copy while it still holds
+# the row's lock, so the cache always ends on the newest version. If the
+# copy is culled or cleared, the next read takes it from the row again.
+#
+# A new series starts from the clock rather than 1, so a fresh database can't
+# hand out a version some browser already holds an ETag for.
+#
+# Content versions don't move when a deploy changes the templates or views,
+# so pages are also keyed by release(), which does.
+
+RELEASE_SUFFIXES = {'.py', '.html', '.txt'}
+
+
+@lru_cache(maxsize=1)
+def release():
+    """settings.RELEASE, or else a digest of the project's own code and
+    templates, worked out once per process."""
+    if settings.RELEASE:
+        return settings.RELEASE
+    base = Path(settings.BASE_DIR)
+    folders = [Path(config.path) for config in apps.get_app_configs() if Path(config.path).is_relative_to(base)]
+    folders += [base / folder for engine in settings.TEMPLATES for folder in engine['DIRS']]
+    digest = hashlib.blake2b(digest_size=8)
+    for folder in sorted(set(folders)):
+        for path in sorted(folder.rglob('*')):
+            if path.suffix in RELEASE_SUFFIXES and path.is_file():
+                digest.update(path.relative_to(base).as_posix().encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _cache_copy(key, version, modified, add=False):
+    store = cache.add if add else cache.set
+    store(key, version, timeout=None)
+    store(f"{key}:modified", int(modified.timestamp()), timeout=None)
+
+
+def content_version(key):
+    version = cache.get(key)
+    if version is None:
+        row = ContentVersion.objects.filter(name=key).values_list('version', 'modified').first()
+        # No row before the first bump: a clock value stands in, and the bump
+        # will start the row from a later one.
+        row = row or (time.time_ns() // 1000, timezone.now())
+        _cache_copy(key, *row, add=True)  # add, not set: a bump that lands meanwhile wins
+        version = cache.get(key) or row[0]
+    return version
+
+
+async def acontent_version(key):
+    """content_version() for async code: the cache copy is read in place,
+    only a miss goes to the database."""
+    version = cache.get(key)
+    if version is None:
+        version = await sync_to_async(content_version)(key)
+    return version
+
+
+def last_modified(key):
+    """When the version last moved (epoch seconds), or None if unknown."""
+    return cache.get(f"{key}:modified")
+
+
+class _PendingBump:
+    def __init__(self, key):
+        self.key = key
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        _bump(self.key)
+
+
+def bump_content_version(key):
+    # Bump after commit, otherwise another worker could rebuild from the old
+    # rows and cache them under the new version. Once per transaction.
+    for _, func, _ in transaction.get_connection().run_on_commit:
+        if isinstance(func, _PendingBump) and func.key == key and not func.done:
+            return
+    transaction.on_commit(_PendingBump(key))
+
+
+def _bump(key):
+    now = timezone.now()
+    with transaction.atomic():
+        row = ContentVersion.objects.filter(name=key)
+        if not row.update(version=F('version') + 1, modified=now):
+            _, created = ContentVersion.objects.get_or_create(
+                name=key, defaults={'version': time.time_ns() // 1000, 'modified': now},
+            )
+            if not created:  # another process made it first
+                row.update(version=F('version') + 1, modified=now)
+        version = row.values_list('version', flat=True).get()
+        _cache_copy(key, version, now)
@@ -1,70 +1,90 @@
-from django.shortcuts import get_object_or_404, render, redirect
-from django.http import HttpRequest
-from django.contrib.auth import logout
+from django.shortcuts import render, redirect
+from django.http import HttpRequest, JsonResponse
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from collections import defaultdict
-from django.db import transaction
-from .models import Product, Order, Customer
-import random 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
+from datetime import date, timedelta
+from .models import Product
+from .autocomplete import CATEGORY, get_index
+from .cart import get_cart, price_cart
+from .cards import category_cards, product_cards
+from .catalog import CatalogQuery, acatalog_version, aget_catalog, featured_products
+from .page_cache import catalog_page, conditional_page
+from .orders import OutOfStock, place_order
+from .reports import sales_report, schedule_rollup
+from .search import asearch_products
+from .tracking import alookup_order
 # ----------------- Home Page -----------------
-def shop_home(request: HttpRequest):
-    logout(request)  # Logs out user on shop home load
-
-    categorized_products = defaultdict(list)
-    for product in Product.objects.filter(stock__gt=0).select_related('category'):
-        category = product.category.name if product.category else "Uncategorized"
-        categorized_products[category].append(product)
-
-    cart = request.session.get('cart', {})
-    cart_quantities = {int(k): v for k, v in cart.items()}
+# The catalog pages, search and order tracking are async views on the async
+# ORM: under ASGI they run on the event loop without a thread hop per request
+# (every middleware is async-capable). Under WSGI Django runs them in an
+# event loop of their own.
+@catalog_page
+async def shop_home(request: HttpRequest):
+    catalog = await aget_catalog()
+    query = CatalogQuery.from_request(request)
+    page = await catalog.apage(query)
+
+    cart_quantities = get_cart(request).load()
 
     return render(request, "shop/index.html", {
-        "categorized_products": dict(categorized_products),
+        # Called by the template only when the cached grid is re-rendered.
+        "categorized_products": lambda: category_cards(page.by_category, version=catalog.version),
         "cart_quantities": cart_quantities,
+        "query": query,
+        "next_page_url": next_page_url(request, page),
     })
 
+def next_page_url(request, page):
+    if not page.next_cursor:
+        return None
+    params = request.GET.copy()
+    params['after'] = page.next_cursor
+    return f"{request.path}?{params.urlencode()}"
+
 # ----------------- Static Pages -----------------
+@catalog_page
 def about(request):
-    # Get all products with images
-    products_with_images = list(Product.objects.filter(image__isnull=False))
-    # Pick 3 random products (if fewer than 3, just all of them)
-    random_products = random.sample(products_with_images, min(len(products_with_images), 3))
-    
+    # Pick 3 random products with images (if fewer than 3, just all of them)
+    random_products = featured_products(3)
+
     return render(request, 'shop/about.html', {'products': random_products})
 
+@conditional_page()
 def contact(request: HttpRequest):
     return render(request, "shop/contact.html")
 
 # ----------------- Products View -----------------
-def product(request):
-    products = Product.objects.all()
-    cart = request.session.get('cart', {})
-    cart_quantities = {int(k): v for k, v in cart.items()}
+@catalog_page
+async def product(request):
+    catalog = await aget_catalog()
+    query = CatalogQuery.from_request(request, in_stock=False)
+    page = await catalog.apage(query)
 
-    # Group by category
-    categorized_products = {}
-    for product in products:
-        category = product.category if product.category else "Uncategorized"
-        categorized_products.setdefault(category, []).append(product)
+    cart_quantities = get_cart(request).load()
 
     context = {
-        'categorized_products': categorized_products,
-        'cart_quantities': cart_quantities
+        'categorized_products': lambda: category_cards(page.by_category, version=catalog.version),
+        'cart_quantities': cart_quantities,
+        'categories': catalog.categories,
+        'query': query,
+        'next_page_url': next_page_url(request, page),
     }
     return render(request, 'shop/product.html', context)
 
 # ----------------- Order Tracking -----------------
-def track_order(request):
+async def track_order(request):
     order = None
     error = None
 
     if request.method == "POST":
         tracking_id = request.POST.get("tracking_id", "").strip()
         if tracking_id:
-            try:
-                order = Order.objects.get(tracking_id=tracking_id)
-            except Order.DoesNotExist:
+            order = await alookup_order(tracking_id)
+            if order is None:
                 error = "Order not found with that Tracking ID."
         else:
             error = "Please enter a Tracking ID."
@@ -75,76 +95,88 @@ def track_order(request):
     })
 
 # ----------------- Search View -----------------
-def search(request):
+async def search(request):
     query = request.GET.get('query', '').strip()
-    products = Product.objects.filter(name__icontains=query) if query else []
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+    page = await asearch_products(query, page_number) if query else None
 
-    cart = request.session.get('cart', {})
-    cart_quantities = {int(k): v for k, v in cart.items()}
+    products = []
+    if page:
+        products = product_cards(page.products, get_cart(request).load(), await acatalog_version())
 
     context = {
         'query': query,
         'products': products,
-        'cart_quantities': cart_quantities
+        'page': page,
     }
     return render(request, 'shop/search.html', context)
 
+# ----------------- Autocomplete -----------------
+def autocomplete(request):
+    query = request.GET.get('q', '')
+    search_url, products_url = reverse('shop_search'), reverse('shop_products')
+    results = []
+    for kind, pk, name in get_index().lookup(query):
+        if kind == CATEGORY:
+            url = f"{products_url}?{urlencode({'category': pk})}"
+        else:
+            url = f"{search_url}?{urlencode({'query': name})}"
+        results.append({'type': kind, 'id': pk, 'name': name, 'url': url})
+    return JsonResponse({'query': query, 'results': results})
+
 # ----------------- Cart View -----------------
 def cart(request: HttpRequest):
-    cart = request.session.get('cart', {})
+    storage = get_cart(request)
+    cart = storage.load()
 
     add_id = request.GET.get('add')
     if add_id:
-        product = Product.objects.filter(id=add_id, stock__gt=0).first()
+        product = Product.objects.filter(id=add_id, stock__gt=0).first() if add_id.isdigit() else None
         if product:
-            cart[add_id] = cart.get(add_id, 0) + 1
-            request.session['cart'] = cart
+            cart[product.id] = min(cart.get(product.id, 0) + 1, product.stock)
+            storage.save(cart)
             messages.success(request, f"Added {product.name} to cart.")
         else:
             messages.error(request, "Product not found or out of stock.")
         return redirect('shop_cart')
 
     remove_id = request.GET.get('remove')
-    if remove_id and remove_id in cart:
+    remove_id = int(remove_id) if remove_id and remove_id.isdigit() else None
+    if remove_id in cart:
         cart[remove_id] -= 1
         if cart[remove_id] <= 0:
             del cart[remove_id]
-        request.session['cart'] = cart
+        storage.save(cart)
         messages.info(request, "Updated your cart.")
         return redirect('shop_cart')
 
-    products_in_cart = []
-    total_price = 0
-    for pid, quantity in cart.items():
-        try:
-            pid_int = int(pid)
-            product = Product.objects.filter(id=pid_int, stock__gt=0).first()
-            if product:
-                subtotal = product.price * quantity
-                total_price += subtotal
-                products_in_cart.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'price': product.price,
-                    'quantity': quantity,
-                    'subtotal': subtotal,
-                    'image': product.image.url if product.image else None,
-                })
-        except ValueError:
-            continue
+    priced = price_cart(cart)
+    if priced.adjusted:
+        storage.save(priced.quantities)
 
     return render(request, 'shop/cart.html', {
-        'cart_items': products_in_cart,
-        'total': total_price,
+        'cart_items': priced.lines,
+        'total': priced.total,
     })
 
 # ----------------- Checkout View -----------------
 def checkout(request):
-    cart = request.session.get('cart', {})
+    storage = get_cart(request)
+    cart = storage.load()
     if not cart:
         messages.warning(request, "Your cart is empty!")
         return redirect('shop_cart')
 
+    priced = price_cart(cart)
+    if priced.adjusted:
+        storage.save(priced.quantities)
+    if not priced:
+        messages.warning(request, "The items in your cart are no longer available.")
+        return redirect('shop_cart')
+
     if request.method == "POST":
         customer_name = request.POST.get("full_name", "").strip()
         customer_email = request.POST.get("email", "").strip()
@@ -155,41 +187,23 @@ def checkout(request):
             messages.error(request, "Please fill in all required fields.")
             return redirect('shop_checkout')
 
-        customer, created = Customer.objects.get_or_create(
-            email=customer_email,
-            defaults={'full_name': customer_name, 'address': customer_address}
-        )
-        if not created:
-            customer.full_name = customer_name
-            customer.address = customer_address
-            customer.save()
-
-        order_items = []
-        total_price = 0
-        for product_id, quantity in cart.items():
-            product = get_object_or_404(Product, pk=product_id)
-            qty = int(quantity)
-            subtotal = product.price * qty
-            total_price += subtotal
-            order_items.append({
-                'product_id': product.id,
-                'name': product.name,
-                'quantity': qty,
-                'unit_price': float(product.price),
-                'subtotal': float(subtotal),
-            })
-
-        with transaction.atomic():
-            order = Order.objects.create(
-                customer=customer,
-                items=order_items,
-                total_price=total_price,
-                payment_method=payment_method,
-            )
+        # Don't charge for a cart the customer hasn't seen: if stock changed
+        # since the summary was rendered, show the updated one first.
+        if priced.adjusted:
+            messages.warning(request, "Some items in your cart changed availability. Please review your order.")
+            return redirect('shop_checkout')
+
+        try:
+            order = place_order(priced, customer_name, customer_email, customer_address, payment_method)
+        except OutOfStock as exc:
+            messages.error(request, f"Sorry, there isn't enough stock left for {exc.line['name']}. Please review your order.")
+            return redirect('shop_checkout')
+        customer = order.customer
+        # Side effects that can wait go to the job queue (see jobs.queue).
+        schedule_rollup()
 
         # Clear cart after order creation
-        request.session['cart'] = {}
-        request.session.modified = True
+        storage.clear()
 
         return render(request, 'shop/checkout.html', {
             'order_success': {
@@ -197,41 +211,27 @@ def checkout(request):
                 'full_name': customer.full_name,
                 'email': customer.email,
                 'address': customer.address,
-                'total_price': total_price,
+                'total_price': priced.total,
                 'payment_method': payment_method,
             }
         })
 
     # GET request - show checkout form with cart summary
-    cart_items = []
-    total = 0
-    for product_id, quantity in cart.items():
-        product = get_object_or_404(Product, pk=product_id)
-        subtotal = product.price * quantity
-        cart_items.append({
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'image': product.image.url if product.image else None,
-            'quantity': quantity,
-            'subtotal': subtotal,
-        })
-        total += subtotal
-
     return render(request, 'shop/checkout.html', {
-        'cart_items': cart_items,
-        'total': total,
+        'cart_items': priced.lines,
+        'total': priced.total,
     })
 
 # ----------------- Bulk Add to Cart -----------------
 @require_POST
 def add_multiple_to_cart(request):
-    cart = request.session.get('cart', {})
+    storage = get_cart(request)
+    cart = storage.load()
 
     for key, value in request.POST.items():
         if key.startswith('quantity_'):
             try:
-                product_id = key.split('_')[1]
+                product_id = int(key.split('_')[1])
                 qty = int(value)
                 if qty > 0:
                     cart[product_id] = qty
@@ -240,6 +240,28 @@ def add_multiple_to_cart(request):
             except (ValueError, IndexError):
                 continue
 
-    request.session['cart'] = cart
-    request.session.modified = True
+    # Validate every id against the catalog in one query; unknown or sold-out
+    # products are dropped and quantities are capped at the available stock.
+    priced = price_cart(cart)
+    if priced.adjusted:
+        messages.warning(request, "Some quantities were adjusted to match available stock.")
+
+    storage.save(priced.quantities)
     return redirect('shop_cart')
+
+# ----------------- Sales Report -----------------
+@staff_member_required
+def sales_report_view(request):
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+    except ValueError:
+        start = today - timedelta(days=30)
+    try:
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        end = today
+
+    context = sales_report(start, end)
+    context.update({'start': start, 'end': end})
+    return render(request, 'shop/sales_report.html', context)